@@ -3,3 +3,7 @@ from django.apps import AppConfig
 
 class AnalyticsConfig(AppConfig):
     name = 'analytics'
+
+    def ready(self):
+        # Подключаем обработчики, поддерживающие PollStatistic в актуальном состоянии
+        from . import signals  # noqa: F401
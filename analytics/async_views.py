@@ -0,0 +1,242 @@
+"""
+Асинхронные варианты API аналитики для запуска через ASGI (mysite.asgi).
+
+Представления отвечают по тем же адресам под префиксом api/async/ и возвращают
+те же данные, что и синхронные из analytics.views. Запросы идут через
+асинхронный ORM, а отрисовка диаграмм ожидается без блокировки цикла событий
+(см. analytics.charts.arender_chart), поэтому медленная диаграмма не задерживает
+остальные запросы процесса.
+"""
+import asyncio
+import json
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.db.models import Sum
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.shortcuts import aget_object_or_404
+from django.views import View
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from mysite.metrics import timed
+from polls.conditional import not_modified, set_validators
+from polls.models import Question
+from polls.search import ranked_matches
+from .charts import ChartRenderError, arender_chart, chart_cache
+from .live import TooManySubscribers, live_results, results_snapshot
+from .models import StatsRollup
+from .routing import ReplicaReadMixin
+from .serializers import poll_stat_representation
+from .views import (
+    ChartUnavailable, OverallStatsMixin, PollChartMixin, PollSearchMixin, poll_stat_data,
+    poll_validators,
+)
+
+
+class AsyncAPIView(APIView):
+    """
+    APIView с асинхронными обработчиками (async def get).
+    Проверки DRF (аутентификация, права, троттлинг) могут читать сессию из базы,
+    поэтому выполняются в потоке; обработчик работает в цикле событий.
+    """
+    async def dispatch(self, request, *args, **kwargs):
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+
+        try:
+            await sync_to_async(self.initial)(request, *args, **kwargs)
+            if request.method.lower() in self.http_method_names:
+                handler = getattr(self, request.method.lower(), self.http_method_not_allowed)
+            else:
+                handler = self.http_method_not_allowed
+            response = handler(request, *args, **kwargs)
+            if asyncio.iscoroutine(response):
+                response = await response
+        except Exception as exc:
+            response = self.handle_exception(exc)
+
+        self.response = self.finalize_response(request, response, *args, **kwargs)
+        return self.response
+
+
+class AsyncPollStatsAPIView(ReplicaReadMixin, AsyncAPIView):
+    """
+    Статистика по конкретному голосованию
+    GET /analytics/api/async/polls/<question_id>/stats/
+    """
+    async def get(self, request, question_id):
+        question = await aget_object_or_404(Question.objects.select_related('statistic'), id=question_id)
+        etag, last_modified = poll_validators(question, 'stats', request.accepted_renderer.format)
+        response = not_modified(request, etag, last_modified)
+        if response is not None:
+            return response
+        choices = [choice async for choice in question.choice_set.all()]
+
+        return set_validators(
+            Response(poll_stat_representation(poll_stat_data(question, choices))), etag, last_modified
+        )
+
+
+class AsyncPollChartAPIView(ReplicaReadMixin, PollChartMixin, AsyncAPIView):
+    """
+    Диаграмма результатов голосования
+    GET /analytics/api/async/polls/<question_id>/chart/ (а также chart.png и chart.svg)
+    """
+    async def get(self, request, question_id, format=None):
+        question = await aget_object_or_404(Question.objects.select_related('statistic'), id=question_id)
+        etag, last_modified = self.chart_validators(request, question)
+        response = not_modified(request, etag, last_modified)
+        if response is not None:
+            return response
+        choices = [choice async for choice in self.chart_choices(question)]
+
+        cache_key = self.chart_key(request, question, choices)
+        image = chart_cache.get(cache_key)
+        cache_status = 'hit'
+        if image is None:
+            cache_status = 'miss'
+            try:
+                with timed('chart'):
+                    image = await arender_chart(
+                        question.question_text,
+                        [choice_text for _, choice_text, _ in choices],
+                        [votes for _, _, votes in choices],
+                        cache_key[1],
+                    )
+            except ChartRenderError as error:
+                raise ChartUnavailable(str(error))
+            chart_cache.set(cache_key, image)
+
+        return set_validators(
+            self.chart_response(request, question, image, cache_status), etag, last_modified
+        )
+
+
+class AsyncPollSearchAPIView(ReplicaReadMixin, PollSearchMixin, AsyncAPIView):
+    """
+    Поиск и фильтрация голосований
+    GET /analytics/api/async/polls/search/ - параметры как у PollSearchAPIView
+    """
+    async def get(self, request):
+        etag, last_modified = self.search_validators(request, await StatsRollup.objects.acurrent())
+        response = not_modified(request, etag, last_modified)
+        if response is None:
+            response = set_validators(await self.search(request), etag, last_modified)
+        return response
+
+    async def search(self, request):
+        rows, text, sort_by, streaming = self.search_query(request)
+        if sort_by == 'relevance':
+            # Поиск по индексу FTS - сырой SQL, у него нет асинхронного варианта
+            matches = await sync_to_async(ranked_matches)(
+                text, within=rows, after=self.relevance_after(request),
+                limit=self.page_size(request) + 1,
+            )
+            found = [row async for row in self.relevance_rows(matches)]
+            return Response(self.relevance_data(request, matches, found))
+
+        if streaming:
+            return StreamingHttpResponse(
+                self.stream_rows(rows), content_type='application/x-ndjson'
+            )
+
+        page = [row async for row in self.page_rows(request, rows, sort_by)]
+        return Response(self.page_data(request, page, sort_by))
+
+    async def stream_rows(self, rows):
+        """Построчно отдает найденные опросы, не загружая их все в память."""
+        async for row in rows.aiterator(chunk_size=settings.ANALYTICS_SEARCH_STREAM_CHUNK):
+            yield self.stream_line(row)
+
+
+class AsyncOverallStatsAPIView(ReplicaReadMixin, OverallStatsMixin, AsyncAPIView):
+    """
+    Общая статистика по всем голосованиям
+    GET /analytics/api/async/stats/overall/
+    """
+    async def get(self, request):
+        rollup = await StatsRollup.objects.acurrent()
+        week_ago = self.week_ago()
+        etag = self.overall_etag(request, rollup, await self.oldest_recent_poll(week_ago).afirst())
+        response = not_modified(request, etag)
+        if response is not None:
+            return response
+        days, first_day = self.recent_polls(week_ago)
+        recent_polls = (
+            ((await days.aaggregate(total=Sum('count')))['total'] or 0)
+            + await first_day.acount()
+        )
+        popular_polls = [stat async for stat in self.popular_polls()]
+        return set_validators(
+            Response(self.overall_data(rollup, popular_polls, recent_polls)), etag
+        )
+
+
+def sse_event(event, data):
+    """Одно событие Server-Sent Events."""
+    return f'event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n'
+
+
+class LiveResultsView(View):
+    """
+    Живые результаты опроса потоком Server-Sent Events
+    GET /analytics/api/async/polls/<question_id>/live/
+
+    Первое событие snapshot - все варианты с голосами, дальше события votes
+    с изменениями {"<choice_id>": +n} и новым итогом, не чаще раза
+    в ANALYTICS_LIVE_TICK секунд (см. analytics.live). Если подписчиков
+    уже ANALYTICS_LIVE_MAX_SUBSCRIBERS, отвечает 503 с Retry-After.
+
+    Держать поток открытым может только ASGI-сервер; под WSGI отдается один
+    snapshot, и браузер переподключается через ANALYTICS_LIVE_WSGI_RETRY секунд.
+    Страницы подписываются на поток только под ASGI (см. polls.views.live_updates).
+    """
+    async def get(self, request, question_id):
+        if not await Question.objects.filter(id=question_id).aexists():
+            return JsonResponse({'detail': 'Опрос не найден'}, status=404)
+
+        if not isinstance(request, ASGIRequest):
+            counts = await live_results.read_counts([question_id])
+            snapshot = results_snapshot(question_id, counts[question_id])
+            retry = int(settings.ANALYTICS_LIVE_WSGI_RETRY * 1000)
+            return self.prepare(HttpResponse(
+                f'retry: {retry}\n' + sse_event('snapshot', snapshot),
+                content_type='text/event-stream',
+            ))
+
+        try:
+            subscriber = await live_results.subscribe(question_id)
+        except TooManySubscribers:
+            response = JsonResponse({'detail': 'Слишком много подписчиков'}, status=503)
+            response['Retry-After'] = str(settings.ANALYTICS_LIVE_HEARTBEAT)
+            return response
+        return self.prepare(StreamingHttpResponse(
+            self.events(subscriber), content_type='text/event-stream'
+        ))
+
+    def prepare(self, response):
+        response['Cache-Control'] = 'no-cache'
+        # Прокси (nginx) не должен копить поток в буфере
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+    async def events(self, subscriber):
+        try:
+            while not subscriber.closed:
+                try:
+                    await asyncio.wait_for(
+                        subscriber.ready.wait(), timeout=settings.ANALYTICS_LIVE_HEARTBEAT
+                    )
+                except TimeoutError:
+                    # Комментарий держит соединение открытым через прокси
+                    yield ': keepalive\n\n'
+                    continue
+                for event, data in subscriber.take():
+                    yield sse_event(event, data)
+        finally:
+            live_results.unsubscribe(subscriber)
@@ -0,0 +1,96 @@
+"""
+Нагрузочные замеры внутри процесса (см. команду bench_api).
+
+run_load держит concurrency потоков, каждый из которых выполняет запросы,
+пока не наберется заданное их число; summarize сводит задержки в пропускную
+способность и перцентили, compare_runs сравнивает два сохраненных прогона
+и возвращает найденные регрессии.
+"""
+import itertools
+import statistics
+import threading
+import time
+
+from django.db import connections
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def run_load(make_request, concurrency, requests):
+    """
+    Выполняет requests вызовов make_request(worker) в concurrency потоках.
+    make_request возвращает True при успешном ответе; worker - номер потока
+    (например, чтобы у каждого потока был свой клиент).
+    Возвращает (задержки в секундах, число ошибок, время всего прогона).
+    """
+    counter = itertools.count()
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+
+    def worker(number):
+        try:
+            while next(counter) < requests:
+                started = time.perf_counter()
+                try:
+                    ok = make_request(number)
+                except Exception:
+                    ok = False
+                elapsed = time.perf_counter() - started
+                with lock:
+                    latencies.append(elapsed)
+                    if not ok:
+                        errors.append(number)
+        finally:
+            # У каждого потока свое соединение с базой
+            connections.close_all()
+
+    threads = [threading.Thread(target=worker, args=(number,)) for number in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, len(errors), time.perf_counter() - started
+
+
+def summarize(latencies, errors, seconds):
+    """Пропускная способность и перцентили задержки (в миллисекундах)."""
+    if not latencies:
+        return {'requests': 0, 'errors': errors, 'rps': 0.0,
+                'mean_ms': None, 'p50_ms': None, 'p95_ms': None, 'p99_ms': None}
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'rps': round(len(latencies) / seconds, 1) if seconds else 0.0,
+        'mean_ms': round(statistics.fmean(latencies) * 1000, 2),
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 2),
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 2),
+    }
+
+
+def compare_runs(baseline, current, tolerance=0.2):
+    """
+    Сравнивает результаты двух прогонов по (endpoint, concurrency).
+    Регрессия - p95 выросла или пропускная способность упала больше чем на tolerance,
+    либо появились ошибки. Возвращает список описаний регрессий.
+    """
+    previous = {(row['endpoint'], row['concurrency']): row for row in baseline['results']}
+    regressions = []
+    for row in current['results']:
+        key = (row['endpoint'], row['concurrency'])
+        old = previous.get(key)
+        if old is None:
+            continue
+        name = f'{row["endpoint"]} x{row["concurrency"]}'
+        if old['p95_ms'] and row['p95_ms'] and row['p95_ms'] > old['p95_ms'] * (1 + tolerance):
+            regressions.append(f'{name}: p95 {old["p95_ms"]} -> {row["p95_ms"]} мс')
+        if old['rps'] and row['rps'] < old['rps'] * (1 - tolerance):
+            regressions.append(f'{name}: {old["rps"]} -> {row["rps"]} запросов/с')
+        if row['errors'] > old['errors']:
+            regressions.append(f'{name}: ошибок {old["errors"]} -> {row["errors"]}')
+    return regressions
@@ -0,0 +1,199 @@
+import asyncio
+import hashlib
+import multiprocessing
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+
+class ChartRenderError(Exception):
+    """Диаграмму не удалось отрисовать за отведенное время."""
+
+
+def chart_version(question_text, choices):
+    """
+    Версия диаграммы: хэш от текста вопроса и (id, текст, голоса) каждого варианта.
+    Меняется только при голосовании или редактировании этого опроса.
+    """
+    digest = hashlib.sha1(question_text.encode('utf-8'))
+    for choice_id, choice_text, votes in choices:
+        digest.update(f'\x00{choice_id}\x01{choice_text}\x01{votes}'.encode('utf-8'))
+    return digest.hexdigest()
+
+
+class ChartCache:
+    """
+    Потокобезопасный LRU-кэш отрисованных диаграмм.
+    Ключ - (question_id, ..., version); ограничен числом записей и суммарным размером в байтах.
+    Для каждого вопроса (и формата) хранится только последняя версия диаграммы.
+    """
+    def __init__(self, max_entries=256, max_bytes=32 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._latest = {}  # ключ без версии -> последний сохраненный ключ
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        size = len(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            # Старая версия диаграммы того же вопроса больше не понадобится
+            previous = self._latest.get(key[:-1])
+            if previous is not None and previous != key:
+                self._discard(previous)
+            self._discard(key)
+            self._entries[key] = value
+            self._latest[key[:-1]] = key
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._discard(oldest)
+                self.evictions += 1
+
+    def _discard(self, key):
+        value = self._entries.pop(key, None)
+        if value is None:
+            return
+        self._bytes -= len(value)
+        if self._latest.get(key[:-1]) == key:
+            del self._latest[key[:-1]]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._latest.clear()
+            self._bytes = 0
+            self.hits = self.misses = self.evictions = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': round(self.hits / lookups, 4) if lookups else 0.0,
+                'evictions': self.evictions,
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_entries': self.max_entries,
+                'max_bytes': self.max_bytes,
+            }
+
+
+# Один кэш на процесс; размеры настраиваются в settings.py
+chart_cache = ChartCache(
+    max_entries=getattr(settings, 'ANALYTICS_CHART_CACHE_ENTRIES', 256),
+    max_bytes=getattr(settings, 'ANALYTICS_CHART_CACHE_BYTES', 32 * 1024 * 1024),
+)
+
+
+# Пул процессов для отрисовки: matplotlib не блокирует GIL потоков запросов
+_render_pool = None
+_render_pool_lock = threading.Lock()
+
+
+def get_render_pool():
+    """Возвращает пул процессов отрисовки, создавая его при первом обращении."""
+    global _render_pool
+    with _render_pool_lock:
+        if _render_pool is None:
+            _render_pool = ProcessPoolExecutor(
+                max_workers=settings.ANALYTICS_CHART_WORKERS,
+                mp_context=multiprocessing.get_context('spawn'),
+            )
+        return _render_pool
+
+
+def shutdown_render_pool():
+    """Останавливает пул процессов отрисовки (следующий запрос создаст новый)."""
+    global _render_pool
+    with _render_pool_lock:
+        pool, _render_pool = _render_pool, None
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def render_chart(question_text, labels, votes, image_format='png'):
+    """
+    Отправляет задание на отрисовку в пул и ждет изображение не дольше ANALYTICS_CHART_TIMEOUT.
+    При ANALYTICS_CHART_WORKERS = 0 рисует в текущем потоке.
+    """
+    # matplotlib загружается только при первой отрисовке, а не при старте процесса
+    from . import rendering
+    
+    if not settings.ANALYTICS_CHART_WORKERS:
+        return rendering.render_bar_chart(question_text, labels, votes, image_format)
+    
+    try:
+        future = get_render_pool().submit(
+            rendering.render_bar_chart, question_text, labels, votes, image_format
+        )
+        return future.result(timeout=settings.ANALYTICS_CHART_TIMEOUT)
+    except TimeoutError:
+        future.cancel()
+        raise ChartRenderError('Превышено время отрисовки диаграммы')
+    except BrokenProcessPool:
+        # Процесс пула упал - пересоздаем пул при следующем запросе
+        shutdown_render_pool()
+        raise ChartRenderError('Пул отрисовки диаграмм недоступен')
+
+
+async def arender_chart(question_text, labels, votes, image_format='png'):
+    """
+    Асинхронный вариант render_chart: ждет пул отрисовки, не блокируя цикл событий.
+    При ANALYTICS_CHART_WORKERS = 0 рисует в отдельном потоке.
+    """
+    from . import rendering
+    
+    if not settings.ANALYTICS_CHART_WORKERS:
+        return await sync_to_async(rendering.render_bar_chart, thread_sensitive=False)(
+            question_text, labels, votes, image_format
+        )
+    
+    try:
+        future = get_render_pool().submit(
+            rendering.render_bar_chart, question_text, labels, votes, image_format
+        )
+        return await asyncio.wait_for(
+            asyncio.wrap_future(future), timeout=settings.ANALYTICS_CHART_TIMEOUT
+        )
+    except TimeoutError:
+        future.cancel()
+        raise ChartRenderError('Превышено время отрисовки диаграммы')
+    except BrokenProcessPool:
+        shutdown_render_pool()
+        raise ChartRenderError('Пул отрисовки диаграмм недоступен')
+
+def warm_up():
+    """
+    Заранее загружает matplotlib и запускает пул отрисовки,
+    чтобы первый запрос диаграммы не платил за импорт и кэш шрифтов.
+    """
+    from . import rendering
+    
+    if not settings.ANALYTICS_CHART_WORKERS:
+        rendering.warm_up()
+        return
+    pool = get_render_pool()
+    futures = [pool.submit(rendering.warm_up) for _ in range(settings.ANALYTICS_CHART_WORKERS)]
+    wait(futures, timeout=settings.ANALYTICS_CHART_TIMEOUT)
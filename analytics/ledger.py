@@ -0,0 +1,140 @@
+"""
+Журнал голосов с пакетной записью.
+
+Голоса копятся в памяти и сбрасываются одной транзакцией, когда их набирается
+ANALYTICS_LEDGER_BATCH_SIZE или проходит ANALYTICS_LEDGER_FLUSH_INTERVAL секунд.
+При сбросе журнал (VoteEvent) дописывается через bulk_create, а счетчики
+VoteBucket по минутам и часам увеличиваются одним INSERT ... ON CONFLICT.
+"""
+import atexit
+import logging
+import threading
+from collections import Counter
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import connection, connections, transaction
+from django.utils import timezone
+
+from .models import VoteBucket, VoteEvent
+
+logger = logging.getLogger(__name__)
+
+
+def bucket_start(moment, resolution):
+    """Начало интервала resolution, в который попадает moment (UTC)."""
+    seconds = VoteBucket.SECONDS[resolution]
+    timestamp = int(moment.timestamp()) // seconds * seconds
+    return datetime.fromtimestamp(timestamp, tz=dt_timezone.utc)
+
+
+class VoteLedger:
+    def __init__(self):
+        self._pending = []  # (question_id, choice_id, count, момент голоса)
+        self._lock = threading.Lock()
+        self._timer = None
+
+    def record(self, deltas, at=None):
+        """Добавляет голоса {(question_id, choice_id): count} в очередь на запись."""
+        at = at or timezone.now()
+        with self._lock:
+            self._pending.extend(
+                (question_id, choice_id, count, at)
+                for (question_id, choice_id), count in deltas.items()
+            )
+            full = sum(item[2] for item in self._pending) >= settings.ANALYTICS_LEDGER_BATCH_SIZE
+            if not full:
+                self._schedule()
+        if full:
+            try:
+                self.flush()
+            except Exception:
+                # Голоса остались в очереди: попробуем снова по таймеру
+                with self._lock:
+                    self._schedule()
+
+    def _schedule(self):
+        """Запускает таймер сброса, если его еще нет (вызывается под self._lock)."""
+        if self._timer is None and self._pending and settings.ANALYTICS_LEDGER_FLUSH_INTERVAL:
+            self._timer = threading.Timer(
+                settings.ANALYTICS_LEDGER_FLUSH_INTERVAL, self._flush_in_background
+            )
+            self._timer.daemon = True
+            self._timer.start()
+
+    def pending_count(self):
+        """Число голосов, еще не записанных в базу."""
+        with self._lock:
+            return sum(item[2] for item in self._pending)
+
+    def pending_items(self):
+        """Копия еще не записанных голосов: [(question_id, choice_id, count, момент)]."""
+        with self._lock:
+            return list(self._pending)
+
+    def flush(self):
+        """
+        Записывает накопленные голоса в журнал и счетчики одной транзакцией;
+        при ошибке (например, база занята) возвращает их в очередь.
+        """
+        with self._lock:
+            pending, self._pending = self._pending, []
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        if not pending:
+            return 0
+
+        buckets = Counter()
+        events = []
+        for question_id, choice_id, count, at in pending:
+            events.extend(
+                VoteEvent(question_id=question_id, choice_id=choice_id, created_at=at)
+                for _ in range(count)
+            )
+            for resolution in VoteBucket.SECONDS:
+                buckets[(question_id, choice_id, resolution, bucket_start(at, resolution))] += count
+
+        try:
+            with transaction.atomic():
+                VoteEvent.objects.bulk_create(events, batch_size=1000)
+                self._add_to_buckets(buckets)
+        except Exception:
+            logger.exception('Не удалось записать %d голосов в журнал, они остаются в очереди', len(events))
+            with self._lock:
+                self._pending[:0] = pending
+            raise
+        return len(events)
+
+    def _add_to_buckets(self, buckets):
+        table = connection.ops.quote_name(VoteBucket._meta.db_table)
+        sql = (
+            f'INSERT INTO {table} (question_id, choice_id, resolution, start, count) '
+            f'VALUES (%s, %s, %s, %s, %s) '
+            f'ON CONFLICT (choice_id, resolution, start) DO UPDATE SET count = {table}.count + excluded.count'
+        )
+        with connection.cursor() as cursor:
+            cursor.executemany(sql, [
+                (question_id, choice_id, resolution,
+                 connection.ops.adapt_datetimefield_value(start), count)
+                for (question_id, choice_id, resolution, start), count in buckets.items()
+            ])
+
+    def _flush_in_background(self):
+        with self._lock:
+            self._timer = None
+        try:
+            self.flush()
+        except Exception:
+            # Ошибка уже в логе (см. flush); голоса не должны ждать следующего голоса
+            with self._lock:
+                self._schedule()
+        finally:
+            # Соединение этого потока больше не понадобится
+            connections.close_all()
+
+
+vote_ledger = VoteLedger()
+
+# Голоса, не успевшие попасть в базу, сбрасываем при остановке процесса
+atexit.register(vote_ledger.flush)
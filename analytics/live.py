@@ -0,0 +1,221 @@
+"""
+Живые результаты опросов для подписчиков SSE (см. async_views.LiveResultsView).
+
+Раз в ANALYTICS_LIVE_TICK секунд один запрос читает голоса всех опросов, на которые
+кто-то подписан в этом процессе, и сравнивает их с прошлым тиком. Разница уходит
+подписчикам одним сообщением на опрос, сколько бы голосов ни пришло за тик.
+Голоса читаются из базы, а не из сигналов, поэтому видны голоса всех процессов;
+к ним добавляются еще не записанные голоса буфера этого процесса.
+
+У подписчика нет очереди сообщений: новые изменения складываются с еще
+не отправленными, так что медленный клиент занимает память по числу вариантов,
+а не по числу тиков. Клиент, не забиравший изменения дольше
+ANALYTICS_LIVE_STALL_TIMEOUT секунд, отключается; подписчиков на процесс
+не больше ANALYTICS_LIVE_MAX_SUBSCRIBERS.
+"""
+import asyncio
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.db import DatabaseError
+
+from polls.models import Choice
+from polls.vote_buffer import vote_buffer
+
+
+def results_snapshot(question_id, counts):
+    """Полное состояние опроса по {choice_id: [текст, голоса]}."""
+    return {
+        'question_id': question_id,
+        'total_votes': sum(votes for _, votes in counts.values()),
+        'choices': [
+            {'id': choice_id, 'choice_text': choice_text, 'votes': votes}
+            for choice_id, (choice_text, votes) in counts.items()
+        ],
+    }
+
+
+class TooManySubscribers(Exception):
+    """Достигнут предел ANALYTICS_LIVE_MAX_SUBSCRIBERS."""
+
+
+class Subscriber:
+    """Неотправленные изменения одного клиента и событие "есть что отправить"."""
+
+    def __init__(self, question_id):
+        self.question_id = question_id
+        self.ready = asyncio.Event()
+        self.closed = False
+        self._snapshot = None
+        self._deltas = Counter()
+        self._total = None
+        self._behind_since = None
+
+    def push_snapshot(self, snapshot):
+        """Полное состояние опроса: заменяет все неотправленные изменения."""
+        self._snapshot = snapshot
+        self._deltas.clear()
+        self._notify()
+
+    def push_deltas(self, deltas, total):
+        self._deltas.update(deltas)
+        self._total = total
+        self._notify()
+
+    def take(self):
+        """Забирает накопленное: список (имя события, данные)."""
+        events = []
+        if self._snapshot is not None:
+            events.append(('snapshot', self._snapshot))
+        deltas = {str(choice_id): count for choice_id, count in self._deltas.items() if count}
+        if deltas:
+            events.append(('votes', {
+                'question_id': self.question_id,
+                'total_votes': self._total,
+                'deltas': deltas,
+            }))
+        self._snapshot = None
+        self._deltas.clear()
+        self._behind_since = None
+        self.ready.clear()
+        return events
+
+    def stalled(self, now):
+        """Клиент дольше ANALYTICS_LIVE_STALL_TIMEOUT не забирает изменения."""
+        return (
+            self._behind_since is not None
+            and now - self._behind_since > settings.ANALYTICS_LIVE_STALL_TIMEOUT
+        )
+
+    def close(self):
+        self.closed = True
+        self.ready.set()
+
+    def _notify(self):
+        if self._behind_since is None:
+            self._behind_since = time.monotonic()
+        self.ready.set()
+
+
+class LiveResults:
+    """Подписчики процесса и последние прочитанные голоса их опросов."""
+
+    def __init__(self):
+        self._subscribers = {}  # question_id -> множество Subscriber
+        self._counts = {}  # question_id -> {choice_id: [choice_text, votes]}
+        self._task = None
+        self._loop = None
+
+    def subscriber_count(self):
+        return sum(len(subscribers) for subscribers in self._subscribers.values())
+
+    async def subscribe(self, question_id):
+        """Новый подписчик на опрос; первым событием он получит snapshot."""
+        self._bind_loop()
+        if question_id not in self._counts:
+            counts = await self.read_counts([question_id])
+            self._counts.setdefault(question_id, counts[question_id])
+        if self.subscriber_count() >= settings.ANALYTICS_LIVE_MAX_SUBSCRIBERS:
+            self._forget_unwatched(question_id)
+            raise TooManySubscribers
+        subscriber = Subscriber(question_id)
+        subscriber.push_snapshot(self.snapshot(question_id))
+        self._subscribers.setdefault(question_id, set()).add(subscriber)
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        subscribers = self._subscribers.get(subscriber.question_id)
+        if subscribers is not None:
+            subscribers.discard(subscriber)
+        self._forget_unwatched(subscriber.question_id)
+        if not self._subscribers and self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def snapshot(self, question_id):
+        return results_snapshot(question_id, self._counts[question_id])
+
+    async def read_counts(self, question_ids):
+        """Голоса вариантов опросов одним запросом: {question_id: {choice_id: [текст, голоса]}}."""
+        counts = {question_id: {} for question_id in question_ids}
+        rows = Choice.objects.filter(question_id__in=question_ids).order_by('id').values_list(
+            'question_id', 'id', 'choice_text', 'votes'
+        )
+        async for question_id, choice_id, choice_text, votes in rows:
+            counts[question_id][choice_id] = [choice_text, votes]
+        for question_id in question_ids:
+            for choice_id, count in vote_buffer.pending_for(question_id).items():
+                if choice_id in counts[question_id]:
+                    counts[question_id][choice_id][1] += count
+        return counts
+
+    async def tick(self):
+        """Читает голоса всех отслеживаемых опросов и рассылает изменения."""
+        question_ids = list(self._subscribers)
+        if question_ids:
+            self.broadcast(await self.read_counts(question_ids))
+
+    def broadcast(self, counts):
+        now = time.monotonic()
+        for question_id, current in counts.items():
+            subscribers = self._subscribers.get(question_id)
+            previous = self._counts.get(question_id)
+            if not subscribers or previous is None:
+                continue
+            self._counts[question_id] = current
+            if [(choice_id, text) for choice_id, (text, _) in current.items()] != \
+                    [(choice_id, text) for choice_id, (text, _) in previous.items()]:
+                # Варианты добавили, удалили или переименовали - отправляем все заново
+                snapshot = self.snapshot(question_id)
+                for subscriber in subscribers:
+                    subscriber.push_snapshot(snapshot)
+            else:
+                deltas = {
+                    choice_id: votes - previous[choice_id][1]
+                    for choice_id, (_, votes) in current.items()
+                    if votes != previous[choice_id][1]
+                }
+                if deltas:
+                    total = sum(votes for _, votes in current.values())
+                    for subscriber in subscribers:
+                        subscriber.push_deltas(deltas, total)
+            for subscriber in list(subscribers):
+                if subscriber.stalled(now):
+                    self.unsubscribe(subscriber)
+                    subscriber.close()
+
+    def stats(self):
+        return {
+            'subscribers': self.subscriber_count(),
+            'questions': len(self._subscribers),
+            'max_subscribers': settings.ANALYTICS_LIVE_MAX_SUBSCRIBERS,
+        }
+
+    async def _run(self):
+        while self._subscribers:
+            await asyncio.sleep(settings.ANALYTICS_LIVE_TICK)
+            try:
+                await self.tick()
+            except DatabaseError:
+                # База недоступна - попробуем на следующем тике
+                continue
+
+    def _forget_unwatched(self, question_id):
+        if not self._subscribers.get(question_id):
+            self._subscribers.pop(question_id, None)
+            self._counts.pop(question_id, None)
+
+    def _bind_loop(self):
+        # Подписчики и задача рассылки принадлежат одному циклу событий
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._subscribers = {}
+            self._counts = {}
+            self._task = None
+            self._loop = loop
+
+
+live_results = LiveResults()
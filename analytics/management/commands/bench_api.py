@@ -0,0 +1,205 @@
+import json
+import os
+import platform
+import random
+import sqlite3
+import tempfile
+import threading
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import setup_test_environment
+from django.urls import reverse
+from django.utils import timezone
+
+from analytics.benchmark import compare_runs, run_load, summarize
+from analytics.synthetic import WORDS
+from polls.models import Choice, Question
+
+from .seed_polls import add_dataset_arguments, dataset_size, seed
+
+ENDPOINTS = ['vote', 'index', 'results', 'search', 'stats', 'overall', 'chart']
+
+# Сколько случайных опросов участвует в запросах (разброс по всей таблице)
+SAMPLE_SIZE = 1000
+
+
+class Command(BaseCommand):
+    help = (
+        'Нагрузочный замер страниц и API на синтетическом наборе данных в файле SQLite: '
+        'голосование, главная, результаты, поиск, статистика, общая статистика, диаграмма. '
+        'Для каждого эндпоинта и уровня параллельности - запросов/с и p50/p95/p99. '
+        'Результат сохраняется в JSON; с --compare сравнивается с прошлым прогоном.'
+    )
+
+    def add_arguments(self, parser):
+        add_dataset_arguments(parser)
+        parser.add_argument('--database',
+                            help='Файл базы с набором данных; по умолчанию во временном каталоге, '
+                                 'свой для каждого набора, и переиспользуется между прогонами')
+        parser.add_argument('--fresh', action='store_true',
+                            help='Пересоздать набор данных, даже если файл уже есть')
+        parser.add_argument('--endpoints', default=','.join(ENDPOINTS),
+                            help='Эндпоинты через запятую: ' + ', '.join(ENDPOINTS))
+        parser.add_argument('--concurrency', default='1,4,16',
+                            help='Уровни параллельности (потоков) через запятую')
+        parser.add_argument('--requests', type=int, default=200,
+                            help='Запросов на эндпоинт и уровень параллельности')
+        parser.add_argument('--output',
+                            help='Куда сохранить JSON (по умолчанию bench-api-<время>.json)')
+        parser.add_argument('--compare', help='JSON прошлого прогона для сравнения')
+        parser.add_argument('--tolerance', type=float, default=0.2,
+                            help='Допустимое ухудшение p95 и запросов/с при сравнении (доля)')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('Замер рассчитан на базу SQLite в файле')
+        count = dataset_size(options)
+        endpoints = [name.strip() for name in options['endpoints'].split(',') if name.strip()]
+        unknown = set(endpoints) - set(ENDPOINTS)
+        if unknown:
+            raise CommandError('Неизвестные эндпоинты: ' + ', '.join(sorted(unknown)))
+        try:
+            levels = [int(value) for value in options['concurrency'].split(',')]
+        except ValueError:
+            raise CommandError('--concurrency: ожидается список целых чисел через запятую')
+        baseline = None
+        if options['compare']:
+            try:
+                with open(options['compare'], encoding='utf-8') as source:
+                    baseline = json.load(source)
+            except (OSError, ValueError) as error:
+                raise CommandError(f'Не удалось прочитать {options["compare"]}: {error}')
+
+        database = options['database'] or os.path.join(
+            tempfile.gettempdir(),
+            f'polls-bench-{count}-{options["min_choices"]}-{options["max_choices"]}'
+            f'-{options["seed"]}.sqlite3',
+        )
+        # Без DEBUG: журнал SQL-запросов не должен влиять на замер
+        setup_test_environment(debug=False)
+        self.open_dataset(database, count, options)
+        samples = self.samples()
+
+        results = []
+        for endpoint in endpoints:
+            make_request = self.request_maker(endpoint, samples)
+            for concurrency in levels:
+                latencies, errors, seconds = run_load(make_request, concurrency, options['requests'])
+                row = dict(endpoint=endpoint, concurrency=concurrency,
+                           **summarize(latencies, errors, seconds))
+                results.append(row)
+                self.stdout.write(
+                    f"{endpoint:<8} x{concurrency:<3} {row['rps']:>8} запр/с  "
+                    f"p50 {row['p50_ms']} мс  p95 {row['p95_ms']} мс  p99 {row['p99_ms']} мс  "
+                    f"ошибок {row['errors']}"
+                )
+
+        run = {'meta': self.meta(count, database, options), 'results': results}
+        output = options['output'] or f'bench-api-{timezone.now():%Y%m%d-%H%M%S}.json'
+        with open(output, 'w', encoding='utf-8') as target:
+            json.dump(run, target, ensure_ascii=False, indent=2)
+        self.stdout.write(f'Результаты сохранены в {output}')
+
+        if baseline is not None:
+            regressions = compare_runs(baseline, run, options['tolerance'])
+            if regressions:
+                for regression in regressions:
+                    self.stderr.write(regression)
+                raise CommandError(f'Найдено регрессий: {len(regressions)}')
+            self.stdout.write(self.style.SUCCESS('Регрессий относительно прошлого прогона нет'))
+
+    def open_dataset(self, database, count, options):
+        """Подключается к файлу с набором данных, создавая и заполняя его при необходимости."""
+        if options['fresh'] or not self.is_seeded(database, count):
+            for suffix in ('', '-wal', '-shm'):
+                if os.path.exists(database + suffix):
+                    os.remove(database + suffix)
+            self.stdout.write(f'Создание набора данных: {count} опросов в {database}')
+            connection.settings_dict['TEST']['NAME'] = database
+            connection.creation.create_test_db(verbosity=0, serialize=False)
+            seed(self, options)
+        else:
+            self.stdout.write(f'Используется готовый набор данных {database}')
+            connection.settings_dict['TEST']['NAME'] = database
+            connection.creation.create_test_db(verbosity=0, keepdb=True, serialize=False)
+
+    def is_seeded(self, database, count):
+        if not os.path.exists(database):
+            return False
+        try:
+            with sqlite3.connect(database) as raw:
+                return raw.execute('SELECT COUNT(*) FROM polls_question').fetchone()[0] == count
+        except sqlite3.Error:
+            return False
+
+    def samples(self):
+        """Случайные опросы и их варианты: [(question_id, [choice_id, ...])]."""
+        last = Question.objects.order_by('-id').values_list('id', flat=True).first()
+        if last is None:
+            raise CommandError('В наборе данных нет опросов')
+        rng = random.Random(0)
+        ids = {rng.randint(1, last) for _ in range(SAMPLE_SIZE)}
+        choices = {}
+        for question_id, choice_id in Choice.objects.filter(
+            question_id__in=ids, question__pub_date__lte=timezone.now()
+        ).values_list('question_id', 'id'):
+            choices.setdefault(question_id, []).append(choice_id)
+        if not choices:
+            raise CommandError('Не найдено опубликованных опросов с вариантами')
+        return sorted(choices.items())
+
+    def request_maker(self, endpoint, samples):
+        """Функция одного запроса к эндпоинту для run_load (свой клиент у каждого потока)."""
+        local = threading.local()
+        sorts = ['recent', 'oldest', 'popularity']
+
+        def make_request(worker):
+            if not hasattr(local, 'client'):
+                local.client = Client()
+                local.rng = random.Random(worker)
+            client, rng = local.client, local.rng
+            question_id, choice_ids = rng.choice(samples)
+            if endpoint == 'vote':
+                response = client.post(
+                    reverse('polls:vote', args=(question_id,)), {'choice': rng.choice(choice_ids)}
+                )
+                return response.status_code == 302
+            if endpoint == 'index':
+                response = client.get(reverse('polls:index'))
+            elif endpoint == 'results':
+                response = client.get(reverse('polls:results', args=(question_id,)))
+            elif endpoint == 'search':
+                params = {'sort_by': rng.choice(sorts)}
+                if rng.random() < 0.5:
+                    params = {'q': rng.choice(WORDS)}
+                response = client.get(reverse('poll_search'), params)
+            elif endpoint == 'stats':
+                response = client.get(reverse('poll_stats', args=(question_id,)))
+            elif endpoint == 'overall':
+                response = client.get(reverse('overall_stats'))
+            else:
+                response = client.get(reverse('poll_chart_png', args=(question_id,)))
+            return response.status_code == 200
+
+        return make_request
+
+    def meta(self, count, database, options):
+        return {
+            'created_at': timezone.now().isoformat(),
+            'questions': count,
+            'choices': Choice.objects.count(),
+            'min_choices': options['min_choices'],
+            'max_choices': options['max_choices'],
+            'seed': options['seed'],
+            'requests': options['requests'],
+            'database': database,
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'cpus': os.cpu_count(),
+            'chart_workers': settings.ANALYTICS_CHART_WORKERS,
+        }
@@ -0,0 +1,294 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_test_environment
+from django.urls import reverse
+
+from analytics.benchmark import percentile
+from analytics.synthetic import seed_database
+
+# Эндпоинты в синхронном и асинхронном вариантах: имя URL -> (синхронный, асинхронный)
+ENDPOINTS = {
+    'stats': ('poll_stats', 'poll_stats_async'),
+    'search': ('poll_search', 'poll_search_async'),
+    'overall': ('overall_stats', 'overall_stats_async'),
+    'chart': ('poll_chart', 'poll_chart_async'),
+}
+
+# Общее начало кода процесса-воркера: настройки и тестовая база
+WORKER_SETUP = r'''
+import json, time
+
+from django.conf import settings
+settings.DATABASES['default']['NAME'] = DATABASE
+import django
+django.setup()
+
+if COLD_CHARTS:
+    from analytics.charts import chart_cache
+    chart_cache.max_entries = 0
+'''
+
+# Асинхронные представления: ASGI-приложение (mysite.asgi) в одном цикле событий
+# держит CONCURRENCY одновременных запросов в течение DURATION секунд
+ASGI_WORKER = r'''
+import asyncio
+
+from mysite.asgi import application
+
+
+async def request(url):
+    path, _, query = url.partition('?')
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1',
+        'method': 'GET', 'scheme': 'http', 'path': path, 'raw_path': path.encode(),
+        'query_string': query.encode(), 'root_path': '',
+        'headers': [(b'host', b'localhost')],
+        'client': ('127.0.0.1', 0), 'server': ('localhost', 80),
+    }
+    sent = False
+    status = None
+
+    async def receive():
+        nonlocal sent
+        if not sent:
+            sent = True
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+        # Клиент не отключается; ожидание отменит сам Django после ответа
+        await asyncio.Event().wait()
+
+    async def send(message):
+        nonlocal status
+        if message['type'] == 'http.response.start':
+            status = message['status']
+
+    await application(scope, receive, send)
+    return status
+
+
+async def client(number, deadline, latencies, errors):
+    while time.perf_counter() < deadline:
+        url = URLS[number % len(URLS)]
+        number += 1
+        start = time.perf_counter()
+        status = await request(url)
+        latencies.append(round((time.perf_counter() - start) * 1000, 3))
+        if status != 200:
+            errors.append(status)
+
+
+async def main():
+    for url in URLS:
+        await request(url)
+    latencies, errors = [], []
+    started = time.perf_counter()
+    await asyncio.gather(*(
+        client(number, started + DURATION, latencies, errors) for number in range(CONCURRENCY)
+    ))
+    print(json.dumps({
+        'latencies_ms': latencies,
+        'errors': len(errors),
+        'seconds': time.perf_counter() - started,
+    }))
+
+asyncio.run(main())
+'''
+
+# Синхронные представления: WSGI-приложение (mysite.wsgi) в пуле из CONCURRENCY
+# потоков, как у gunicorn --threads. Под ASGI Django выполнял бы их все
+# в одном потоке (thread_sensitive), и сравнение было бы не с WSGI
+WSGI_WORKER = r'''
+import io, sys
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import connections
+
+from mysite.wsgi import application
+
+
+def request(url):
+    path, _, query = url.partition('?')
+    environ = {
+        'REQUEST_METHOD': 'GET', 'PATH_INFO': path, 'QUERY_STRING': query,
+        'SCRIPT_NAME': '', 'SERVER_NAME': 'localhost', 'SERVER_PORT': '80',
+        'SERVER_PROTOCOL': 'HTTP/1.1', 'HTTP_HOST': 'localhost', 'REMOTE_ADDR': '127.0.0.1',
+        'wsgi.version': (1, 0), 'wsgi.url_scheme': 'http', 'wsgi.input': io.BytesIO(),
+        'wsgi.errors': sys.stderr, 'wsgi.multithread': True, 'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    status = None
+
+    def start_response(value, headers, exc_info=None):
+        nonlocal status
+        status = int(value.split()[0])
+
+    body = application(environ, start_response)
+    try:
+        for _ in body:
+            pass
+    finally:
+        body.close()
+    return status
+
+
+def client(number, deadline, latencies, errors):
+    try:
+        while time.perf_counter() < deadline:
+            url = URLS[number % len(URLS)]
+            number += 1
+            start = time.perf_counter()
+            status = request(url)
+            latencies.append(round((time.perf_counter() - start) * 1000, 3))
+            if status != 200:
+                errors.append(status)
+    finally:
+        connections.close_all()
+
+
+for url in URLS:
+    request(url)
+latencies, errors = [], []
+started = time.perf_counter()
+with ThreadPoolExecutor(max_workers=CONCURRENCY) as pool:
+    for future in [
+        pool.submit(client, number, started + DURATION, latencies, errors)
+        for number in range(CONCURRENCY)
+    ]:
+        future.result()
+print(json.dumps({
+    'latencies_ms': latencies,
+    'errors': len(errors),
+    'seconds': time.perf_counter() - started,
+}))
+'''
+
+WORKERS = {'sync': WSGI_WORKER, 'async': ASGI_WORKER}
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает синхронные API аналитики под WSGI (mysite.wsgi, пул потоков '
+        'по числу одновременных запросов, как gunicorn --threads) и асинхронные под ASGI '
+        '(mysite.asgi): одинаковое число процессов-воркеров, растущее число одновременных '
+        'запросов; для каждого варианта выводит пропускную способность, p50 и p99 задержки.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=2,
+                            help='Число процессов приложения (как --workers у gunicorn и uvicorn)')
+        parser.add_argument('--concurrency', default='1,8,32',
+                            help='Одновременных запросов на воркер, через запятую')
+        parser.add_argument('--duration', type=float, default=3.0,
+                            help='Длительность каждого замера, сек')
+        parser.add_argument('--polls', type=int, default=1000,
+                            help='Сколько опросов создать в тестовой базе')
+        parser.add_argument('--endpoints', default=','.join(ENDPOINTS),
+                            help='Какие эндпоинты нагружать: ' + ', '.join(ENDPOINTS))
+        parser.add_argument('--cold-charts', action='store_true',
+                            help='Отключить кэш диаграмм, чтобы каждая диаграмма рисовалась заново')
+        parser.add_argument('--json', action='store_true', help='Вывести результат в JSON')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('Замер рассчитан на базу SQLite в файле')
+        try:
+            levels = [int(value) for value in options['concurrency'].split(',')]
+        except ValueError:
+            raise CommandError('--concurrency: ожидается список целых чисел через запятую')
+        endpoints = [name.strip() for name in options['endpoints'].split(',') if name.strip()]
+        unknown = set(endpoints) - set(ENDPOINTS)
+        if unknown:
+            raise CommandError('Неизвестные эндпоинты: ' + ', '.join(sorted(unknown)))
+
+        setup_test_environment()
+        with tempfile.TemporaryDirectory() as directory:
+            # Воркеры - отдельные процессы, поэтому тестовая база - файл, а не память
+            database = os.path.join(directory, 'bench.sqlite3')
+            connection.settings_dict['TEST']['NAME'] = database
+            old_name = connection.creation.create_test_db(verbosity=0)
+            try:
+                question = seed_database(options['polls'])
+                connection.close()
+                results = []
+                for concurrency in levels:
+                    for index, deployment in enumerate(('sync', 'async')):
+                        urls = self.urls(question, endpoints, index)
+                        result = self.run(deployment, urls, database, concurrency, options)
+                        result.update(deployment=deployment, concurrency=concurrency)
+                        results.append(result)
+            finally:
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+        self.stdout.write(
+            f"Воркеров: {options['workers']}, эндпоинты: {', '.join(endpoints)}, "
+            f"{options['duration']} с на замер\n"
+            f"sync - WSGI, потоков на воркер столько же, сколько запросов; async - ASGI"
+        )
+        self.stdout.write(
+            f"{'вариант':<8}{'на воркер':>10}{'в полете':>10}{'rps':>10}"
+            f"{'p50, мс':>10}{'p99, мс':>10}{'ошибок':>8}"
+        )
+        for result in results:
+            self.stdout.write(
+                f"{result['deployment']:<8}{result['concurrency']:>10}{result['in_flight']:>10}"
+                f"{result['rps']:>10}{result['p50_ms']:>10}{result['p99_ms']:>10}{result['errors']:>8}"
+            )
+        if any(result['errors'] for result in results):
+            raise CommandError('Часть запросов завершилась ошибкой')
+
+    def urls(self, question, endpoints, index):
+        """Адреса эндпоинтов в синхронном (index 0) или асинхронном (1) варианте."""
+        urls = []
+        for name in endpoints:
+            url_name = ENDPOINTS[name][index]
+            if name in ('stats', 'chart'):
+                urls.append(reverse(url_name, args=(question.id,)))
+            else:
+                urls.append(reverse(url_name) + ('?sort_by=popularity' if name == 'search' else ''))
+        return urls
+
+    def run(self, deployment, urls, database, concurrency, options):
+        """Запускает воркеры варианта deployment одновременно и сводит их задержки."""
+        code = (
+            f'URLS = {urls!r}\n'
+            f'DATABASE = {database!r}\n'
+            f'CONCURRENCY = {concurrency!r}\n'
+            f"DURATION = {options['duration']!r}\n"
+            f"COLD_CHARTS = {options['cold_charts']!r}\n"
+        ) + WORKER_SETUP + WORKERS[deployment]
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE=settings.SETTINGS_MODULE)
+        processes = [
+            subprocess.Popen(
+                [sys.executable, '-c', code], cwd=settings.BASE_DIR, env=env,
+                stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True,
+            )
+            for _ in range(max(options['workers'], 1))
+        ]
+        runs = []
+        for process in processes:
+            stdout, stderr = process.communicate()
+            if process.returncode != 0:
+                raise CommandError(f'Воркер завершился с ошибкой:\n{stderr}')
+            runs.append(json.loads(stdout.strip().splitlines()[-1]))
+
+        latencies = [value for run in runs for value in run['latencies_ms']]
+        if not latencies:
+            raise CommandError('Ни один запрос не успел завершиться')
+        return {
+            'in_flight': concurrency * len(runs),
+            'requests': len(latencies),
+            'rps': round(sum(len(run['latencies_ms']) / run['seconds'] for run in runs), 1),
+            'p50_ms': round(statistics.median(latencies), 2),
+            'p99_ms': round(percentile(latencies, 0.99), 2),
+            'errors': sum(run['errors'] for run in runs),
+        }
@@ -0,0 +1,102 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+
+from analytics.renderers import FastJSONRenderer, orjson
+from analytics.serializers import PollStatSerializer, poll_stat_representation
+from analytics.synthetic import synthetic_polls
+from analytics.views import PollSearchMixin, poll_stat_data
+from polls.models import Choice, Question
+
+# Опросов на страницу выдачи поиска
+SEARCH_PAGE = 50
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает стоимость сериализации ответов аналитики: сериализаторы DRF '
+        'и JSONRenderer против быстрого пути (poll_stat_representation, FastJSONRenderer). '
+        'Время - на 1000 опросов; ответы обоих путей должны совпадать побайтно.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--polls', type=int, default=1000, help='Число опросов')
+        parser.add_argument('--repeat', type=int, default=5,
+                            help='Количество повторов; берется лучшее время')
+        parser.add_argument('--json', action='store_true', help='Вывести результат в JSON')
+
+    def handle(self, *args, **options):
+        if options['polls'] < 1:
+            raise CommandError('--polls должно быть больше 0')
+        polls = self.polls(options['polls'])
+        drf, fast = JSONRenderer(), FastJSONRenderer()
+
+        stats = [poll_stat_data(question, choices) for question, choices in polls]
+        search = PollSearchMixin()
+        rows = [
+            {'id': question.id, 'question_text': question.question_text,
+             'pub_date': question.pub_date, 'total_votes_sum': sum(choice.votes for choice in choices)}
+            for question, choices in polls
+        ]
+        pages = [rows[start:start + SEARCH_PAGE] for start in range(0, len(rows), SEARCH_PAGE)]
+
+        scenarios = {
+            'stats': (
+                lambda: [drf.render(PollStatSerializer(data).data) for data in stats],
+                lambda: [fast.render(poll_stat_representation(data)) for data in stats],
+            ),
+            'search': (
+                lambda: [drf.render({'results': [search.to_item(row) for row in page]}) for page in pages],
+                lambda: [fast.render({'results': [search.to_item(row) for row in page]}) for page in pages],
+            ),
+        }
+        result = {'polls': options['polls'], 'orjson': orjson is not None, 'scenarios': {}}
+        for name, (before, after) in scenarios.items():
+            before_ms, before_output = self.measure(before, options['repeat'])
+            after_ms, after_output = self.measure(after, options['repeat'])
+            if before_output != after_output:
+                raise CommandError(f'{name}: ответы быстрого пути отличаются от DRF')
+            scale = 1000 / options['polls']
+            result['scenarios'][name] = {
+                'before_ms_per_1000': round(before_ms * scale, 2),
+                'after_ms_per_1000': round(after_ms * scale, 2),
+                'speedup': round(before_ms / after_ms, 1) if after_ms else None,
+                'identical': True,
+            }
+
+        if options['json']:
+            self.stdout.write(json.dumps(result, indent=2))
+            return
+        if not result['orjson']:
+            self.stdout.write(self.style.WARNING('orjson не установлен: FastJSONRenderer работает как JSONRenderer'))
+        for name, row in result['scenarios'].items():
+            self.stdout.write(
+                f"{name:<7} DRF {row['before_ms_per_1000']:>8} мс  "
+                f"быстрый путь {row['after_ms_per_1000']:>8} мс  "
+                f"(x{row['speedup']}) на 1000 опросов, ответы совпадают"
+            )
+
+    def polls(self, count):
+        """Несохраненные опросы с вариантами: сериализация замеряется без базы."""
+        polls = []
+        for number, poll in enumerate(synthetic_polls(count, now=timezone.now(), min_choices=2,
+                                                      max_choices=20), 1):
+            question = Question(id=number, question_text=poll.question_text, pub_date=poll.pub_date)
+            choices = [
+                Choice(id=number * 100 + index, question=question, choice_text=text, votes=votes)
+                for index, (text, votes) in enumerate(poll.choices)
+            ]
+            polls.append((question, choices))
+        return polls
+
+    def measure(self, render, repeat):
+        best = None
+        for _ in range(max(repeat, 1)):
+            started = time.perf_counter()
+            output = render()
+            elapsed = (time.perf_counter() - started) * 1000
+            best = elapsed if best is None else min(best, elapsed)
+        return best, output
@@ -0,0 +1,139 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import reverse
+
+# Приложения, чье время импорта и первого запроса измеряется
+APPS = ['polls', 'analytics']
+
+# Тяжелые модули, которые не должны загружаться при старте процесса
+HEAVY_MODULES = ['matplotlib', 'numpy', 'PIL']
+
+# Код, выполняемый в чистом процессе Python: старт Django, импорт приложений, первый запрос
+PROBE = r'''
+import json, sys, time
+
+def elapsed(start):
+    return round((time.perf_counter() - start) * 1000, 1)
+
+start = time.perf_counter()
+import django
+django.setup()
+result = {'setup_ms': elapsed(start), 'apps': {}}
+
+from importlib import import_module
+from django.conf import settings
+for label in APPS:
+    t = time.perf_counter()
+    import_module(label + '.views')
+    result['apps'][label] = {'import_ms': elapsed(t)}
+t = time.perf_counter()
+import_module(settings.ROOT_URLCONF)
+result['urlconf_ms'] = elapsed(t)
+result['boot_ms'] = elapsed(start)
+result['heavy_modules'] = [name for name in HEAVY_MODULES if name in sys.modules]
+
+from django.db import connection
+from django.test import Client
+from django.test.utils import setup_test_environment
+setup_test_environment()
+connection.creation.create_test_db(verbosity=0)
+client = Client()
+for label, url in URLS.items():
+    t = time.perf_counter()
+    status = client.get(url).status_code
+    result['apps'][label].update(first_request_ms=elapsed(t), status=status)
+print(json.dumps(result))
+'''
+
+
+class Command(BaseCommand):
+    help = (
+        'Измеряет время старта процесса (импорт приложений и URLconf) '
+        'и время первого запроса к каждому приложению. '
+        'Завершается с ошибкой, если превышен бюджет.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runs', type=int, default=3,
+                            help='Количество запусков; берется медиана')
+        parser.add_argument('--max-boot-ms', type=float, default=settings.STARTUP_BUDGET_BOOT_MS)
+        parser.add_argument('--max-first-request-ms', type=float,
+                            default=settings.STARTUP_BUDGET_FIRST_REQUEST_MS)
+        parser.add_argument('--json', action='store_true', help='Вывести результат в JSON')
+
+    def handle(self, *args, **options):
+        urls = {
+            'polls': reverse('polls:index'),
+            'analytics': reverse('overall_stats'),
+        }
+        runs = [self.probe(urls) for _ in range(max(options['runs'], 1))]
+        result = self.median(runs)
+
+        if options['json']:
+            self.stdout.write(json.dumps(result, indent=2))
+        else:
+            self.stdout.write(f"django.setup(): {result['setup_ms']} мс")
+            self.stdout.write(f"URLconf:        {result['urlconf_ms']} мс")
+            self.stdout.write(f"Старт всего:    {result['boot_ms']} мс")
+            for label, app in result['apps'].items():
+                self.stdout.write(
+                    f"  {label}: импорт {app['import_ms']} мс, "
+                    f"первый запрос {app['first_request_ms']} мс (HTTP {app['status']})"
+                )
+
+        problems = []
+        if result['boot_ms'] > options['max_boot_ms']:
+            problems.append(f"старт {result['boot_ms']} мс > {options['max_boot_ms']} мс")
+        for label, app in result['apps'].items():
+            if app['first_request_ms'] > options['max_first_request_ms']:
+                problems.append(
+                    f"первый запрос {label}: {app['first_request_ms']} мс > "
+                    f"{options['max_first_request_ms']} мс"
+                )
+        if result['heavy_modules']:
+            problems.append('при старте загружены: ' + ', '.join(result['heavy_modules']))
+        if problems:
+            raise CommandError('Бюджет старта превышен: ' + '; '.join(problems))
+        self.stdout.write(self.style.SUCCESS('Бюджет старта соблюден'))
+
+    def probe(self, urls):
+        """Запускает PROBE в отдельном процессе и возвращает его измерения."""
+        code = (
+            f'APPS = {APPS!r}\n'
+            f'URLS = {urls!r}\n'
+            f'HEAVY_MODULES = {HEAVY_MODULES!r}\n'
+        ) + PROBE
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE=settings.SETTINGS_MODULE)
+        completed = subprocess.run(
+            [sys.executable, '-c', code],
+            cwd=settings.BASE_DIR, env=env, capture_output=True, text=True,
+        )
+        if completed.returncode != 0:
+            raise CommandError(f'Процесс замера завершился с ошибкой:\n{completed.stderr}')
+        return json.loads(completed.stdout.strip().splitlines()[-1])
+
+    def median(self, runs):
+        """Медиана каждого замера по нескольким запускам."""
+        def med(values):
+            return round(statistics.median(values), 1)
+
+        result = {
+            key: med([run[key] for run in runs])
+            for key in ('setup_ms', 'urlconf_ms', 'boot_ms')
+        }
+        result['heavy_modules'] = sorted({name for run in runs for name in run['heavy_modules']})
+        result['apps'] = {}
+        for label in runs[0]['apps']:
+            apps = [run['apps'][label] for run in runs]
+            result['apps'][label] = {
+                'import_ms': med([app['import_ms'] for app in apps]),
+                'first_request_ms': med([app['first_request_ms'] for app in apps]),
+                'status': apps[-1]['status'],
+            }
+        return result
@@ -0,0 +1,94 @@
+import time
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import setup_test_environment
+from django.urls import reverse
+from django.utils import timezone
+
+from analytics.query_plans import audit_urls
+from analytics.synthetic import seed_database
+
+
+def audited_urls(question):
+    """Страницы, API и фильтры админки, чьи запросы проверяются."""
+    changelist = reverse('admin:polls_question_changelist')
+    search = reverse('poll_search')
+    year = timezone.localtime(question.pub_date).year
+    return {
+        'Главная': reverse('polls:index'),
+        'Голосование': reverse('polls:detail', args=(question.id,)),
+        'Результаты': reverse('polls:results', args=(question.id,)),
+        'Админка: список': changelist,
+        'Админка: сегодня': changelist + '?pub_date=today',
+        'Админка: за неделю': changelist + '?pub_date=week',
+        'Админка: с вариантами': changelist + '?has_choices=yes',
+        'Админка: по году': changelist + f'?pub_date__year={year}',
+        'Админка: поиск': changelist + '?q=вопрос',
+        'Поиск: новые': search,
+        'Поиск: старые': search + '?sort_by=oldest',
+        'Поиск: популярные': search + '?sort_by=popularity',
+        'Поиск: за период': search + f'?date_from={timezone.localdate() - timedelta(days=7)}',
+        'Поиск: по тексту': search + '?q=вопрос',
+        'Статистика опроса': reverse('poll_stats', args=(question.id,)),
+        'Статистика пачкой': reverse('poll_stats_batch') + f'?ids={question.id},{question.id + 1}',
+        'Диаграмма': reverse('poll_chart', args=(question.id,)),
+        'Общая статистика': reverse('overall_stats'),
+        'Временной ряд': reverse('poll_timeseries', args=(question.id,)),
+        'Горячие опросы': reverse('poll_trending'),
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        'Строит EXPLAIN QUERY PLAN для всех запросов страниц, API и фильтров админки '
+        'на тестовой базе с синтетическими опросами. Завершается с ошибкой, '
+        'если найден полный просмотр таблицы или сортировка во временном B-дереве.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--polls', type=int, default=20000,
+                            help='Сколько опросов создать в тестовой базе')
+        parser.add_argument('--verbose-plans', action='store_true',
+                            help='Печатать планы всех запросов, а не только проблемных')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('EXPLAIN QUERY PLAN поддерживается только для SQLite')
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0)
+        try:
+            question = self.seed(options['polls'])
+            client = Client()
+            client.force_login(User.objects.create_superuser('audit', password='audit'))
+            report = audit_urls(audited_urls(question), client)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        problems = 0
+        for name, plans in report.items():
+            bad = [plan for plan in plans if plan.problems]
+            problems += len(bad)
+            status = self.style.ERROR('ПРОБЛЕМЫ') if bad else self.style.SUCCESS('ok')
+            self.stdout.write(f'{name}: {len(plans)} запросов, {status}')
+            for plan in plans if options['verbose_plans'] else bad:
+                self.stdout.write(f'  {plan.sql[:300]}')
+                for detail in plan.details:
+                    self.stdout.write(f'    {detail}')
+                for problem in plan.problems:
+                    self.stdout.write(self.style.WARNING(f'    ! {problem}'))
+                for note in plan.accepted:
+                    self.stdout.write(f'    ~ {note}')
+        if problems:
+            raise CommandError(f'Запросов с неэффективным планом: {problems}')
+        self.stdout.write(self.style.SUCCESS('Все запросы используют индексы'))
+
+    def seed(self, count):
+        """Синтетические опросы за последний год, голоса и журнал; возвращает последний опрос."""
+        started = time.monotonic()
+        question = seed_database(count)
+        self.stdout.write(f'Создано опросов: {count} за {time.monotonic() - started:.1f} с')
+        return question
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from analytics.models import PollStatistic, StatsRollup
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересобирает таблицу PollStatistic из голосов в Choice '
+        'и сводные счетчики (если итоги разошлись)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        total, drift = PollStatistic.objects.rebuild(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Статистика пересобрана: {total} опросов, исправлено расхождений: {drift}'
+        ))
+        rollup = StatsRollup.objects.rebuild()
+        self.stdout.write(self.style.SUCCESS(
+            f'Сводные счетчики пересобраны: {rollup.total_polls} опросов, '
+            f'{rollup.total_votes} голосов'
+        ))
@@ -0,0 +1,50 @@
+import os
+import sqlite3
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+class Command(BaseCommand):
+    help = (
+        'Обновляет снимок основной базы SQLite (ANALYTICS_REPLICA_PATH), '
+        'из которого читает аналитика; с --interval повторяет это периодически'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=0,
+                            help='Период обновления, сек (0 - обновить один раз)')
+
+    def handle(self, *args, **options):
+        path = settings.ANALYTICS_REPLICA_PATH
+        if not path:
+            raise CommandError('Задайте ANALYTICS_REPLICA_PATH - путь к файлу снимка')
+        primary = connections[DEFAULT_DB_ALIAS]
+        if primary.vendor != 'sqlite':
+            raise CommandError('Снимок поддерживается только для SQLite')
+        if os.path.abspath(path) == os.path.abspath(primary.settings_dict['NAME']):
+            raise CommandError('ANALYTICS_REPLICA_PATH указывает на основную базу: снимок не нужен')
+
+        while True:
+            started = time.monotonic()
+            self.refresh(primary, path)
+            self.stdout.write(self.style.SUCCESS(
+                f'Снимок {path} обновлен за {time.monotonic() - started:.2f} с'
+            ))
+            if not options['interval']:
+                return
+            time.sleep(options['interval'])
+
+    def refresh(self, primary, path):
+        # Копируем онлайн-бэкапом во временный файл и атомарно подменяем снимок:
+        # новые соединения реплики сразу видят целостную копию
+        primary.ensure_connection()
+        temporary = f'{path}.tmp'
+        target = sqlite3.connect(temporary)
+        try:
+            primary.connection.backup(target)
+        finally:
+            target.close()
+        os.replace(temporary, path)
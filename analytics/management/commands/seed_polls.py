@@ -0,0 +1,68 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from analytics.synthetic import DATASETS, seed_database
+
+
+def dataset_size(options):
+    """Число опросов из --questions или --dataset."""
+    if options['questions'] is not None:
+        if options['questions'] < 1:
+            raise CommandError('--questions должно быть больше 0')
+        return options['questions']
+    return DATASETS[options['dataset']]
+
+
+def add_dataset_arguments(parser):
+    """Параметры набора данных (общие для seed_polls и bench_api)."""
+    parser.add_argument('--dataset', choices=list(DATASETS), default='10k',
+                        help='Готовый размер набора: ' + ', '.join(DATASETS))
+    parser.add_argument('--questions', type=int,
+                        help='Точное число опросов (вместо --dataset)')
+    parser.add_argument('--min-choices', type=int, default=2)
+    parser.add_argument('--max-choices', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=0,
+                        help='Зерно генератора: одинаковое зерно дает одинаковые данные')
+    parser.add_argument('--batch-size', type=int, default=1000,
+                        help='Опросов на транзакцию при вставке')
+
+
+def seed(command, options):
+    """Заполняет текущую базу синтетическими опросами, печатая прогресс каждые 10%."""
+    count = dataset_size(options)
+    if not 1 <= options['min_choices'] <= options['max_choices']:
+        raise CommandError('Нужно 1 <= --min-choices <= --max-choices')
+    step = max(count // 10, options['batch_size'])
+    next_report = [step]
+
+    def progress(report):
+        if report.polls >= next_report[0] or report.polls == count:
+            next_report[0] += step
+            command.stdout.write(
+                f'{report.polls}/{count} опросов, {report.choices} вариантов, '
+                f'{report.rate:.0f} опросов/с'
+            )
+
+    started = time.monotonic()
+    seed_database(
+        count, seed=options['seed'],
+        min_choices=options['min_choices'], max_choices=options['max_choices'],
+        batch_size=options['batch_size'], progress=progress,
+    )
+    command.stdout.write(command.style.SUCCESS(
+        f'Создано опросов: {count} за {time.monotonic() - started:.1f} с'
+    ))
+
+
+class Command(BaseCommand):
+    help = (
+        'Заполняет базу синтетическими опросами (10k, 100k или 1M, по 2-20 вариантов) '
+        'пакетными вставками. Для замеров производительности на реалистичном объеме данных.'
+    )
+
+    def add_arguments(self, parser):
+        add_dataset_arguments(parser)
+
+    def handle(self, *args, **options):
+        seed(self, options)
@@ -0,0 +1,40 @@
+# Generated by Django 6.0 on 2026-10-18 00:18
+
+from django.db import migrations, models
+from django.db.models import Sum
+
+
+def fill_statistics(apps, schema_editor):
+    """Создает PollStatistic для уже существующих опросов."""
+    Question = apps.get_model('polls', 'Question')
+    Choice = apps.get_model('polls', 'Choice')
+    PollStatistic = apps.get_model('analytics', 'PollStatistic')
+
+    totals = dict(
+        Choice.objects.values('question_id').annotate(total=Sum('votes'))
+        .values_list('question_id', 'total')
+    )
+    PollStatistic.objects.all().delete()
+    PollStatistic.objects.bulk_create(
+        [
+            PollStatistic(question_id=question_id, total_votes=totals.get(question_id) or 0)
+            for question_id in Question.objects.values_list('id', flat=True)
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0001_initial'),
+        ('polls', '0002_alter_choice_options_alter_question_options'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='pollstatistic',
+            index=models.Index(fields=['total_votes', 'question'], name='analytics_stat_votes_idx'),
+        ),
+        migrations.RunPython(fill_statistics, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,63 @@
+# Generated by Django 6.0 on 2026-10-18 00:20
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+
+
+def fill_rollups(apps, schema_editor):
+    """Считает сводные счетчики по уже существующим опросам."""
+    Question = apps.get_model('polls', 'Question')
+    Choice = apps.get_model('polls', 'Choice')
+    StatsRollup = apps.get_model('analytics', 'StatsRollup')
+    DailyPollCount = apps.get_model('analytics', 'DailyPollCount')
+
+    StatsRollup.objects.create(
+        pk=1,
+        total_polls=Question.objects.count(),
+        total_votes=Choice.objects.aggregate(total=Sum('votes'))['total'] or 0,
+    )
+    DailyPollCount.objects.bulk_create(
+        [
+            DailyPollCount(day=row['day'], count=row['count'])
+            for row in Question.objects.annotate(day=TruncDate('pub_date'))
+            .values('day').annotate(count=Count('id')).order_by()
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0002_pollstatistic_total_votes_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyPollCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(unique=True)),
+                ('count', models.IntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Опросы за день',
+                'verbose_name_plural': 'Опросы по дням',
+            },
+        ),
+        migrations.CreateModel(
+            name='StatsRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total_polls', models.IntegerField(default=0)),
+                ('total_votes', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Сводная статистика',
+                'verbose_name_plural': 'Сводная статистика',
+            },
+        ),
+        migrations.RunPython(fill_rollups, migrations.RunPython.noop),
+    ]
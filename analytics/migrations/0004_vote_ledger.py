@@ -0,0 +1,45 @@
+# Generated by Django 6.0 on 2026-10-18 00:23
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0003_rollups'),
+        ('polls', '0003_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VoteEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField()),
+                ('choice', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='polls.choice')),
+                ('question', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='polls.question')),
+            ],
+            options={
+                'verbose_name': 'Голос',
+                'verbose_name_plural': 'Журнал голосов',
+            },
+        ),
+        migrations.CreateModel(
+            name='VoteBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('resolution', models.CharField(choices=[('m', 'Минута'), ('h', 'Час')], max_length=1)),
+                ('start', models.DateTimeField()),
+                ('count', models.IntegerField(default=0)),
+                ('choice', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='polls.choice')),
+                ('question', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='polls.question')),
+            ],
+            options={
+                'verbose_name': 'Голоса за интервал',
+                'verbose_name_plural': 'Голоса по интервалам',
+                'indexes': [models.Index(fields=['question', 'resolution', 'start'], name='analytics_bucket_range_idx')],
+                'constraints': [models.UniqueConstraint(fields=('choice', 'resolution', 'start'), name='analytics_vote_bucket_unique')],
+            },
+        ),
+    ]
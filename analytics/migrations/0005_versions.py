@@ -0,0 +1,23 @@
+# Generated by Django 6.0 on 2026-10-18 01:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0004_vote_ledger'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pollstatistic',
+            name='version',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='statsrollup',
+            name='version',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+    ]
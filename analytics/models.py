@@ -1,11 +1,248 @@
-from django.db import models
-from polls.models import Question
+from asgiref.sync import sync_to_async
+from django.db import models, transaction
+from django.db.models import Count, F, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce, TruncDate
+from django.utils import timezone
+from polls.models import Question, Choice
+from polls.votes import increment
+
+
+class PollStatisticManager(models.Manager):
+    def refresh(self, question_id, create=True):
+        """
+        Пересчитывает total_votes опроса одним UPDATE по его вариантам.
+        Если строки статистики нет и create=True - создает ее.
+        """
+        total = Choice.objects.filter(question_id=OuterRef('question_id')).values(
+            'question_id'
+        ).annotate(total=Sum('votes')).values('total')
+        updated = self.filter(question_id=question_id).update(
+            total_votes=Coalesce(Subquery(total), 0), version=F('version') + 1,
+            last_calculated=timezone.now(),
+        )
+        if not updated and create:
+            votes = Choice.objects.filter(question_id=question_id).aggregate(
+                total=Coalesce(Sum('votes'), 0)
+            )['total']
+            self.get_or_create(question_id=question_id, defaults={'total_votes': votes})
+
+    def rebuild(self, batch_size=1000):
+        """
+        Полностью пересобирает таблицу из Choice пакетными вставками.
+        Возвращает (число опросов, число расходившихся строк).
+        """
+        totals = dict(
+            Choice.objects.values('question_id').annotate(total=Sum('votes'))
+            .values_list('question_id', 'total')
+        )
+        existing = dict(self.values_list('question_id', 'total_votes'))
+        question_ids = list(Question.objects.values_list('id', flat=True))
+        drift = sum(
+            1 for question_id in question_ids
+            if existing.get(question_id) != (totals.get(question_id) or 0)
+        )
+
+        with transaction.atomic():
+            self.all().delete()
+            self.bulk_create(
+                (
+                    self.model(question_id=question_id, total_votes=totals.get(question_id) or 0)
+                    for question_id in question_ids
+                ),
+                batch_size=batch_size,
+            )
+        return len(question_ids), drift
+
+    def add_votes(self, question_totals):
+        """
+        Прибавляет новые голоса {question_id: количество} к итогам опросов
+        одним UPDATE на пачку, сколько бы опросов ни было в пакете.
+        Недостающие строки статистики создаются одной вставкой.
+        """
+        question_totals = {question_id: count for question_id, count in question_totals.items() if count}
+        if not question_totals:
+            return
+        updated = increment(
+            self, 'total_votes', 'question_id', question_totals,
+            version=F('version') + 1, last_calculated=timezone.now(),
+        )
+        if updated != len(question_totals):
+            existing = set(
+                self.filter(question_id__in=question_totals).values_list('question_id', flat=True)
+            )
+            self.create_missing([
+                question_id for question_id in question_totals if question_id not in existing
+            ])
+
+    def create_missing(self, question_ids):
+        """Создает строки статистики опросов с итогами, посчитанными по вариантам."""
+        totals = dict(
+            Choice.objects.filter(question_id__in=question_ids).values('question_id')
+            .annotate(total=Sum('votes')).values_list('question_id', 'total')
+        )
+        self.bulk_create(
+            [self.model(question_id=question_id, total_votes=totals.get(question_id) or 0)
+             for question_id in question_ids],
+            ignore_conflicts=True,
+        )
+
+    def touch(self, question_id):
+        """Новая версия опроса без пересчета (изменились текст или дата вопроса)."""
+        self.filter(question_id=question_id).update(
+            version=F('version') + 1, last_calculated=timezone.now()
+        )
+
 
 class PollStatistic(models.Model):
+    """
+    Итог голосов по опросу. Поддерживается сигналами (см. analytics.signals)
+    при каждом голосе, правке вариантов и создании опроса.
+    version растет при каждом таком изменении: из нее строятся ETag
+    страниц и API опроса (см. polls.conditional).
+    """
     question = models.OneToOneField(Question, on_delete=models.CASCADE, related_name='statistic')
     total_votes = models.IntegerField(default=0)
+    version = models.PositiveBigIntegerField(default=0)
     last_calculated = models.DateTimeField(auto_now=True)
-    
+
+    objects = PollStatisticManager()
+
     class Meta:
         verbose_name = 'Статистика опроса'
-        verbose_name_plural = 'Статистики опросов'
\ No newline at end of file
+        verbose_name_plural = 'Статистики опросов'
+        indexes = [
+            models.Index(fields=['total_votes', 'question'], name='analytics_stat_votes_idx'),
+        ]
+
+
+class StatsRollupManager(models.Manager):
+    ROLLUP_ID = 1
+
+    def current(self):
+        """Возвращает единственную строку сводных счетчиков (создает при отсутствии)."""
+        rollup = self.filter(pk=self.ROLLUP_ID).first()
+        if rollup is None:
+            rollup = self.rebuild()
+        return rollup
+    
+    async def acurrent(self):
+        """Асинхронный вариант current()."""
+        rollup = await self.filter(pk=self.ROLLUP_ID).afirst()
+        if rollup is None:
+            # Пересчет идет в транзакции, а она доступна только синхронно
+            rollup = await sync_to_async(self.rebuild)()
+        return rollup
+
+    def bump(self, polls=0, votes=0):
+        """Атомарно прибавляет приращения к глобальным счетчикам."""
+        updated = self.filter(pk=self.ROLLUP_ID).update(
+            total_polls=F('total_polls') + polls,
+            total_votes=F('total_votes') + votes,
+            version=F('version') + 1,
+            updated_at=timezone.now(),
+        )
+        if not updated:
+            self.rebuild()
+
+    def rebuild(self):
+        """Пересчитывает глобальные счетчики и дневные количества опросов с нуля."""
+        with transaction.atomic():
+            rollup, _ = self.update_or_create(pk=self.ROLLUP_ID, defaults={
+                'total_polls': Question.objects.count(),
+                'total_votes': Choice.objects.aggregate(total=Coalesce(Sum('votes'), 0))['total'],
+            })
+            DailyPollCount.objects.all().delete()
+            DailyPollCount.objects.bulk_create(
+                [
+                    DailyPollCount(day=row['day'], count=row['count'])
+                    for row in Question.objects.annotate(day=TruncDate('pub_date'))
+                    .values('day').annotate(count=Count('id')).order_by()
+                ],
+                batch_size=1000,
+            )
+        return rollup
+
+
+class StatsRollup(models.Model):
+    """
+    Глобальные счетчики для OverallStatsAPIView (одна строка).
+    Обновляются приращениями при записи опросов и голосов.
+    version растет при любом изменении опросов и голосов - это глобальная
+    версия для ETag поиска и общей статистики.
+    """
+    total_polls = models.IntegerField(default=0)
+    total_votes = models.BigIntegerField(default=0)
+    version = models.PositiveBigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = StatsRollupManager()
+
+    class Meta:
+        verbose_name = 'Сводная статистика'
+        verbose_name_plural = 'Сводная статистика'
+
+
+class DailyPollCountManager(models.Manager):
+    def bump(self, day, count):
+        """Прибавляет count к количеству опросов за день day."""
+        updated = self.filter(day=day).update(count=F('count') + count)
+        if not updated:
+            self.create(day=day, count=count)
+
+
+class DailyPollCount(models.Model):
+    """Количество опросов по дню публикации (в часовом поясе проекта)."""
+    day = models.DateField(unique=True)
+    count = models.IntegerField(default=0)
+
+    objects = DailyPollCountManager()
+
+    class Meta:
+        verbose_name = 'Опросы за день'
+        verbose_name_plural = 'Опросы по дням'
+
+
+class VoteEvent(models.Model):
+    """
+    Журнал голосов: только добавление, пишется пачками (см. analytics.ledger).
+    """
+    question = models.ForeignKey(Question, on_delete=models.CASCADE, related_name='+')
+    choice = models.ForeignKey(Choice, on_delete=models.CASCADE, related_name='+')
+    created_at = models.DateTimeField()
+
+    class Meta:
+        verbose_name = 'Голос'
+        verbose_name_plural = 'Журнал голосов'
+
+
+class VoteBucket(models.Model):
+    """
+    Количество голосов за вариант в интервале времени (минута или час).
+    Заполняется вместе с журналом; временные ряды читают только эти строки.
+    """
+    MINUTE = 'm'
+    HOUR = 'h'
+    RESOLUTIONS = [
+        (MINUTE, 'Минута'),
+        (HOUR, 'Час'),
+    ]
+    # Длина интервала в секундах
+    SECONDS = {MINUTE: 60, HOUR: 3600}
+
+    question = models.ForeignKey(Question, on_delete=models.CASCADE, related_name='+')
+    choice = models.ForeignKey(Choice, on_delete=models.CASCADE, related_name='+')
+    resolution = models.CharField(max_length=1, choices=RESOLUTIONS)
+    start = models.DateTimeField()
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        verbose_name = 'Голоса за интервал'
+        verbose_name_plural = 'Голоса по интервалам'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['choice', 'resolution', 'start'], name='analytics_vote_bucket_unique'
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['question', 'resolution', 'start'], name='analytics_bucket_range_idx'),
+        ]
@@ -0,0 +1,37 @@
+import base64
+import binascii
+import json
+
+from rest_framework.exceptions import ValidationError
+
+
+def encode_cursor(values):
+    """Упаковывает ключ последней строки страницы в непрозрачный токен."""
+    raw = json.dumps(values, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(token):
+    """Распаковывает токен курсора; при повреждении возвращает 400."""
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        values = json.loads(raw)
+    except (binascii.Error, ValueError):
+        raise ValidationError({'cursor': 'Некорректный курсор'})
+    if not isinstance(values, list):
+        raise ValidationError({'cursor': 'Некорректный курсор'})
+    return values
+
+
+def get_page_size(request, default, maximum, name='page_size'):
+    """Читает размер страницы (параметр name) из запроса и ограничивает его сверху."""
+    value = request.query_params.get(name)
+    if value is None:
+        return default
+    try:
+        page_size = int(value)
+    except ValueError:
+        raise ValidationError({name: 'Ожидается целое число'})
+    if page_size < 1:
+        raise ValidationError({name: 'Должно быть не меньше 1'})
+    return min(page_size, maximum)
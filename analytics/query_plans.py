@@ -0,0 +1,100 @@
+"""
+Проверка планов запросов (EXPLAIN QUERY PLAN, SQLite).
+
+Страницы и API открываются тестовым клиентом, все выполненные SELECT
+перехватываются и для каждого строится план. Проблемой считается полный
+просмотр таблицы (SCAN <таблица> без индекса) и сортировка, группировка или DISTINCT
+во временном B-дереве (USE TEMP B-TREE) при просмотре таблицы; неизбежные случаи
+перечислены в ACCEPTED.
+"""
+import re
+from dataclasses import dataclass, field
+
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+
+TABLE_SCAN = re.compile(r'^SCAN (\w+)(.*)$')
+TEMP_BTREE = 'USE TEMP B-TREE'
+
+# Временные B-деревья, которых не избежать индексом: (признак в SQL, вид, причина)
+ACCEPTED = [
+    ('django_datetime_trunc(', 'DISTINCT',
+     'навигация date_hierarchy группирует по выражению с часовым поясом'),
+    (' MATCH ', 'GROUP BY',
+     'совпадения из двух индексов FTS объединяются по вопросу; группируются только найденные строки'),
+    (' MATCH ', 'ORDER BY',
+     'упорядочение по bm25 или по полю только для найденных FTS строк'),
+]
+
+
+@dataclass
+class QueryPlan:
+    sql: str
+    details: list
+    problems: list = field(default_factory=list)
+    accepted: list = field(default_factory=list)
+
+
+def explain(sql, params=()):
+    """Строки плана (столбец detail) для запроса."""
+    with connection.cursor() as cursor:
+        cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+        return [row[-1] for row in cursor.fetchall()]
+
+
+def analyze_plan(sql, details, tables):
+    """
+    Возвращает (проблемы, допустимые особенности) плана.
+    Проблема - полный просмотр таблицы из tables или временное B-дерево
+    при просмотре такой таблицы (при поиске по ключу сортируются лишь найденные строки).
+    """
+    problems, accepted = [], []
+    scanned = False
+    for detail in details:
+        match = TABLE_SCAN.match(detail.strip())
+        if match and match.group(1) in tables and 'VIRTUAL TABLE' not in match.group(2):
+            scanned = True
+            if not match.group(2):
+                problems.append(f'полный просмотр {match.group(1)}')
+    for detail in details:
+        if TEMP_BTREE not in detail:
+            continue
+        kind = detail.split(' FOR ', 1)[-1]
+        reason = next(
+            (reason for marker, accepted_kind, reason in ACCEPTED
+             if marker in sql and kind.endswith(accepted_kind)),
+            None,
+        )
+        if reason is not None:
+            accepted.append(f'{kind}: {reason}')
+        elif scanned:
+            problems.append(f'временное B-дерево для {kind}')
+    return problems, accepted
+
+
+def audit_urls(urls, client=None):
+    """
+    Открывает urls ({название: адрес}) и возвращает {название: [QueryPlan]}
+    для всех SELECT, выполненных при обработке запроса.
+    """
+    client = client or Client()
+    tables = set(connection.introspection.table_names())
+    report = {}
+    for name, url in urls.items():
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(url)
+            if response.streaming:
+                b''.join(response.streaming_content)
+        if response.status_code != 200:
+            raise RuntimeError(f'{name}: {url} вернул HTTP {response.status_code}')
+        plans = []
+        for query in queries.captured_queries:
+            sql = query['sql']
+            if not sql.lstrip().upper().startswith(('SELECT', 'WITH')):
+                continue
+            details = explain(sql)
+            problems, accepted = analyze_plan(sql, details, tables)
+            plans.append(QueryPlan(sql, details, problems, accepted))
+        report[name] = plans
+    return report
@@ -0,0 +1,59 @@
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:  # без orjson работает обычный JSONRenderer
+    orjson = None
+
+# Для типов, которых orjson не знает (и для дат), - преобразования JSONRenderer
+_encoder = JSONEncoder()
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer, который кодирует через orjson, если он установлен.
+    Вывод побайтно совпадает с JSONRenderer: те же компактные разделители
+    и UTF-8 без экранирования, даты и прочие нестандартные типы проходят
+    через тот же JSONEncoder DRF, а U+2028/U+2029 экранируются.
+    С отступами (Accept: application/json; indent=4) и для того,
+    что orjson закодировать не может, - обычный путь DRF.
+    """
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if (
+            orjson is None or data is None or not self.compact or self.ensure_ascii
+            or self.get_indent(accepted_media_type, renderer_context or {}) is not None
+        ):
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            content = orjson.dumps(
+                data, default=_encoder.default,
+                option=orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS,
+            )
+        except orjson.JSONEncodeError:
+            return super().render(data, accepted_media_type, renderer_context)
+        if b'\xe2\x80\xa8' in content or b'\xe2\x80\xa9' in content:
+            content = content.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+        return content
+
+
+class ImageRenderer(BaseRenderer):
+    """
+    Отдает готовые байты изображения как есть.
+    Данные для ответа - bytes, уже закодированные в нужный формат.
+    """
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return data
+
+
+class PNGRenderer(ImageRenderer):
+    media_type = 'image/png'
+    format = 'png'
+
+
+class SVGRenderer(ImageRenderer):
+    media_type = 'image/svg+xml'
+    format = 'svg'
@@ -0,0 +1,48 @@
+"""
+Отрисовка диаграмм без глобального состояния pyplot.
+
+Модуль не зависит от Django: функции выполняются в процессах пула
+(см. analytics.charts), поэтому принимают и возвращают только простые данные.
+Каждая диаграмма рисуется на собственных Figure и холсте Agg.
+"""
+import io
+
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+
+BAR_COLORS = ['#4CAF50', '#2196F3', '#FF9800', '#F44336']
+
+
+def render_bar_chart(question_text, labels, votes, image_format='png'):
+    """
+    Рисует столбчатую диаграмму результатов.
+    Возвращает изображение в байтах в формате image_format ('png' или 'svg').
+    """
+    figure = Figure(figsize=(10, 6))
+    FigureCanvasAgg(figure)
+    axes = figure.add_subplot()
+    bars = axes.bar(labels, votes, color=BAR_COLORS)
+
+    # Добавляем значения на столбцы
+    for bar, vote in zip(bars, votes):
+        axes.text(bar.get_x() + bar.get_width()/2, bar.get_height() + 0.5,
+                  str(vote), ha='center', va='bottom')
+
+    axes.set_xlabel('Варианты ответов')
+    axes.set_ylabel('Количество голосов')
+    axes.set_title(f'Результаты опроса: {question_text[:50]}...')
+    for label in axes.get_xticklabels():
+        label.set_rotation(45)
+        label.set_horizontalalignment('right')
+    figure.tight_layout()
+
+    buffer = io.BytesIO()
+    # Без даты в метаданных SVG одинаковые данные дают одинаковые байты
+    metadata = {'Date': None} if image_format == 'svg' else None
+    figure.savefig(buffer, format=image_format, dpi=100, metadata=metadata)
+    return buffer.getvalue()
+
+
+def warm_up():
+    """Рисует пустую диаграмму: загружает шрифты и бэкенд в текущем процессе."""
+    render_bar_chart('', [''], [0])
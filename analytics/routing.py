@@ -0,0 +1,193 @@
+"""
+Чтение аналитики с реплики.
+
+Запросы представлений с ReplicaReadMixin читают из базы ANALYTICS_REPLICA_DATABASE,
+если она настроена (read-only соединение с основным файлом в режиме WAL или
+периодически обновляемый снимок, см. ANALYTICS_REPLICA_PATH); запись всегда идет в default.
+
+Чтобы пользователь видел свой голос, после любого успешного изменяющего запроса
+ReplicaPinMiddleware ставит cookie, и следующие ANALYTICS_REPLICA_PIN_SECONDS
+секунд его запросы читают из основной базы. Отставание реплики оценивается
+по StatsRollup.updated_at (меняется при каждом голосе и новом опросе),
+отдается в заголовке X-Replica-Lag, а при превышении ANALYTICS_REPLICA_MAX_LAG
+чтение переключается на основную базу.
+"""
+import contextvars
+import threading
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+from django.utils.deprecation import MiddlewareMixin
+
+PIN_COOKIE = 'analytics_primary_until'
+
+# Приложения, чьи таблицы читаются с реплики; сессии, пользователи и прочие
+# служебные таблицы всегда читаются из основной базы
+REPLICA_APP_LABELS = {'analytics', 'polls'}
+
+# База, из которой читает текущий запрос аналитики (None - решает Django)
+_read_database = contextvars.ContextVar('analytics_read_database', default=None)
+
+
+def replica_alias():
+    alias = settings.ANALYTICS_REPLICA_DATABASE
+    return alias if alias and alias in connections.databases else None
+
+
+class ReplicaLag:
+    """Отставание реплики, сек; пересчитывается не чаще раза в ANALYTICS_REPLICA_LAG_CHECK."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._value = None
+        self._checked_at = None
+
+    def get(self, alias):
+        with self._lock:
+            if self._checked_at is not None and \
+                    time.monotonic() - self._checked_at < settings.ANALYTICS_REPLICA_LAG_CHECK:
+                return self._value
+        value = self.measure(alias)
+        with self._lock:
+            self._value, self._checked_at = value, time.monotonic()
+        return value
+
+    def measure(self, alias):
+        """Разница StatsRollup.updated_at на основной базе и реплике; None - реплика недоступна."""
+        from .models import StatsRollup
+
+        try:
+            primary = StatsRollup.objects.using(DEFAULT_DB_ALIAS).values_list('updated_at', flat=True).first()
+            replica = StatsRollup.objects.using(alias).values_list('updated_at', flat=True).first()
+        except DatabaseError:
+            return None
+        if primary is None or replica is None:
+            return 0.0 if primary == replica else None
+        return max(0.0, (primary - replica).total_seconds())
+
+    def reset(self):
+        with self._lock:
+            self._value = self._checked_at = None
+
+
+replica_lag = ReplicaLag()
+
+
+def is_pinned(request):
+    """Пользователь недавно что-то изменил и должен читать из основной базы."""
+    try:
+        return float(request.COOKIES.get(PIN_COOKIE, 0)) > time.time()
+    except ValueError:
+        return False
+
+
+def read_from(database, chunks):
+    token = _read_database.set(database)
+    try:
+        yield from chunks
+    finally:
+        _read_database.reset(token)
+
+
+async def aread_from(database, chunks):
+    token = _read_database.set(database)
+    try:
+        async for chunk in chunks:
+            yield chunk
+    finally:
+        _read_database.reset(token)
+
+
+def choose_read_database(request):
+    """Возвращает (база для чтений запроса, отставание реплики или None)."""
+    alias = replica_alias()
+    if alias is None or request.method not in ('GET', 'HEAD') or is_pinned(request):
+        return DEFAULT_DB_ALIAS, None
+    lag = replica_lag.get(alias)
+    if lag is not None and lag <= settings.ANALYTICS_REPLICA_MAX_LAG:
+        return alias, lag
+    return DEFAULT_DB_ALIAS, lag
+
+
+class ReplicaReadMixin:
+    """
+    Направляет чтения представления на реплику и сообщает в заголовках,
+    откуда прочитаны данные (X-Read-Database) и насколько отстает реплика (X-Replica-Lag).
+    """
+    def dispatch(self, request, *args, **kwargs):
+        if self.view_is_async:
+            return self.adispatch_with_database(request, *args, **kwargs)
+        database, lag = choose_read_database(request)
+        token = _read_database.set(database)
+        try:
+            response = super().dispatch(request, *args, **kwargs)
+        finally:
+            _read_database.reset(token)
+        if response.streaming:
+            # Потоковый ответ читает базу уже после выхода из dispatch
+            response.streaming_content = read_from(database, response.streaming_content)
+        return self.mark_database(response, database, lag)
+    
+    async def adispatch_with_database(self, request, *args, **kwargs):
+        if replica_alias() is None:
+            database, lag = DEFAULT_DB_ALIAS, None
+        else:
+            # Замер отставания обращается к базе
+            database, lag = await sync_to_async(choose_read_database)(request)
+        token = _read_database.set(database)
+        try:
+            response = await super().dispatch(request, *args, **kwargs)
+        finally:
+            _read_database.reset(token)
+        if response.streaming:
+            if response.is_async:
+                response.streaming_content = aread_from(database, response.streaming_content)
+            else:
+                response.streaming_content = read_from(database, response.streaming_content)
+        return self.mark_database(response, database, lag)
+    
+    def mark_database(self, response, database, lag):
+        response['X-Read-Database'] = database
+        if lag is not None:
+            response['X-Replica-Lag'] = f'{lag:.3f}'
+        return response
+
+
+class AnalyticsReplicaRouter:
+    """
+    Чтения моделей опросов и аналитики внутри ReplicaReadMixin - с реплики,
+    все остальное - как обычно.
+    """
+
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label not in REPLICA_APP_LABELS:
+            return None
+        return _read_database.get()
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Реплика содержит те же строки, что и основная база
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        # Реплика только читает: ее схема приходит из основной базы
+        return db != settings.ANALYTICS_REPLICA_DATABASE
+
+
+class ReplicaPinMiddleware(MiddlewareMixin):
+    """
+    После успешного изменяющего запроса закрепляет пользователя за основной базой.
+    Работает и под ASGI без переключения асинхронных представлений в поток.
+    """
+    
+    def process_response(self, request, response):
+        if request.method not in ('GET', 'HEAD', 'OPTIONS') and response.status_code < 400:
+            response.set_cookie(
+                PIN_COOKIE, f'{time.time() + settings.ANALYTICS_REPLICA_PIN_SECONDS:.3f}',
+                max_age=settings.ANALYTICS_REPLICA_PIN_SECONDS, httponly=True, samesite='Lax',
+            )
+        return response
@@ -0,0 +1,116 @@
+from collections import Counter
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from polls.models import Question, Choice
+from polls.signals import polls_created, votes_cast
+from .ledger import vote_ledger
+from .models import DailyPollCount, PollStatistic, StatsRollup
+from .trending import trending
+
+
+@receiver(votes_cast)
+def count_votes(sender, deltas, **kwargs):
+    """Прибавляет новые голоса к PollStatistic их опросов и к общему счетчику."""
+    question_totals = Counter()
+    for (question_id, _), count in deltas.items():
+        question_totals[question_id] += count
+    PollStatistic.objects.add_votes(question_totals)
+    StatsRollup.objects.bump(votes=sum(question_totals.values()))
+    # В журнал и рейтинг "горячих" попадают только голоса из зафиксированных транзакций.
+    # Голос уже записан: ошибка сброса журнала (он сохранит голоса в очереди)
+    # только логируется и не должна превращать ответ в 500
+    transaction.on_commit(lambda: record_committed_votes(deltas), robust=True)
+
+
+def record_committed_votes(deltas):
+    # Рейтинг обновляется до журнала: при первой сборке он читает
+    # незаписанные голоса журнала и не должен увидеть этот голос дважды
+    trending.add(deltas)
+    vote_ledger.record(deltas)
+
+
+@receiver(polls_created)
+def count_created_polls(sender, questions, choices, **kwargs):
+    """Статистика и сводные счетчики для опросов, созданных пакетом (bulk_create)."""
+    totals = Counter()
+    for choice in choices:
+        totals[choice.question_id] += choice.votes
+    PollStatistic.objects.bulk_create(
+        [PollStatistic(question=question, total_votes=totals[question.id]) for question in questions],
+        batch_size=1000,
+    )
+    StatsRollup.objects.bump(polls=len(questions), votes=sum(totals.values()))
+    days = Counter(timezone.localdate(question.pub_date) for question in questions)
+    for day, count in days.items():
+        DailyPollCount.objects.bump(day, count)
+
+
+@receiver(pre_save, sender=Question)
+def remember_pub_day(sender, instance, raw=False, **kwargs):
+    """Запоминает прежний день публикации, чтобы перенести опрос между дневными счетчиками."""
+    instance._rollup_old_pub_date = None
+    if not raw and not instance._state.adding:
+        instance._rollup_old_pub_date = (
+            Question.objects.filter(pk=instance.pk).values_list('pub_date', flat=True).first()
+        )
+
+
+@receiver(post_save, sender=Question)
+def create_statistic(sender, instance, created, raw=False, **kwargs):
+    """У каждого нового опроса сразу появляется строка статистики."""
+    if raw:
+        return
+    day = timezone.localdate(instance.pub_date)
+    if created:
+        PollStatistic.objects.get_or_create(question=instance)
+        StatsRollup.objects.bump(polls=1)
+        DailyPollCount.objects.bump(day, 1)
+        return
+    # Правка вопроса меняет его страницы, выдачу поиска и общую статистику
+    PollStatistic.objects.touch(instance.pk)
+    StatsRollup.objects.bump()
+    old_pub_date = getattr(instance, '_rollup_old_pub_date', None)
+    if old_pub_date is not None and timezone.localdate(old_pub_date) != day:
+        DailyPollCount.objects.bump(timezone.localdate(old_pub_date), -1)
+        DailyPollCount.objects.bump(day, 1)
+
+
+@receiver(post_delete, sender=Question)
+def forget_question(sender, instance, **kwargs):
+    # Голоса вычитаются при каскадном удалении вариантов
+    StatsRollup.objects.bump(polls=-1)
+    DailyPollCount.objects.bump(timezone.localdate(instance.pub_date), -1)
+
+
+@receiver(pre_save, sender=Choice)
+def remember_votes(sender, instance, raw=False, **kwargs):
+    """Запоминает прежнее число голосов варианта для приращения общего счетчика."""
+    instance._rollup_old_votes = 0
+    if not raw and not instance._state.adding:
+        instance._rollup_old_votes = (
+            Choice.objects.filter(pk=instance.pk).values_list('votes', flat=True).first() or 0
+        )
+
+
+@receiver(post_save, sender=Choice)
+def refresh_statistic_on_save(sender, instance, raw=False, **kwargs):
+    """Правка или добавление варианта (например, в админке) пересчитывает итог опроса."""
+    if raw:
+        return
+    PollStatistic.objects.refresh(instance.question_id)
+    if isinstance(instance.votes, int):
+        StatsRollup.objects.bump(votes=instance.votes - instance._rollup_old_votes)
+    else:
+        # votes = F(...): новое значение известно только базе
+        StatsRollup.objects.rebuild()
+
+
+@receiver(post_delete, sender=Choice)
+def refresh_statistic_on_delete(sender, instance, **kwargs):
+    # Не создаем статистику: опрос мог удаляться каскадом вместе с вариантами
+    PollStatistic.objects.refresh(instance.question_id, create=False)
+    StatsRollup.objects.bump(votes=-instance.votes)
@@ -0,0 +1,68 @@
+"""
+Синтетические опросы для замеров на тестовой базе
+(explain_queries, bench_asgi, bench_api) и для команды seed_polls.
+"""
+import random
+from datetime import timedelta
+
+from django.db import connection
+from django.utils import timezone
+
+from polls.importing import PollData, import_polls
+from polls.models import Choice, Question
+
+from .ledger import vote_ledger
+
+# Готовые размеры наборов данных (число опросов)
+DATASETS = {'10k': 10_000, '100k': 100_000, '1m': 1_000_000}
+
+# Слова для текстов вопросов и вариантов, чтобы полнотекстовому поиску было что искать
+WORDS = [
+    'город', 'погода', 'кофе', 'чай', 'отпуск', 'море', 'горы', 'книга', 'фильм', 'музыка',
+    'спорт', 'футбол', 'работа', 'офис', 'дом', 'поезд', 'самолет', 'велосипед', 'метро', 'парк',
+    'язык', 'python', 'django', 'база', 'сервер', 'облако', 'телефон', 'ноутбук', 'игра', 'кошка',
+    'собака', 'завтрак', 'обед', 'ужин', 'выходные', 'праздник', 'зима', 'лето', 'осень', 'весна',
+]
+
+
+def synthetic_polls(count, seed=0, now=None, min_choices=4, max_choices=4):
+    """
+    Опросы, опубликованные в течение последнего года, с min_choices..max_choices
+    вариантами. Голоса распределены с тяжелым хвостом (Парето): у большинства
+    вариантов их немного, у редких - тысячи.
+    """
+    rng = random.Random(seed)
+    now = now or timezone.now()
+    for number in range(count):
+        words = ' '.join(rng.sample(WORDS, 3))
+        yield PollData(
+            question_text=f'Вопрос {number}: {words}?',
+            pub_date=now - timedelta(minutes=rng.randrange(365 * 24 * 60)),
+            choices=[
+                (f'Вариант {choice} {rng.choice(WORDS)}', int((rng.paretovariate(1.2) - 1) * 20))
+                for choice in range(rng.randint(min_choices, max_choices))
+            ],
+        )
+
+
+def seed_database(count, seed=0, min_choices=4, max_choices=4, batch_size=1000, progress=None):
+    """
+    Создает count опросов, голоса за последние сутки у самого свежего из них
+    (журнал и счетчики) и обновляет статистику планировщика.
+    progress(report) вызывается после каждой пачки (см. import_polls).
+    Возвращает этот самый свежий опрос.
+    """
+    now = timezone.now()
+    import_polls(
+        synthetic_polls(count, seed, now, min_choices, max_choices),
+        batch_size=batch_size, progress=progress,
+    )
+    question = Question.objects.filter(pub_date__lte=now).order_by('-pub_date').first()
+    for choice in Choice.objects.filter(question=question):
+        for minutes in range(0, 24 * 60, 7):
+            vote_ledger.record({(question.id, choice.id): 1}, at=now - timedelta(minutes=minutes))
+    vote_ledger.flush()
+    if connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+    return question
@@ -1,3 +1,1291 @@
-from django.test import TestCase
+import asyncio
+import base64
+import datetime
+from decimal import Decimal
+from io import StringIO
+import itertools
+import json
+from unittest import mock, skipIf
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import User
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import OperationalError, connection
+from django.db.models import F
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.utils.translation import gettext_lazy
+from django.urls import reverse
+from rest_framework.renderers import JSONRenderer
 
-# Create your tests here.
+from mysite.metrics import registry
+from polls.models import Question, Choice
+from .benchmark import compare_runs, run_load, summarize
+from .charts import ChartCache, chart_cache, shutdown_render_pool
+from .ledger import vote_ledger
+from .live import LiveResults, TooManySubscribers, live_results
+from .models import DailyPollCount, PollStatistic, StatsRollup, VoteBucket, VoteEvent
+from .query_plans import analyze_plan, audit_urls
+from .renderers import FastJSONRenderer, orjson
+from .routing import PIN_COOKIE, AnalyticsReplicaRouter, read_from, replica_lag
+from .serializers import PollStatSerializer, poll_stat_representation
+from .synthetic import synthetic_polls
+from .trending import TrendingTracker, trending
+from .views import poll_stat_data
+
+
+def create_poll(question_text, choices, days=-1):
+    """
+    Создает опрос с вариантами ответов.
+    choices - список пар (текст варианта, количество голосов).
+    """
+    question = Question.objects.create(
+        question_text=question_text,
+        pub_date=timezone.now() + datetime.timedelta(days=days),
+    )
+    for choice_text, votes in choices:
+        Choice.objects.create(question=question, choice_text=choice_text, votes=votes)
+    return question
+
+
+# Тесты для LRU-кэша диаграмм
+class ChartCacheTests(TestCase):
+    def test_evicts_least_recently_used(self):
+        """
+        При превышении лимита записей вытесняется давно не использованная диаграмма.
+        """
+        cache = ChartCache(max_entries=2)
+        cache.set((1, 'a'), b'1')
+        cache.set((2, 'a'), b'2')
+        cache.get((1, 'a'))
+        cache.set((3, 'a'), b'3')
+        self.assertIsNone(cache.get((2, 'a')))
+        self.assertEqual(cache.get((1, 'a')), b'1')
+        self.assertEqual(cache.stats()['evictions'], 1)
+
+    def test_bounded_by_bytes(self):
+        """
+        Суммарный размер диаграмм не превышает max_bytes.
+        """
+        cache = ChartCache(max_bytes=10)
+        cache.set((1, 'a'), b'x' * 6)
+        cache.set((2, 'a'), b'x' * 6)
+        self.assertEqual(cache.stats()['entries'], 1)
+        self.assertLessEqual(cache.stats()['bytes'], 10)
+
+    def test_new_version_replaces_old(self):
+        """
+        Новая версия диаграммы вопроса вытесняет предыдущую.
+        """
+        cache = ChartCache()
+        cache.set((1, 'v1'), b'old')
+        cache.set((1, 'v2'), b'new')
+        self.assertIsNone(cache.get((1, 'v1')))
+        self.assertEqual(cache.stats()['entries'], 1)
+
+
+# Тесты для PollChartAPIView
+class PollChartAPIViewTests(TestCase):
+    def setUp(self):
+        chart_cache.clear()
+
+    def test_repeated_request_is_cache_hit(self):
+        """
+        Повторный запрос без изменений голосов берет диаграмму из кэша.
+        """
+        question = create_poll("Вопрос", [("Да", 1), ("Нет", 2)])
+        url = reverse('poll_chart', args=(question.id,))
+        first = self.client.get(url)
+        second = self.client.get(url)
+        self.assertEqual(first['X-Chart-Cache'], 'miss')
+        self.assertEqual(second['X-Chart-Cache'], 'hit')
+        self.assertEqual(first.json()['chart'], second.json()['chart'])
+
+    def test_vote_triggers_rerender(self):
+        """
+        Голос за вариант опроса меняет версию и приводит к перерисовке.
+        """
+        question = create_poll("Вопрос", [("Да", 1), ("Нет", 2)])
+        url = reverse('poll_chart', args=(question.id,))
+        self.client.get(url)
+        choice = question.choice_set.get(choice_text="Да")
+        self.client.post(reverse('polls:vote', args=(question.id,)), {'choice': choice.id})
+        self.assertEqual(self.client.get(url)['X-Chart-Cache'], 'miss')
+
+    def test_other_poll_vote_keeps_cache(self):
+        """
+        Голос в другом опросе не сбрасывает кэшированную диаграмму.
+        """
+        question = create_poll("Вопрос", [("Да", 1)])
+        other = create_poll("Другой", [("А", 0)])
+        url = reverse('poll_chart', args=(question.id,))
+        self.client.get(url)
+        self.client.post(reverse('polls:vote', args=(other.id,)),
+                         {'choice': other.choice_set.get().id})
+        self.assertEqual(self.client.get(url)['X-Chart-Cache'], 'hit')
+
+    def test_cache_stats_endpoint(self):
+        """
+        Счетчики попаданий и промахов доступны через API.
+        """
+        question = create_poll("Вопрос", [("Да", 1)])
+        url = reverse('poll_chart', args=(question.id,))
+        self.client.get(url)
+        self.client.get(url)
+        stats = self.client.get(reverse('chart_cache_stats')).json()
+        self.assertEqual(stats['hits'], 1)
+        self.assertEqual(stats['misses'], 1)
+        self.assertEqual(stats['entries'], 1)
+
+    @override_settings(ANALYTICS_CHART_WORKERS=0)
+    def test_inline_rendering_without_pool(self):
+        """
+        Без пула процессов диаграмма рисуется в потоке запроса тем же кодом.
+        """
+        question = create_poll("Вопрос", [("Да", 3)])
+        response = self.client.get(reverse('poll_chart', args=(question.id,)))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.json()['chart'].startswith('data:image/png;base64,'))
+
+    @override_settings(ANALYTICS_CHART_TIMEOUT=0.000001)
+    def test_render_timeout_returns_503(self):
+        """
+        Если пул не успел отрисовать диаграмму, API отвечает 503, а не висит.
+        """
+        shutdown_render_pool()
+        question = create_poll("Вопрос", [("Да", 3)])
+        response = self.client.get(reverse('poll_chart', args=(question.id,)))
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(chart_cache.stats()['entries'], 0)
+
+
+# Тесты для бинарных вариантов диаграммы
+class PollChartImageTests(TestCase):
+    def setUp(self):
+        chart_cache.clear()
+
+    def test_png_endpoint_returns_raw_bytes(self):
+        """
+        chart.png отдает сырые байты PNG с правильными заголовками.
+        """
+        question = create_poll("Вопрос", [("Да", 1), ("Нет", 2)])
+        response = self.client.get(reverse('poll_chart_png', args=(question.id,)))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'image/png')
+        self.assertTrue(response.content.startswith(b'\x89PNG'))
+        self.assertEqual(int(response['Content-Length']), len(response.content))
+        self.assertIn('max-age', response['Cache-Control'])
+
+    def test_svg_endpoint(self):
+        """
+        chart.svg отдает SVG-документ.
+        """
+        question = create_poll("Вопрос", [("Да", 1)])
+        response = self.client.get(reverse('poll_chart_svg', args=(question.id,)))
+        self.assertEqual(response['Content-Type'], 'image/svg+xml')
+        self.assertIn(b'<svg', response.content)
+
+    def test_accept_header_negotiation(self):
+        """
+        /chart/ по умолчанию отдает прежний JSON, а с Accept: image/png - само изображение.
+        """
+        question = create_poll("Вопрос", [("Да", 1)])
+        url = reverse('poll_chart', args=(question.id,))
+        self.assertIn('chart', self.client.get(url).json())
+        image = self.client.get(url, HTTP_ACCEPT='image/png')
+        self.assertEqual(image['Content-Type'], 'image/png')
+        json_chart = self.client.get(url).json()['chart']
+        self.assertEqual(json_chart.split(',', 1)[1],
+                         base64.b64encode(image.content).decode('utf-8'))
+
+    def test_missing_question_returns_json_error(self):
+        """
+        Для несуществующего опроса chart.png отвечает 404 в JSON.
+        """
+        response = self.client.get(reverse('poll_chart_png', args=(999,)))
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response['Content-Type'], 'application/json')
+
+
+# Тесты для ленивой загрузки графиков
+class StartupBudgetTests(TestCase):
+    def test_charting_stack_not_loaded_at_startup(self):
+        """
+        Старт процесса и первые запросы не загружают matplotlib/numpy.
+        """
+        out = StringIO()
+        call_command('bench_startup', runs=1, max_boot_ms=60000,
+                     max_first_request_ms=60000, json=True, stdout=out)
+        self.assertIn('"heavy_modules": []', out.getvalue())
+
+
+# Тесты для PollSearchAPIView
+class PollSearchAPIViewTests(TestCase):
+    def collect(self, params):
+        """Проходит все страницы поиска по next_cursor и возвращает id опросов."""
+        ids = []
+        params = dict(params)
+        while True:
+            data = self.client.get(reverse('poll_search'), params).json()
+            ids += [item['id'] for item in data['results']]
+            if not data['next_cursor']:
+                return ids
+            params['cursor'] = data['next_cursor']
+
+    def test_recent_pages_cover_all_polls(self):
+        """
+        Страницы по (pub_date, id) покрывают все опросы без повторов,
+        включая опросы с одинаковой датой публикации.
+        """
+        pub_date = timezone.now() - datetime.timedelta(days=1)
+        same_date = [Question.objects.create(question_text=f"Q{i}", pub_date=pub_date) for i in range(3)]
+        older = create_poll("Старый", [], days=-5)
+        ids = self.collect({'page_size': 2})
+        self.assertEqual(ids, [q.id for q in reversed(same_date)] + [older.id])
+
+    def test_popularity_pages(self):
+        """
+        Сортировка по популярности листается по (total_votes, id).
+        """
+        low = create_poll("Мало", [("А", 1)])
+        high = create_poll("Много", [("А", 5), ("Б", 5)])
+        empty = create_poll("Пусто", [])
+        tie = create_poll("Ничья", [("А", 1)])
+        ids = self.collect({'sort_by': 'popularity', 'page_size': 1})
+        self.assertEqual(ids, [high.id, tie.id, low.id, empty.id])
+
+    def test_page_size_is_bounded(self):
+        """
+        page_size ограничен сверху, некорректные значения дают 400.
+        """
+        with self.settings(ANALYTICS_SEARCH_MAX_PAGE_SIZE=2):
+            for i in range(3):
+                create_poll(f"Q{i}", [])
+            data = self.client.get(reverse('poll_search'), {'page_size': 100}).json()
+            self.assertEqual(len(data['results']), 2)
+        response = self.client.get(reverse('poll_search'), {'page_size': 'много'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_invalid_cursor(self):
+        """
+        Поврежденный или чужой курсор отклоняется с 400.
+        """
+        for i in range(2):
+            create_poll(f"Q{i}", [])
+        cursor = self.client.get(reverse('poll_search'), {'page_size': 1}).json()['next_cursor']
+        response = self.client.get(reverse('poll_search'), {'cursor': 'мусор'})
+        self.assertEqual(response.status_code, 400)
+        response = self.client.get(reverse('poll_search'), {'cursor': cursor, 'sort_by': 'popularity'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_stream_mode(self):
+        """
+        stream=1 отдает все опросы построчно в NDJSON.
+        """
+        first = create_poll("Первый", [("А", 2)], days=-2)
+        second = create_poll("Второй", [], days=-1)
+        response = self.client.get(reverse('poll_search'), {'stream': 1})
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+        self.assertEqual([row['id'] for row in rows], [second.id, first.id])
+        self.assertEqual(rows[1]['total_votes'], 2)
+
+
+# Тесты для поддержки PollStatistic
+class PollStatisticTests(TestCase):
+    def total(self, question):
+        return PollStatistic.objects.get(question=question).total_votes
+
+    def test_created_with_question(self):
+        """
+        У нового опроса сразу есть статистика с суммой голосов вариантов.
+        """
+        question = create_poll("Вопрос", [("А", 2), ("Б", 3)])
+        self.assertEqual(self.total(question), 5)
+
+    def test_vote_increments_total(self):
+        """
+        Голос через polls.views.vote увеличивает total_votes.
+        """
+        question = create_poll("Вопрос", [("А", 2)])
+        choice = question.choice_set.get()
+        self.client.post(reverse('polls:vote', args=(question.id,)), {'choice': choice.id})
+        self.assertEqual(self.total(question), 3)
+
+    def test_choice_edit_and_delete(self):
+        """
+        Правка и удаление варианта пересчитывают итог опроса.
+        """
+        question = create_poll("Вопрос", [("А", 2), ("Б", 3)])
+        choice = question.choice_set.get(choice_text="А")
+        choice.votes = 10
+        choice.save()
+        self.assertEqual(self.total(question), 13)
+        choice.delete()
+        self.assertEqual(self.total(question), 3)
+
+    def test_question_delete_cascades(self):
+        """
+        Удаление опроса удаляет и его статистику.
+        """
+        question = create_poll("Вопрос", [("А", 2)])
+        question.delete()
+        self.assertFalse(PollStatistic.objects.exists())
+
+    def test_rebuild_command_repairs_drift(self):
+        """
+        rebuild_poll_statistics восстанавливает разошедшиеся и пропавшие итоги.
+        """
+        first = create_poll("Первый", [("А", 2)])
+        second = create_poll("Второй", [("А", 4)])
+        PollStatistic.objects.filter(question=first).update(total_votes=100)
+        PollStatistic.objects.filter(question=second).delete()
+        out = StringIO()
+        call_command('rebuild_poll_statistics', stdout=out)
+        self.assertIn('исправлено расхождений: 2', out.getvalue())
+        self.assertEqual(self.total(first), 2)
+        self.assertEqual(self.total(second), 4)
+
+    def test_overall_stats_reads_statistic(self):
+        """
+        Общая статистика берет итоги и топ опросов из PollStatistic.
+        """
+        low = create_poll("Мало", [("А", 1)])
+        high = create_poll("Много", [("А", 7)])
+        data = self.client.get(reverse('overall_stats')).json()
+        self.assertEqual(data['total_votes'], 8)
+        self.assertEqual([poll['id'] for poll in data['popular_polls']], [high.id, low.id])
+
+
+# Тесты для сводных счетчиков OverallStatsAPIView
+class StatsRollupTests(TestCase):
+    def test_counters_follow_writes(self):
+        """
+        Счетчики совпадают с полным пересчетом после создания, голосования,
+        правки и удаления опросов.
+        """
+        first = create_poll("Первый", [("А", 2), ("Б", 1)])
+        second = create_poll("Второй", [("А", 4)], days=-10)
+        choice = first.choice_set.get(choice_text="А")
+        self.client.post(reverse('polls:vote', args=(first.id,)), {'choice': choice.id})
+        second.pub_date = timezone.now() - datetime.timedelta(days=3)
+        second.save()
+        first.delete()
+        
+        rollup = StatsRollup.objects.current()
+        days = dict(DailyPollCount.objects.exclude(count=0).values_list('day', 'count'))
+        expected = StatsRollup.objects.rebuild()
+        self.assertEqual((rollup.total_polls, rollup.total_votes), (1, 4))
+        self.assertEqual((expected.total_polls, expected.total_votes), (1, 4))
+        self.assertEqual(days, dict(DailyPollCount.objects.values_list('day', 'count')))
+
+    def test_overall_endpoint(self):
+        """
+        Эндпоинт отдает счетчики, точное число опросов за 7 дней и as_of.
+        """
+        create_poll("Новый", [("А", 3)], days=-1)
+        create_poll("На границе", [("А", 1)], days=-6.9)
+        create_poll("Старый", [("А", 1)], days=-7.1)
+        data = self.client.get(reverse('overall_stats')).json()
+        self.assertEqual(data['total_polls'], 3)
+        self.assertEqual(data['total_votes'], 5)
+        self.assertEqual(data['recent_polls'], 2)
+        self.assertIn('as_of', data)
+
+
+# Тесты для пакетной статистики
+class PollStatsBatchAPIViewTests(TestCase):
+    def test_same_shape_as_single_endpoint(self):
+        """
+        Для каждого id возвращается то же, что и у /polls/<id>/stats/.
+        """
+        first = create_poll("Первый", [("А", 1), ("Б", 3)])
+        second = create_poll("Второй", [])
+        response = self.client.get(reverse('poll_stats_batch'), {'ids': f'{second.id},{first.id},999'})
+        data = response.json()
+        self.assertEqual(list(data['polls']), [str(second.id), str(first.id)])
+        self.assertEqual(data['missing'], [999])
+        for question in (first, second):
+            single = self.client.get(reverse('poll_stats', args=(question.id,))).json()
+            self.assertEqual(data['polls'][str(question.id)], single)
+
+    def test_constant_number_of_queries(self):
+        """
+        Число запросов к базе не зависит от числа опросов.
+        """
+        ids = [create_poll(f"Q{i}", [("А", i), ("Б", 1)]).id for i in range(10)]
+        with self.assertNumQueries(2):
+            self.client.get(reverse('poll_stats_batch'), {'ids': ','.join(map(str, ids))})
+
+    def test_ids_validation(self):
+        """
+        Пустой, некорректный или слишком длинный список id дает 400.
+        """
+        url = reverse('poll_stats_batch')
+        self.assertEqual(self.client.get(url).status_code, 400)
+        self.assertEqual(self.client.get(url, {'ids': '1,a'}).status_code, 400)
+        with self.settings(ANALYTICS_STATS_BATCH_MAX_IDS=2):
+            self.assertEqual(self.client.get(url, {'ids': '1,2,3'}).status_code, 400)
+
+
+# Тесты для полнотекстового поиска
+class PollTextSearchTests(TestCase):
+    def search(self, **params):
+        return self.client.get(reverse('poll_search'), params).json()
+
+    def test_prefix_match_in_question_and_choices(self):
+        """
+        q ищет по префиксам слов в тексте вопроса и вариантов, без учета регистра.
+        """
+        colour = create_poll("Любимый цвет?", [("Красный", 0), ("Синий", 0)])
+        food = create_poll("Любимая еда?", [("Пицца", 0)])
+        create_poll("Погода", [("Солнце", 0)])
+        self.assertEqual({item['id'] for item in self.search(q='люб')['results']},
+                         {colour.id, food.id})
+        self.assertEqual([item['id'] for item in self.search(q='КРАСН')['results']], [colour.id])
+
+    def test_question_match_ranks_above_choice_match(self):
+        """
+        Совпадение в тексте вопроса выше по релевантности, чем в варианте.
+        """
+        in_choice = create_poll("Что на ужин?", [("Пицца", 0)])
+        in_question = create_poll("Пицца или суши?", [("Да", 0)])
+        ids = [item['id'] for item in self.search(q='пицца')['results']]
+        self.assertEqual(ids, [in_question.id, in_choice.id])
+
+    def test_relevance_pages_and_filters(self):
+        """
+        Выдача по релевантности листается курсором и учитывает фильтр по дате.
+        """
+        matches = [create_poll(f"Опрос про кошек {i}", [], days=-i - 1) for i in range(3)]
+        create_poll("Старый опрос про кошек", [], days=-100)
+        date_from = (timezone.now() - datetime.timedelta(days=10)).date().isoformat()
+        first = self.search(q='кошек', page_size=2, date_from=date_from)
+        second = self.search(q='кошек', page_size=2, date_from=date_from, cursor=first['next_cursor'])
+        ids = [item['id'] for item in first['results'] + second['results']]
+        self.assertEqual(sorted(ids), sorted(q.id for q in matches))
+        self.assertIsNone(second['next_cursor'])
+
+    def test_index_follows_edits(self):
+        """
+        Правка и удаление вариантов сразу отражаются в поиске.
+        """
+        question = create_poll("Вопрос", [("Яблоко", 0)])
+        choice = question.choice_set.get()
+        choice.choice_text = "Груша"
+        choice.save()
+        self.assertEqual(self.search(q='яблоко')['results'], [])
+        self.assertEqual(len(self.search(q='груша')['results']), 1)
+        choice.delete()
+        self.assertEqual(self.search(q='груша')['results'], [])
+
+    def test_admin_search_uses_index(self):
+        """
+        Поиск в админке находит вопросы, в том числе по тексту вариантов.
+        """
+        User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        self.client.login(username='admin', password='password')
+        question = create_poll("Любимый цвет?", [("Красный", 0)])
+        create_poll("Погода", [])
+        response = self.client.get(reverse('admin:polls_question_changelist'), {'q': 'красн'})
+        self.assertEqual(list(response.context['cl'].queryset), [question])
+
+
+# Тесты для журнала голосов и временных рядов
+@override_settings(ANALYTICS_LEDGER_BATCH_SIZE=1000, ANALYTICS_LEDGER_FLUSH_INTERVAL=0)
+class VoteLedgerTests(TestCase):
+    def vote(self, question, choice):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('polls:vote', args=(question.id,)), {'choice': choice.id})
+
+    def test_votes_written_in_batches(self):
+        """
+        Голоса копятся в памяти и попадают в журнал и счетчики при сбросе.
+        """
+        question = create_poll("Вопрос", [("А", 0), ("Б", 0)])
+        first, second = question.choice_set.order_by('id')
+        self.vote(question, first)
+        self.vote(question, first)
+        self.vote(question, second)
+        self.assertEqual(vote_ledger.pending_count(), 3)
+        self.assertFalse(VoteEvent.objects.exists())
+        
+        vote_ledger.flush()
+        self.assertEqual(vote_ledger.pending_count(), 0)
+        self.assertEqual(VoteEvent.objects.count(), 3)
+        minute = VoteBucket.objects.filter(resolution=VoteBucket.MINUTE)
+        self.assertEqual(dict(minute.values_list('choice_id', 'count')), {first.id: 2, second.id: 1})
+
+    @override_settings(ANALYTICS_LEDGER_BATCH_SIZE=1)
+    def test_failed_flush_keeps_votes(self):
+        """
+        Ошибка записи журнала не ломает голосование, а голоса остаются в очереди.
+        """
+        question = create_poll("Вопрос", [("А", 0)])
+        choice = question.choice_set.get()
+        error = OperationalError('database is locked')
+        with mock.patch.object(VoteEvent.objects, 'bulk_create', side_effect=error), \
+                self.assertLogs(level='ERROR') as logs:
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post(reverse('polls:vote', args=(question.id,)), {'choice': choice.id})
+        self.assertEqual(response.status_code, 302)
+        self.assertTrue(any(line.startswith('ERROR:analytics.ledger:') for line in logs.output))
+        choice.refresh_from_db()
+        self.assertEqual(choice.votes, 1)
+        self.assertEqual(vote_ledger.pending_count(), 1)
+        
+        vote_ledger.flush()
+        self.assertEqual(VoteEvent.objects.count(), 1)
+
+    @override_settings(ANALYTICS_LEDGER_FLUSH_INTERVAL=60)
+    def test_failed_background_flush_is_retried(self):
+        """
+        Неудачный сброс по таймеру логируется и заводит таймер заново.
+        """
+        question = create_poll("Вопрос", [("А", 0)])
+        choice = question.choice_set.get()
+        vote_ledger.record({(question.id, choice.id): 1})
+        # Срабатывание таймера вызываем сами
+        vote_ledger._timer.cancel()
+        error = OperationalError('database is locked')
+        with mock.patch.object(VoteEvent.objects, 'bulk_create', side_effect=error), \
+                mock.patch('analytics.ledger.connections'), \
+                self.assertLogs('analytics.ledger', level='ERROR'):
+            vote_ledger._flush_in_background()
+        self.assertEqual(vote_ledger.pending_count(), 1)
+        self.assertIsNotNone(vote_ledger._timer)
+        self.assertEqual(vote_ledger.flush(), 1)
+        self.assertIsNone(vote_ledger._timer)
+
+    def test_buckets_accumulate_across_flushes(self):
+        """
+        Повторный сброс в тот же интервал увеличивает существующий счетчик.
+        """
+        question = create_poll("Вопрос", [("А", 0)])
+        choice = question.choice_set.get()
+        moment = timezone.now()
+        for _ in range(2):
+            vote_ledger.record({(question.id, choice.id): 2}, at=moment)
+            vote_ledger.flush()
+        hour = VoteBucket.objects.get(resolution=VoteBucket.HOUR)
+        self.assertEqual(hour.count, 4)
+
+    def test_timeseries_endpoint(self):
+        """
+        Временной ряд собирается из счетчиков по интервалам.
+        """
+        question = create_poll("Вопрос", [("А", 0), ("Б", 0)])
+        first, second = question.choice_set.order_by('id')
+        base = timezone.now().replace(minute=0, second=0, microsecond=0) - datetime.timedelta(hours=3)
+        vote_ledger.record({(question.id, first.id): 2, (question.id, second.id): 1}, at=base)
+        vote_ledger.record({(question.id, first.id): 5}, at=base + datetime.timedelta(minutes=90))
+        vote_ledger.flush()
+        
+        data = self.client.get(reverse('poll_timeseries', args=(question.id,)), {
+            'from': base.isoformat(), 'to': (base + datetime.timedelta(hours=3)).isoformat(),
+            'resolution': 'hour',
+        }).json()
+        self.assertEqual(data['step_seconds'], 3600)
+        self.assertEqual([point['votes'] for point in data['points']], [3, 5, 0])
+        self.assertEqual(data['points'][0]['choices'], {str(first.id): 2, str(second.id): 1})
+
+    def test_large_range_is_downsampled(self):
+        """
+        Минутный ряд за неделю укрупняется до ANALYTICS_TIMESERIES_MAX_POINTS точек.
+        """
+        question = create_poll("Вопрос", [("А", 0)])
+        choice = question.choice_set.get()
+        end = timezone.now()
+        vote_ledger.record({(question.id, choice.id): 1}, at=end - datetime.timedelta(days=6))
+        vote_ledger.record({(question.id, choice.id): 1}, at=end - datetime.timedelta(minutes=1))
+        vote_ledger.flush()
+        with self.settings(ANALYTICS_TIMESERIES_MAX_POINTS=100):
+            data = self.client.get(reverse('poll_timeseries', args=(question.id,)), {
+                'from': (end - datetime.timedelta(days=7)).isoformat(), 'to': end.isoformat(),
+                'resolution': 'minute',
+            }).json()
+        self.assertLessEqual(len(data['points']), 101)
+        self.assertEqual(data['step_seconds'] % 3600, 0)
+        self.assertEqual(sum(point['votes'] for point in data['points']), 2)
+
+    def test_invalid_parameters(self):
+        """
+        Некорректные границы и шаг дают 400.
+        """
+        question = create_poll("Вопрос", [])
+        url = reverse('poll_timeseries', args=(question.id,))
+        self.assertEqual(self.client.get(url, {'from': 'вчера'}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'resolution': 'week'}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'from': '2030-01-02', 'to': '2030-01-01'}).status_code, 400)
+
+    @override_settings(ANALYTICS_TIMESERIES_MAX_DAYS=30)
+    def test_out_of_range_parameters(self):
+        """
+        Крайние годы и слишком длинный диапазон дают 400, а не 500.
+        """
+        question = create_poll("Вопрос", [])
+        url = reverse('poll_timeseries', args=(question.id,))
+        for params in (
+            {'from': '0001-01-02', 'to': '9999-12-30'},
+            {'to': '0001-01-01'},
+            {'from': '9999-12-31T23:59:59'},
+            {'from': '2030-01-01', 'to': '2030-03-01'},
+        ):
+            with self.subTest(params=params):
+                response = self.client.get(url, params)
+                self.assertEqual(response.status_code, 400)
+                self.assertTrue(set(response.json()) & set(params))
+        response = self.client.get(url, {'from': '2030-01-01', 'to': '2030-01-31'})
+        self.assertEqual(response.status_code, 200)
+
+
+# Тесты для "горячих" опросов
+@override_settings(ANALYTICS_LEDGER_BATCH_SIZE=1000, ANALYTICS_LEDGER_FLUSH_INTERVAL=0,
+                   ANALYTICS_TRENDING_HALF_LIFE=3600)
+class TrendingTests(TestCase):
+    def setUp(self):
+        trending.rebuild()
+
+    def tearDown(self):
+        # Незаписанные голоса сбрасываем внутри откатываемой транзакции теста
+        vote_ledger.flush()
+
+    def test_recent_votes_outrank_old_ones(self):
+        """
+        Голоса затухают: 3 голоса час назад весят меньше, чем 2 голоса сейчас.
+        """
+        tracker = TrendingTracker()
+        tracker.rebuild()
+        now = timezone.now()
+        tracker.add({(1, 10): 3}, at=now - datetime.timedelta(hours=1))
+        tracker.add({(2, 20): 2}, at=now)
+        top = tracker.top(2)
+        self.assertEqual([question_id for question_id, _ in top], [2, 1])
+        self.assertAlmostEqual(top[1][1], 1.5, places=2)
+
+    def test_capacity_is_bounded(self):
+        """
+        Хранится не больше ANALYTICS_TRENDING_CAPACITY опросов; вытесняются самые слабые.
+        """
+        tracker = TrendingTracker()
+        tracker.rebuild()
+        with self.settings(ANALYTICS_TRENDING_CAPACITY=2):
+            for question_id, votes in [(1, 5), (2, 1), (3, 3)]:
+                tracker.add({(question_id, 0): votes})
+            self.assertEqual([question_id for question_id, _ in tracker.top(10)], [1, 3])
+
+    def test_endpoint_follows_votes(self):
+        """
+        Голос через polls.views.vote сразу поднимает опрос в /trending/.
+        """
+        calm = create_poll("Спокойный", [("А", 100)])
+        hot = create_poll("Горячий", [("А", 0)])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('polls:vote', args=(hot.id,)), {'choice': hot.choice_set.get().id})
+        data = self.client.get(reverse('poll_trending')).json()
+        self.assertEqual([poll['id'] for poll in data['polls']], [hot.id])
+        self.assertNotIn(calm.id, [poll['id'] for poll in data['polls']])
+
+    def test_rebuilds_from_buckets_and_pending_votes(self):
+        """
+        После перезапуска счета восстанавливаются из счетчиков и незаписанных голосов.
+        """
+        flushed = create_poll("Записанный", [("А", 0)])
+        pending = create_poll("В очереди", [("А", 0)])
+        vote_ledger.record({(flushed.id, flushed.choice_set.get().id): 2})
+        vote_ledger.flush()
+        vote_ledger.record({(pending.id, pending.choice_set.get().id): 1})
+        
+        tracker = TrendingTracker()
+        scores = dict(tracker.top(10))
+        # Счетчик привязан к началу минуты, поэтому успевает немного затухнуть
+        self.assertAlmostEqual(scores[flushed.id], 2, delta=0.05)
+        self.assertAlmostEqual(scores[pending.id], 1, delta=0.05)
+
+
+# Тесты для чтения аналитики с реплики. В тестах отдельной реплики нет,
+# поэтому ее роль играет сама основная база
+@override_settings(ANALYTICS_REPLICA_DATABASE='default', ANALYTICS_REPLICA_LAG_CHECK=0)
+class ReplicaRoutingTests(TestCase):
+    def setUp(self):
+        replica_lag.reset()
+        self.url = reverse('overall_stats')
+
+    def test_router_reads_from_selected_database(self):
+        """
+        Внутри запроса аналитики чтения идут в выбранную базу, запись - всегда в default.
+        """
+        router = AnalyticsReplicaRouter()
+        self.assertIsNone(router.db_for_read(Question))
+        for _ in read_from('replica', iter([None])):
+            self.assertEqual(router.db_for_read(Question), 'replica')
+            self.assertEqual(router.db_for_read(PollStatistic), 'replica')
+            self.assertEqual(router.db_for_write(Question), 'default')
+            # Сессии и пользователи не читаются с реплики
+            self.assertIsNone(router.db_for_read(Session))
+            self.assertIsNone(router.db_for_read(User))
+        self.assertIsNone(router.db_for_read(Question))
+        with self.settings(ANALYTICS_REPLICA_DATABASE='replica'):
+            self.assertFalse(router.allow_migrate('replica', 'polls'))
+
+    def test_lag_header(self):
+        """
+        Ответ сообщает, откуда прочитаны данные и насколько отстает реплика.
+        """
+        response = self.client.get(self.url)
+        self.assertEqual(response['X-Read-Database'], 'default')
+        self.assertEqual(response['X-Replica-Lag'], '0.000')
+
+    def test_write_pins_to_primary(self):
+        """
+        После голоса пользователь читает из основной базы, пока действует cookie.
+        """
+        question = create_poll("Вопрос", [("А", 0)])
+        response = self.client.post(reverse('polls:vote', args=(question.id,)),
+                                    {'choice': question.choice_set.get().id})
+        self.assertIn(PIN_COOKIE, response.cookies)
+        self.assertNotIn('X-Replica-Lag', self.client.get(self.url))
+        
+        self.client.cookies[PIN_COOKIE] = '0'
+        self.assertIn('X-Replica-Lag', self.client.get(self.url))
+
+    @override_settings(ANALYTICS_REPLICA_MAX_LAG=5)
+    def test_lagging_replica_is_skipped(self):
+        """
+        Реплика, отставшая больше ANALYTICS_REPLICA_MAX_LAG, не используется.
+        """
+        with mock.patch.object(replica_lag, 'measure', return_value=12.5):
+            response = self.client.get(self.url)
+        self.assertEqual(response['X-Replica-Lag'], '12.500')
+        self.assertEqual(response['X-Read-Database'], 'default')
+
+    def test_without_replica_reads_primary(self):
+        """
+        Если реплика не настроена, заголовка отставания нет.
+        """
+        with self.settings(ANALYTICS_REPLICA_DATABASE='replica'):
+            response = self.client.get(self.url)
+        self.assertEqual(response['X-Read-Database'], 'default')
+        self.assertNotIn('X-Replica-Lag', response)
+
+
+# Тесты для проверки планов запросов
+class QueryPlanTests(TestCase):
+    def test_analyze_plan(self):
+        """
+        Полный просмотр таблицы и сортировка при просмотре - проблемы;
+        сортировка найденных по ключу строк и FTS-ранжирование - нет.
+        """
+        tables = {'polls_question'}
+        problems, _ = analyze_plan('SELECT ...', ['SCAN polls_question', 'USE TEMP B-TREE FOR ORDER BY'], tables)
+        self.assertEqual(len(problems), 2)
+        problems, _ = analyze_plan(
+            'SELECT ...', ['SEARCH polls_question USING INTEGER PRIMARY KEY (rowid=?)',
+                           'USE TEMP B-TREE FOR ORDER BY'], tables,
+        )
+        self.assertEqual(problems, [])
+        problems, accepted = analyze_plan(
+            "SELECT ... WHERE polls_question_fts MATCH 'x'",
+            ['SCAN polls_question USING INDEX polls_question_pub_date_idx', 'USE TEMP B-TREE FOR GROUP BY'], tables,
+        )
+        self.assertEqual((problems, len(accepted)), ([], 1))
+
+    def test_public_queries_use_indexes(self):
+        """
+        Запросы главной страницы, поиска, диаграммы и общей статистики идут по индексам.
+        """
+        for number in range(30):
+            create_poll(f"Вопрос {number}", [("А", number), ("Б", 1)], days=-number)
+        question = Question.objects.first()
+        report = audit_urls({
+            'index': reverse('polls:index'),
+            'search': reverse('poll_search') + '?sort_by=popularity',
+            'search_oldest': reverse('poll_search') + '?sort_by=oldest',
+            'chart': reverse('poll_chart', args=(question.id,)),
+            'overall': reverse('overall_stats'),
+        })
+        for name, plans in report.items():
+            self.assertTrue(plans, name)
+            for plan in plans:
+                self.assertEqual(plan.problems, [], f'{name}: {plan.sql}\n{plan.details}')
+
+    def test_admin_today_filter_uses_range(self):
+        """
+        Фильтр "Сегодня" сравнивает pub_date с диапазоном, а не с функцией от поля.
+        """
+        today = create_poll("Сегодня", [], days=0)
+        create_poll("Вчера", [], days=-1)
+        self.client.force_login(User.objects.create_superuser('admin', password='admin'))
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('admin:polls_question_changelist'), {'pub_date': 'today'})
+        self.assertEqual(list(response.context['cl'].queryset), [today])
+        self.assertFalse(any('django_datetime_cast_date' in query['sql'] for query in queries.captured_queries))
+
+
+class AsyncAnalyticsAPITests(TestCase):
+    def setUp(self):
+        chart_cache.clear()
+
+    async def test_stats_match_sync_view(self):
+        """
+        Асинхронная статистика опроса совпадает с синхронной.
+        """
+        question = await sync_to_async(create_poll)("Вопрос", [("Да", 3), ("Нет", 1)])
+        response = await self.async_client.get(reverse('poll_stats_async', args=(question.id,)))
+        expected = await sync_to_async(self.client.get)(reverse('poll_stats', args=(question.id,)))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), expected.json())
+        self.assertEqual(response['X-Read-Database'], 'default')
+
+    async def test_missing_poll_is_404(self):
+        response = await self.async_client.get(reverse('poll_stats_async', args=(999,)))
+        self.assertEqual(response.status_code, 404)
+        self.assertIn('detail', response.json())
+
+    async def test_overall_matches_sync_view(self):
+        for number in range(3):
+            await sync_to_async(create_poll)(f"Вопрос {number}", [("А", number)], days=-number)
+        response = await self.async_client.get(reverse('overall_stats_async'))
+        expected = await sync_to_async(self.client.get)(reverse('overall_stats'))
+        self.assertEqual(response.json(), expected.json())
+
+    async def test_search_pages_and_stream(self):
+        """
+        Страницы и поток поиска отдают те же опросы, что и синхронный поиск.
+        """
+        for number in range(5):
+            await sync_to_async(create_poll)(f"Вопрос {number}", [("А", number)], days=-number)
+        ids = []
+        params = {'page_size': 2, 'sort_by': 'popularity'}
+        while True:
+            data = (await self.async_client.get(reverse('poll_search_async'), params)).json()
+            ids += [item['id'] for item in data['results']]
+            if not data['next_cursor']:
+                break
+            params['cursor'] = data['next_cursor']
+        expected = await sync_to_async(self.client.get)(
+            reverse('poll_search'), {'page_size': 10, 'sort_by': 'popularity'}
+        )
+        self.assertEqual(ids, [item['id'] for item in expected.json()['results']])
+
+        response = await self.async_client.get(reverse('poll_search_async'), {'stream': 1})
+        lines = [line async for line in response.streaming_content]
+        self.assertEqual(len(b''.join(lines).splitlines()), 5)
+
+        data = (await self.async_client.get(reverse('poll_search_async'), {'q': 'вопрос 3'})).json()
+        self.assertEqual([item['question_text'] for item in data['results']], ["Вопрос 3"])
+
+    @override_settings(ANALYTICS_CHART_WORKERS=0)
+    async def test_chart_renders_without_blocking_loop(self):
+        """
+        Диаграмма рисуется вне цикла событий: он продолжает обрабатывать задачи.
+        """
+        question = await sync_to_async(create_poll)("Вопрос", [("Да", 1), ("Нет", 2)])
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                ticks += 1
+                await asyncio.sleep(0)
+
+        task = asyncio.create_task(ticker())
+        try:
+            response = await self.async_client.get(reverse('poll_chart_async', args=(question.id,)))
+        finally:
+            task.cancel()
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.json()['chart'].startswith('data:image/png;base64,'))
+        self.assertEqual(response['X-Chart-Cache'], 'miss')
+        self.assertGreater(ticks, 1)
+
+        response = await self.async_client.get(reverse('poll_chart_async_svg', args=(question.id,)))
+        self.assertEqual(response['Content-Type'], 'image/svg+xml')
+
+
+def add_votes(choice, count):
+    """Голоса, записанные в базу в обход этого процесса (как из другого воркера)."""
+    Choice.objects.filter(pk=choice.pk).update(votes=F('votes') + count)
+
+
+@override_settings(ANALYTICS_LIVE_TICK=3600)
+class LiveResultsTests(TestCase):
+    def setUp(self):
+        self.question = create_poll("Вопрос", [("Да", 1), ("Нет", 0)])
+        self.yes, self.no = self.question.choice_set.order_by('id')
+
+    async def test_votes_are_coalesced_per_tick(self):
+        """
+        Все голоса за тик приходят подписчику одним событием с суммарными изменениями.
+        """
+        live = LiveResults()
+        subscriber = await live.subscribe(self.question.id)
+        [(event, snapshot)] = subscriber.take()
+        self.assertEqual(event, 'snapshot')
+        self.assertEqual(snapshot['total_votes'], 1)
+
+        for _ in range(50):
+            await sync_to_async(add_votes)(self.yes, 1)
+        await sync_to_async(add_votes)(self.no, 3)
+        await live.tick()
+        self.assertEqual(subscriber.take(), [('votes', {
+            'question_id': self.question.id,
+            'total_votes': 54,
+            'deltas': {str(self.yes.id): 50, str(self.no.id): 3},
+        })])
+
+        await live.tick()
+        self.assertEqual(subscriber.take(), [])
+        live.unsubscribe(subscriber)
+
+    async def test_slow_subscriber_gets_merged_changes(self):
+        """
+        Изменения нескольких тиков, не забранные клиентом, складываются, а не копятся очередью.
+        """
+        live = LiveResults()
+        subscriber = await live.subscribe(self.question.id)
+        subscriber.take()
+        for _ in range(3):
+            await sync_to_async(add_votes)(self.yes, 2)
+            await live.tick()
+        events = subscriber.take()
+        self.assertEqual(len(events), 1)
+        self.assertEqual(events[0][1]['deltas'], {str(self.yes.id): 6})
+        self.assertEqual(events[0][1]['total_votes'], 7)
+        live.unsubscribe(subscriber)
+
+    async def test_stalled_subscriber_is_dropped(self):
+        live = LiveResults()
+        subscriber = await live.subscribe(self.question.id)
+        with self.settings(ANALYTICS_LIVE_STALL_TIMEOUT=-1):
+            await sync_to_async(add_votes)(self.yes, 1)
+            await live.tick()
+        self.assertTrue(subscriber.closed)
+        self.assertEqual(live.subscriber_count(), 0)
+
+    async def test_new_choice_sends_snapshot(self):
+        live = LiveResults()
+        subscriber = await live.subscribe(self.question.id)
+        subscriber.take()
+        await sync_to_async(Choice.objects.create)(question=self.question, choice_text="Может", votes=2)
+        await live.tick()
+        [(event, snapshot)] = subscriber.take()
+        self.assertEqual(event, 'snapshot')
+        self.assertEqual([choice['choice_text'] for choice in snapshot['choices']], ["Да", "Нет", "Может"])
+        live.unsubscribe(subscriber)
+
+    @override_settings(ANALYTICS_LIVE_MAX_SUBSCRIBERS=1)
+    async def test_subscriber_limit(self):
+        live = LiveResults()
+        subscriber = await live.subscribe(self.question.id)
+        with self.assertRaises(TooManySubscribers):
+            await live.subscribe(self.question.id)
+        live.unsubscribe(subscriber)
+        live.unsubscribe(await live.subscribe(self.question.id))
+
+    async def test_stream_over_asgi(self):
+        """
+        Поток начинается со snapshot, затем приходят изменения после тика.
+        """
+        response = await self.async_client.get(reverse('poll_live', args=(self.question.id,)))
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        self.assertEqual(response['Cache-Control'], 'no-cache')
+        chunks = aiter(response.streaming_content)
+        first = (await anext(chunks)).decode()
+        self.assertTrue(first.startswith('event: snapshot\n'))
+        self.assertEqual(json.loads(first.split('data: ', 1)[1])['total_votes'], 1)
+
+        await sync_to_async(add_votes)(self.no, 4)
+        await live_results.tick()
+        second = (await anext(chunks)).decode()
+        self.assertTrue(second.startswith('event: votes\n'))
+        self.assertEqual(json.loads(second.split('data: ', 1)[1])['deltas'], {str(self.no.id): 4})
+        await chunks.aclose()
+
+    @override_settings(ANALYTICS_LIVE_MAX_SUBSCRIBERS=0)
+    async def test_stream_rejects_over_limit(self):
+        response = await self.async_client.get(reverse('poll_live', args=(self.question.id,)))
+        self.assertEqual(response.status_code, 503)
+        self.assertIn('Retry-After', response)
+
+    @override_settings(ANALYTICS_LIVE_WSGI_RETRY=60)
+    def test_wsgi_gets_single_snapshot(self):
+        """
+        Без ASGI поток не держится: отдается snapshot и интервал переподключения.
+        """
+        response = self.client.get(reverse('poll_live', args=(self.question.id,)))
+        body = response.content.decode()
+        self.assertTrue(body.startswith('retry: 60000\n'))
+        self.assertIn('event: snapshot', body)
+        self.assertEqual(self.client.get(reverse('poll_live', args=(999,))).status_code, 404)
+
+
+def server_timing(response):
+    """Заголовок Server-Timing как {этап: (мс, описание)}."""
+    timings = {}
+    for part in response['Server-Timing'].split(', '):
+        name, *params = part.split(';')
+        values = dict(param.split('=', 1) for param in params)
+        timings[name] = (float(values['dur']), values.get('desc', '').strip('"'))
+    return timings
+
+
+class MetricsTests(TestCase):
+    def setUp(self):
+        registry.reset()
+        chart_cache.clear()
+        cache.clear()
+
+    def test_server_timing_counts_queries_and_template(self):
+        """
+        Server-Timing страницы результатов: число SQL-запросов совпадает с фактическим,
+        время шаблона и общее время присутствуют.
+        """
+        question = create_poll("Вопрос", [("Да", 1), ("Нет", 2)])
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('polls:results', args=(question.id,)))
+        timings = server_timing(response)
+        self.assertEqual(timings['db'][1], f'{len(queries)} queries')
+        self.assertIn('template', timings)
+        self.assertGreaterEqual(timings['total'][0], timings['template'][0])
+
+    def test_chart_phases(self):
+        """
+        Для диаграммы отдельно видны отрисовка, base64 и сериализация ответа.
+        """
+        question = create_poll("Вопрос", [("Да", 1)])
+        timings = server_timing(self.client.get(reverse('poll_chart', args=(question.id,))))
+        self.assertTrue({'db', 'chart', 'encode', 'serialize'} <= set(timings))
+        timings = server_timing(self.client.get(reverse('poll_chart', args=(question.id,))))
+        self.assertNotIn('chart', timings)
+
+    @override_settings(DEBUG=True)
+    def test_metrics_endpoint_exposes_histograms(self):
+        question = create_poll("Вопрос", [("Да", 1)])
+        for _ in range(3):
+            self.client.get(reverse('poll_stats', args=(question.id,)))
+        self.client.get('/no-such-page/')
+        body = self.client.get(reverse('metrics')).content.decode()
+        self.assertIn('# TYPE mysite_request_duration_seconds histogram', body)
+        self.assertIn('mysite_request_duration_seconds_count{view="poll_stats"} 3', body)
+        self.assertIn('mysite_request_duration_seconds_bucket{view="poll_stats",le="+Inf"} 3', body)
+        self.assertIn('mysite_request_queries_bucket{view="poll_stats",le="2"} 3', body)
+        self.assertIn('mysite_request_phase_seconds_count{view="poll_stats",phase="serialize"} 3', body)
+        self.assertIn('mysite_requests_total{view="poll_stats",method="GET",status="200"} 3', body)
+        self.assertIn('mysite_requests_total{view="unmatched",method="GET",status="404"} 1', body)
+
+    async def test_async_views_are_measured(self):
+        question = await sync_to_async(create_poll)("Вопрос", [("Да", 1)])
+        response = await self.async_client.get(reverse('poll_stats_async', args=(question.id,)))
+        timings = server_timing(response)
+        self.assertEqual(timings['db'][1], '2 queries')
+        self.assertIn('serialize', timings)
+
+    @override_settings(MONITORING_METRICS_TOKEN='secret')
+    def test_metrics_token(self):
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 403)
+        response = self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer secret')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+
+    @override_settings(MONITORING_METRICS_TOKEN=None)
+    def test_metrics_closed_without_token(self):
+        """
+        Без токена метрики видны только при DEBUG.
+        """
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 403)
+        with self.settings(DEBUG=True):
+            self.assertEqual(self.client.get(reverse('metrics')).status_code, 200)
+
+
+class BenchmarkTests(TestCase):
+    def test_synthetic_polls_are_reproducible(self):
+        """
+        Одинаковое зерно дает одинаковые опросы; число вариантов в заданных границах.
+        """
+        now = timezone.now()
+        first = list(synthetic_polls(50, seed=7, now=now, min_choices=2, max_choices=20))
+        second = list(synthetic_polls(50, seed=7, now=now, min_choices=2, max_choices=20))
+        self.assertEqual(first, second)
+        self.assertTrue(all(2 <= len(poll.choices) <= 20 for poll in first))
+        self.assertTrue(all(votes >= 0 for poll in first for _, votes in poll.choices))
+
+    def test_seed_polls(self):
+        out = StringIO()
+        call_command('seed_polls', questions=30, min_choices=2, max_choices=5, batch_size=10, stdout=out)
+        self.assertEqual(Question.objects.count(), 30)
+        self.assertTrue(60 <= Choice.objects.count() <= 150)
+        self.assertIn('Создано опросов: 30', out.getvalue())
+
+    def test_run_load_and_summarize(self):
+        """
+        run_load выполняет ровно заданное число запросов и считает ошибки.
+        """
+        calls = itertools.count(1)
+
+        def make_request(worker):
+            number = next(calls)
+            if number % 10 == 0:
+                raise ValueError
+            return number % 5 != 0
+
+        latencies, errors, seconds = run_load(make_request, 4, 100)
+        self.assertEqual((len(latencies), next(calls), errors), (100, 101, 20))
+        summary = summarize(latencies, errors, seconds)
+        self.assertEqual((summary['requests'], summary['errors']), (100, 20))
+        self.assertLessEqual(summary['p50_ms'], summary['p95_ms'])
+        self.assertLessEqual(summary['p95_ms'], summary['p99_ms'])
+
+    def test_compare_runs(self):
+        """
+        Регрессия - рост p95 или падение пропускной способности сверх допуска, новые ошибки.
+        """
+        def run(p95, rps, errors=0):
+            return {'results': [{'endpoint': 'index', 'concurrency': 4,
+                                 'p95_ms': p95, 'rps': rps, 'errors': errors}]}
+
+        baseline = run(10.0, 100.0)
+        self.assertEqual(compare_runs(baseline, run(11.5, 90.0)), [])
+        self.assertEqual(len(compare_runs(baseline, run(13.0, 100.0))), 1)
+        self.assertEqual(len(compare_runs(baseline, run(10.0, 70.0, errors=1))), 2)
+        self.assertEqual(compare_runs(baseline, {'results': []}), [])
+
+
+class SerializationTests(TestCase):
+    def test_poll_stat_representation_matches_serializer(self):
+        """
+        Быстрый путь дает то же, что PollStatSerializer, в любом часовом поясе.
+        """
+        question = create_poll("Вопрос", [("Да", 2), ("Нет", 1), ("Может быть", 0)])
+        data = poll_stat_data(question, list(question.choice_set.all()))
+        for zone in ('Europe/Moscow', 'UTC'):
+            with self.subTest(zone=zone), timezone.override(zone):
+                expected = PollStatSerializer(data).data
+                self.assertEqual(poll_stat_representation(data), expected)
+                self.assertEqual(
+                    FastJSONRenderer().render(poll_stat_representation(data)),
+                    JSONRenderer().render(expected),
+                )
+
+    def test_fast_renderer_output_is_identical(self):
+        """
+        FastJSONRenderer побайтно совпадает с JSONRenderer, в том числе с отступами.
+        """
+        moment = datetime.datetime(2024, 1, 2, 3, 4, 5, 678, tzinfo=datetime.timezone.utc)
+        data = {
+            'text': "Кофе\u2028чай \"в\" кавычках",
+            'when': moment, 'day': moment.date(), 'amount': Decimal('1.50'),
+            'lazy': gettext_lazy("Опрос"), 'numbers': [1, 2.5, -0.0, 33.33],
+            1: None, 'nested': {'empty': [], 'yes': True},
+        }
+        # Целое больше 64 бит orjson не кодирует - тогда работает обычный путь
+        for data, media_type in ((data, 'application/json'), (data, 'application/json; indent=4'),
+                                 ({'big': 10 ** 30}, 'application/json')):
+            with self.subTest(data=data, media_type=media_type):
+                self.assertEqual(
+                    FastJSONRenderer().render(data, media_type),
+                    JSONRenderer().render(data, media_type),
+                )
+
+    @skipIf(orjson is None, 'orjson не установлен')
+    def test_fast_renderer_uses_orjson(self):
+        """
+        С установленным orjson ответ кодирует он, без него - обычный путь с тем же выводом.
+        """
+        data = {'question_text': "Вопрос", 'votes': [1, 2]}
+        with mock.patch.object(orjson, 'dumps', wraps=orjson.dumps) as dumps:
+            content = FastJSONRenderer().render(data, 'application/json')
+        dumps.assert_called_once()
+        with mock.patch('analytics.renderers.orjson', None):
+            self.assertEqual(FastJSONRenderer().render(data, 'application/json'), content)
+
+    def test_api_responses_use_fast_renderer(self):
+        question = create_poll("Вопрос", [("Да", 1)])
+        response = self.client.get(reverse('poll_stats', args=(question.id,)), HTTP_ACCEPT='application/json')
+        self.assertIsInstance(response.accepted_renderer, FastJSONRenderer)
+        self.assertEqual(response.json()['choices'], [{'choice_text': "Да", 'votes': 1, 'percentage': 100.0}])
+
+    def test_bench_serialization(self):
+        out = StringIO()
+        call_command('bench_serialization', polls=20, repeat=1, json=True, stdout=out)
+        result = json.loads(out.getvalue())
+        self.assertEqual(set(result['scenarios']), {'stats', 'search'})
+        self.assertTrue(all(row['identical'] for row in result['scenarios'].values()))
+
+
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        chart_cache.clear()
+        self.question = create_poll("Вопрос", [("Да", 2), ("Нет", 1)])
+        self.choice = self.question.choice_set.first()
+
+    def vote(self):
+        self.client.post(reverse('polls:vote', args=(self.question.id,)), {'choice': self.choice.id})
+
+    def test_stats(self):
+        """
+        304 по версии опроса одним запросом; новый голос меняет ETag.
+        """
+        url = reverse('poll_stats', args=(self.question.id,))
+        response = self.client.get(url)
+        etag = response['ETag']
+        self.assertTrue(response.has_header('Last-Modified'))
+        with self.assertNumQueries(1):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.vote()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.json()['total_votes'], 4)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_chart_not_rendered_when_not_modified(self):
+        """
+        304 отдается без отрисовки; у PNG и JSON с диаграммой разные ETag.
+        """
+        png = self.client.get(reverse('poll_chart_png', args=(self.question.id,)))
+        data = self.client.get(reverse('poll_chart', args=(self.question.id,)))
+        self.assertNotEqual(png['ETag'], data['ETag'])
+        chart_cache.clear()
+        with mock.patch('analytics.views.render_chart') as render:
+            response = self.client.get(
+                reverse('poll_chart_png', args=(self.question.id,)), HTTP_IF_NONE_MATCH=png['ETag']
+            )
+        self.assertEqual(response.status_code, 304)
+        render.assert_not_called()
+
+    def test_search_and_overall_use_global_version(self):
+        """
+        Любой голос меняет ETag поиска и общей статистики.
+        """
+        urls = [reverse('poll_search'), reverse('overall_stats')]
+        etags = [self.client.get(url)['ETag'] for url in urls]
+        # Поиску хватает глобальной версии, общей статистике - еще и окна недели
+        for url, etag, queries in zip(urls, etags, (1, 2)):
+            with self.assertNumQueries(queries):
+                self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.vote()
+        for url, etag in zip(urls, etags):
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_overall_etag_follows_week_window(self):
+        """
+        Опрос, вышедший из окна последних 7 дней, меняет ETag общей статистики.
+        """
+        url = reverse('overall_stats')
+        etag = self.client.get(url)['ETag']
+        later = timezone.now() + datetime.timedelta(days=6, hours=23)
+        with mock.patch('django.utils.timezone.now', return_value=later):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['recent_polls'], 0)
+
+    async def test_async_stats(self):
+        url = reverse('poll_stats_async', args=(self.question.id,))
+        etag = (await self.async_client.get(url))['ETag']
+        self.assertEqual(etag, (await sync_to_async(self.client.get)(
+            reverse('poll_stats', args=(self.question.id,))
+        ))['ETag'])
+        response = await self.async_client.get(url, headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
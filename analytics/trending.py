@@ -0,0 +1,110 @@
+"""
+"Горячие" опросы: экспоненциально затухающие счета в памяти процесса.
+
+Используется прямое затухание (forward decay): голос в момент t добавляет к счету
+exp(rate * (t - landmark)), поэтому порядок опросов не меняется со временем
+и счета не нужно пересчитывать при каждом голосе. Текущий счет равен
+сохраненному, умноженному на exp(-rate * (now - landmark)).
+
+Хранится не больше ANALYTICS_TRENDING_CAPACITY опросов: при переполнении
+вытесняется опрос с наименьшим счетом (через min-кучу с ленивым удалением).
+После перезапуска и затем раз в ANALYTICS_TRENDING_RESYNC секунд счета
+восстанавливаются из минутных счетчиков VoteBucket и еще не записанных
+голосов журнала, так что голоса других процессов тоже учитываются.
+"""
+import heapq
+import math
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Sum
+from django.utils import timezone
+
+from .ledger import vote_ledger
+from .models import VoteBucket
+
+# Порог показателя экспоненты, после которого счета приводятся к новой точке отсчета
+RESCALE_EXPONENT = 300
+
+
+class TrendingTracker:
+    def __init__(self):
+        self._scores = {}  # question_id -> счет относительно self._landmark
+        self._heap = []  # (счет, question_id), возможны устаревшие записи
+        self._landmark = 0.0
+        self._built_at = None
+        self._lock = threading.RLock()
+
+    @property
+    def rate(self):
+        return math.log(2) / settings.ANALYTICS_TRENDING_HALF_LIFE
+
+    def add(self, deltas, at=None):
+        """Учитывает голоса {(question_id, choice_id): count}."""
+        moment = (at or timezone.now()).timestamp()
+        with self._lock:
+            if self._built_at is None:
+                self.rebuild()
+            for (question_id, _), count in deltas.items():
+                self._add(question_id, count, moment)
+
+    def top(self, limit):
+        """Список (question_id, текущий счет) по убыванию счета."""
+        with self._lock:
+            if self._built_at is None or time.monotonic() - self._built_at > settings.ANALYTICS_TRENDING_RESYNC:
+                self.rebuild()
+            decay = math.exp(-self.rate * (timezone.now().timestamp() - self._landmark))
+            best = heapq.nlargest(limit, self._scores.items(), key=lambda item: item[1])
+            return [(question_id, value * decay) for question_id, value in best]
+
+    def rebuild(self):
+        """Восстанавливает счета из минутных счетчиков за окно ANALYTICS_TRENDING_WINDOW."""
+        now = timezone.now()
+        buckets = VoteBucket.objects.filter(
+            resolution=VoteBucket.MINUTE,
+            start__gte=now - timedelta(seconds=settings.ANALYTICS_TRENDING_WINDOW),
+        ).values('question_id', 'start').annotate(votes=Sum('count')).values_list(
+            'question_id', 'start', 'votes'
+        )
+        with self._lock:
+            self._scores = {}
+            self._heap = []
+            self._landmark = now.timestamp()
+            for question_id, start, votes in buckets.iterator():
+                self._add(question_id, votes, start.timestamp())
+            for question_id, _, count, at in vote_ledger.pending_items():
+                self._add(question_id, count, at.timestamp())
+            self._built_at = time.monotonic()
+
+    def _add(self, question_id, count, moment):
+        exponent = self.rate * (moment - self._landmark)
+        if exponent > RESCALE_EXPONENT:
+            self._rescale(moment)
+            exponent = 0.0
+        value = self._scores.get(question_id, 0.0) + count * math.exp(exponent)
+        self._scores[question_id] = value
+        heapq.heappush(self._heap, (value, question_id))
+        while len(self._scores) > settings.ANALYTICS_TRENDING_CAPACITY:
+            self._evict_smallest()
+        if len(self._heap) > 4 * settings.ANALYTICS_TRENDING_CAPACITY:
+            self._heap = [(value, question_id) for question_id, value in self._scores.items()]
+            heapq.heapify(self._heap)
+
+    def _evict_smallest(self):
+        while self._heap:
+            value, question_id = heapq.heappop(self._heap)
+            if self._scores.get(question_id) == value:
+                del self._scores[question_id]
+                return
+
+    def _rescale(self, moment):
+        factor = math.exp(-self.rate * (moment - self._landmark))
+        self._scores = {question_id: value * factor for question_id, value in self._scores.items()}
+        self._heap = [(value, question_id) for question_id, value in self._scores.items()]
+        heapq.heapify(self._heap)
+        self._landmark = moment
+
+
+trending = TrendingTracker()
@@ -1,5 +1,5 @@
 from django.urls import path
-from . import views
+from . import async_views, views
 
 urlpatterns = [
     # Статистика по конкретному опросу
@@ -7,11 +7,36 @@ urlpatterns = [
          views.PollStatsAPIView.as_view(), 
          name='poll_stats'),
     
+    # Статистика по нескольким опросам за один запрос
+    path('api/polls/stats/', 
+         views.PollStatsBatchAPIView.as_view(), 
+         name='poll_stats_batch'),
+    
     # Диаграмма по конкретному опросу
     path('api/polls/<int:question_id>/chart/', 
          views.PollChartAPIView.as_view(), 
          name='poll_chart'),
     
+    # Диаграмма как изображение (PNG или SVG)
+    path('api/polls/<int:question_id>/chart.png', 
+         views.PollChartAPIView.as_view(), 
+         {'format': 'png'}, 
+         name='poll_chart_png'),
+    path('api/polls/<int:question_id>/chart.svg', 
+         views.PollChartAPIView.as_view(), 
+         {'format': 'svg'}, 
+         name='poll_chart_svg'),
+    
+    # Динамика голосов по опросу
+    path('api/polls/<int:question_id>/timeseries/', 
+         views.PollTimeseriesAPIView.as_view(), 
+         name='poll_timeseries'),
+    
+    # "Горячие" опросы
+    path('api/polls/trending/', 
+         views.TrendingPollsAPIView.as_view(), 
+         name='poll_trending'),
+    
     # Поиск и фильтрация опросов
     path('api/polls/search/', 
          views.PollSearchAPIView.as_view(), 
@@ -21,4 +46,41 @@ urlpatterns = [
     path('api/stats/overall/', 
          views.OverallStatsAPIView.as_view(), 
          name='overall_stats'),
+    
+    # Счетчики кэша диаграмм
+    path('api/charts/cache/', 
+         views.ChartCacheStatsAPIView.as_view(), 
+         name='chart_cache_stats'),
+    
+    # Незаписанные голоса из буфера
+    path('api/votes/buffer/', 
+         views.VoteBufferStatsAPIView.as_view(), 
+         name='vote_buffer_stats'),
+    
+    # Асинхронные варианты для запуска через ASGI
+    path('api/async/polls/<int:question_id>/stats/', 
+         async_views.AsyncPollStatsAPIView.as_view(), 
+         name='poll_stats_async'),
+    path('api/async/polls/<int:question_id>/chart/', 
+         async_views.AsyncPollChartAPIView.as_view(), 
+         name='poll_chart_async'),
+    path('api/async/polls/<int:question_id>/chart.png', 
+         async_views.AsyncPollChartAPIView.as_view(), 
+         {'format': 'png'}, 
+         name='poll_chart_async_png'),
+    path('api/async/polls/<int:question_id>/chart.svg', 
+         async_views.AsyncPollChartAPIView.as_view(), 
+         {'format': 'svg'}, 
+         name='poll_chart_async_svg'),
+    path('api/async/polls/search/', 
+         async_views.AsyncPollSearchAPIView.as_view(), 
+         name='poll_search_async'),
+    path('api/async/stats/overall/', 
+         async_views.AsyncOverallStatsAPIView.as_view(), 
+         name='overall_stats_async'),
+    
+    # Живые результаты опроса (Server-Sent Events)
+    path('api/async/polls/<int:question_id>/live/', 
+         async_views.LiveResultsView.as_view(), 
+         name='poll_live'),
 ]
\ No newline at end of file
@@ -1,108 +1,261 @@
+from django.conf import settings
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404
+from rest_framework.exceptions import APIException, ValidationError
+from rest_framework.renderers import JSONRenderer
+from rest_framework.settings import api_settings
+from rest_framework.utils.encoders import JSONEncoder
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from django.db.models import Sum, Count
+from django.db.models import F, Q, Sum, Count
 from django.utils import timezone
-from datetime import timedelta
-import matplotlib.pyplot as plt
-import io
+from django.utils.dateparse import parse_date, parse_datetime
+from datetime import datetime, timedelta, timezone as dt_timezone
 import base64
 import json
+import math
 
+from mysite.metrics import timed
+from polls.conditional import make_etag, not_modified, set_validators
 from polls.models import Question, Choice
-from .serializers import PollStatSerializer, PollSearchSerializer
+from polls.search import filter_questions, match_expression, ranked_matches
+from polls.vote_buffer import vote_buffer
+from .models import DailyPollCount, PollStatistic, StatsRollup, VoteBucket
+from .charts import ChartRenderError, chart_cache, chart_version, render_chart
+from .pagination import decode_cursor, encode_cursor, get_page_size
+from .renderers import ImageRenderer, PNGRenderer, SVGRenderer
+from .routing import ReplicaReadMixin
+from .serializers import poll_stat_representation
+from .trending import trending
 
-class PollStatsAPIView(APIView):
+
+def poll_stat_data(question, choices):
+    """
+    Данные для PollStatSerializer по вопросу и уже загруженным вариантам
+    (в ответ они попадают через poll_stat_representation).
+    """
+    # Рассчитываем общее количество голосов
+    total_votes = sum(choice.votes for choice in choices)
+    
+    # Подготавливаем данные по вариантам ответов
+    choices_data = []
+    for choice in choices:
+        percentage = 0
+        if total_votes > 0:
+            percentage = round((choice.votes / total_votes) * 100, 2)
+        
+        choices_data.append({
+            'choice_text': choice.choice_text,
+            'votes': choice.votes,
+            'percentage': percentage
+        })
+    
+    # Сортируем по количеству голосов (по убыванию)
+    choices_data.sort(key=lambda x: x['votes'], reverse=True)
+    
+    return {
+        'question_id': question.id,
+        'question_text': question.question_text,
+        'total_votes': total_votes,
+        'choices': choices_data,
+        'pub_date': question.pub_date
+    }
+
+def poll_validators(question, *parts):
+    """
+    ETag и Last-Modified ответа по версии опроса; вопрос загружен
+    с select_related('statistic'). Без строки статистики - (None, None).
+    """
+    statistic = getattr(question, 'statistic', None)
+    if statistic is None:
+        return None, None
+    etag = make_etag(question.id, statistic.version, statistic.last_calculated.isoformat(), *parts)
+    return etag, statistic.last_calculated
+
+def rollup_etag(rollup, *parts):
+    """ETag ответа по глобальной версии (StatsRollup)."""
+    return make_etag(rollup.version, rollup.updated_at.isoformat(), *parts)
+
+class PollStatsAPIView(ReplicaReadMixin, APIView):
     """
     Микросервис 1: Статистика по конкретному голосованию
     GET /analytics/api/polls/<question_id>/stats/
+    С If-None-Match текущей версии опроса - 304 без загрузки вариантов.
     """
     def get(self, request, question_id):
-        question = get_object_or_404(Question, id=question_id)
-        choices = question.choice_set.all()
-        
-        # Рассчитываем общее количество голосов
-        total_votes = choices.aggregate(total=Sum('votes'))['total'] or 0
-        
-        # Подготавливаем данные по вариантам ответов
-        choices_data = []
-        for choice in choices:
-            percentage = 0
-            if total_votes > 0:
-                percentage = round((choice.votes / total_votes) * 100, 2)
-            
-            choices_data.append({
-                'choice_text': choice.choice_text,
-                'votes': choice.votes,
-                'percentage': percentage
-            })
+        question = get_object_or_404(Question.objects.select_related('statistic'), id=question_id)
+        etag, last_modified = poll_validators(question, 'stats', request.accepted_renderer.format)
+        response = not_modified(request, etag, last_modified)
+        if response is not None:
+            return response
+        choices = list(question.choice_set.all())
         
-        # Сортируем по количеству голосов (по убыванию)
-        choices_data.sort(key=lambda x: x['votes'], reverse=True)
+        return set_validators(
+            Response(poll_stat_representation(poll_stat_data(question, choices))), etag, last_modified
+        )
+
+class PollStatsBatchAPIView(ReplicaReadMixin, APIView):
+    """
+    Статистика сразу по многим голосованиям за один запрос
+    GET /analytics/api/polls/stats/?ids=1,2,3
+    
+    Возвращает {"polls": {"<id>": <как у PollStatsAPIView>}, "missing": [...]}.
+    Вопросы и их варианты загружаются двумя запросами независимо от числа id.
+    """
+    def get(self, request):
+        ids = self.parse_ids(request.query_params.get('ids', ''))
+        questions = Question.objects.filter(id__in=ids).prefetch_related('choice_set')
         
-        data = {
-            'question_id': question.id,
-            'question_text': question.question_text,
-            'total_votes': total_votes,
-            'choices': choices_data,
-            'pub_date': question.pub_date
-        }
+        polls = {}
+        for question in questions:
+            data = poll_stat_data(question, question.choice_set.all())
+            polls[str(question.id)] = poll_stat_representation(data)
         
-        serializer = PollStatSerializer(data)
-        return Response(serializer.data)
+        return Response({
+            'polls': {str(question_id): polls[str(question_id)]
+                      for question_id in ids if str(question_id) in polls},
+            'missing': [question_id for question_id in ids if str(question_id) not in polls],
+        })
+    
+    def parse_ids(self, value):
+        """Разбирает список id через запятую (без повторов, с ограничением длины)."""
+        try:
+            ids = list(dict.fromkeys(int(part) for part in value.split(',') if part.strip()))
+        except ValueError:
+            raise ValidationError({'ids': 'Ожидается список целых чисел через запятую'})
+        if not ids:
+            raise ValidationError({'ids': 'Укажите хотя бы один id'})
+        if len(ids) > settings.ANALYTICS_STATS_BATCH_MAX_IDS:
+            raise ValidationError(
+                {'ids': f'Не больше {settings.ANALYTICS_STATS_BATCH_MAX_IDS} id за запрос'}
+            )
+        return ids
 
-class PollChartAPIView(APIView):
+class ChartUnavailable(APIException):
+    status_code = 503
+    default_detail = 'Диаграмма временно недоступна'
+
+
+class PollChartMixin:
+    """Выбор формата и сборка ответа диаграммы (общие для синхронного и асинхронного API)."""
+    renderer_classes = api_settings.DEFAULT_RENDERER_CLASSES + [PNGRenderer, SVGRenderer]
+    
+    def handle_exception(self, exc):
+        # Ошибки отдаем в JSON, даже если клиент запросил изображение
+        if isinstance(getattr(self.request, 'accepted_renderer', None), ImageRenderer):
+            self.request.accepted_renderer = JSONRenderer()
+            self.request.accepted_media_type = JSONRenderer.media_type
+        return super().handle_exception(exc)
+    
+    def chart_validators(self, request, question):
+        return poll_validators(question, 'chart', request.accepted_renderer.format)
+    
+    def chart_choices(self, question):
+        return question.choice_set.order_by('-votes', 'id').values_list('id', 'choice_text', 'votes')
+    
+    def chart_key(self, request, question, choices):
+        """Ключ кэша: перерисовываем только если изменились голоса или тексты этого опроса."""
+        renderer = request.accepted_renderer
+        image_format = renderer.format if isinstance(renderer, ImageRenderer) else 'png'
+        return (question.id, image_format, chart_version(question.question_text, choices))
+    
+    def chart_response(self, request, question, image, cache_status):
+        if isinstance(request.accepted_renderer, ImageRenderer):
+            # Сырые байты: браузер и прокси могут кэшировать их как обычную картинку
+            response = Response(image)
+            response['Content-Length'] = str(len(image))
+            response['Cache-Control'] = f'public, max-age={settings.ANALYTICS_CHART_MAX_AGE}'
+        else:
+            # Кодируем в base64 для старых клиентов
+            with timed('encode'):
+                image_base64 = base64.b64encode(image).decode('utf-8')
+            response = Response({
+                'question_id': question.id,
+                'question_text': question.question_text,
+                'chart': f'data:image/png;base64,{image_base64}',
+                'chart_type': 'bar'
+            })
+        response['X-Chart-Cache'] = cache_status
+        return response
+
+
+class PollChartAPIView(ReplicaReadMixin, PollChartMixin, APIView):
     """
     Микросервис 2: Диаграмма результатов голосования
     GET /analytics/api/polls/<question_id>/chart/
-    Возвращает base64 encoded PNG изображение
+    Возвращает base64 encoded PNG изображение в JSON.
+    
+    GET /analytics/api/polls/<question_id>/chart.png (или .svg),
+    а также /chart/ с заголовком Accept: image/png или image/svg+xml
+    отдают само изображение с заголовками кэширования.
+    
+    Готовые изображения кэшируются по версии опроса, отрисовка идет в пуле процессов
+    (см. analytics.charts). С If-None-Match текущей версии опроса - 304
+    без загрузки вариантов и отрисовки.
     """
-    def get(self, request, question_id):
-        question = get_object_or_404(Question, id=question_id)
-        choices = question.choice_set.all().order_by('-votes')
-        
-        # Данные для диаграммы
-        labels = [choice.choice_text for choice in choices]
-        votes = [choice.votes for choice in choices]
+    def get(self, request, question_id, format=None):
+        question = get_object_or_404(Question.objects.select_related('statistic'), id=question_id)
+        etag, last_modified = self.chart_validators(request, question)
+        response = not_modified(request, etag, last_modified)
+        if response is not None:
+            return response
+        choices = list(self.chart_choices(question))
         
-        # Создаем диаграмму
-        plt.figure(figsize=(10, 6))
-        bars = plt.bar(labels, votes, color=['#4CAF50', '#2196F3', '#FF9800', '#F44336'])
+        cache_key = self.chart_key(request, question, choices)
+        image = chart_cache.get(cache_key)
+        cache_status = 'hit'
+        if image is None:
+            cache_status = 'miss'
+            try:
+                with timed('chart'):
+                    image = render_chart(
+                        question.question_text,
+                        [choice_text for _, choice_text, _ in choices],
+                        [votes for _, _, votes in choices],
+                        cache_key[1],
+                    )
+            except ChartRenderError as error:
+                raise ChartUnavailable(str(error))
+            chart_cache.set(cache_key, image)
         
-        # Добавляем значения на столбцы
-        for bar, vote in zip(bars, votes):
-            plt.text(bar.get_x() + bar.get_width()/2, bar.get_height() + 0.5,
-                    str(vote), ha='center', va='bottom')
-        
-        plt.xlabel('Варианты ответов')
-        plt.ylabel('Количество голосов')
-        plt.title(f'Результаты опроса: {question.question_text[:50]}...')
-        plt.xticks(rotation=45, ha='right')
-        plt.tight_layout()
-        
-        # Сохраняем в буфер
-        buffer = io.BytesIO()
-        plt.savefig(buffer, format='png', dpi=100)
-        buffer.seek(0)
-        plt.close()
-        
-        # Кодируем в base64
-        image_base64 = base64.b64encode(buffer.getvalue()).decode('utf-8')
-        buffer.close()
-        
-        return Response({
-            'question_id': question.id,
-            'question_text': question.question_text,
-            'chart': f'data:image/png;base64,{image_base64}',
-            'chart_type': 'bar'
-        })
+        return set_validators(
+            self.chart_response(request, question, image, cache_status), etag, last_modified
+        )
 
-class PollSearchAPIView(APIView):
+class ChartCacheStatsAPIView(APIView):
     """
-    API для поиска и фильтрации голосований
-    GET /analytics/api/polls/search/?date_from=...&date_to=...&sort_by=...
+    Счетчики кэша диаграмм (попадания/промахи/вытеснения) для подбора его размера
+    GET /analytics/api/charts/cache/
     """
     def get(self, request):
+        return Response(chart_cache.stats())
+
+class VoteBufferStatsAPIView(APIView):
+    """
+    Состояние буфера голосов этого процесса: сколько голосов еще не записано в базу
+    GET /analytics/api/votes/buffer/
+    """
+    def get(self, request):
+        return Response(vote_buffer.stats())
+
+# Сортировки поиска: (поле ключа, по убыванию, второй ключ - id опроса).
+# Для popularity второй ключ берется из PollStatistic: тогда выдача идет
+# прямо по индексу (total_votes, question) без сортировки в памяти
+SEARCH_ORDERINGS = {
+    'recent': ('pub_date', True, 'id'),
+    'oldest': ('pub_date', False, 'id'),
+    'popularity': ('total_votes_sum', True, 'statistic__question_id'),
+}
+
+class PollSearchMixin:
+    """Разбор параметров и сборка страниц поиска (общие для синхронного и асинхронного API)."""
+    
+    def search_query(self, request):
+        """
+        Возвращает (queryset, text, sort_by, streaming). Для sort_by == 'relevance'
+        queryset только ограничивает поиск (см. ranked_matches), иначе это
+        упорядоченные строки values() для выдачи.
+        """
         queryset = Question.objects.all()
         
         # Фильтрация по дате
@@ -114,61 +267,368 @@ class PollSearchAPIView(APIView):
         if date_to:
             queryset = queryset.filter(pub_date__lte=date_to)
         
+        # Полнотекстовый поиск
+        text = request.query_params.get('q', '')
+        if not match_expression(text):
+            text = ''
+        streaming = request.query_params.get('stream') in ('1', 'true')
+        default_sort = 'relevance' if text and not streaming else 'recent'
+        
         # Сортировка
-        sort_by = request.query_params.get('sort_by', 'recent')
+        sort_by = request.query_params.get('sort_by', default_sort)
+        if sort_by == 'relevance' and text and not streaming:
+            return queryset, text, sort_by, streaming
+        if sort_by not in SEARCH_ORDERINGS:
+            sort_by = 'recent'
+        if text:
+            queryset = filter_questions(queryset, text)
+        field, descending, id_field = SEARCH_ORDERINGS[sort_by]
+        direction = '-' if descending else ''
+        if id_field != 'id':
+            # Внутреннее соединение: строка статистики есть у каждого опроса
+            queryset = queryset.filter(statistic__isnull=False)
         
-        # Добавляем аннотацию для total_votes всегда
-        queryset = queryset.annotate(
-            total_votes_sum=Sum('choice__votes')
+        # Итог голосов берем из поддерживаемой таблицы PollStatistic (без Sum по Choice)
+        rows = queryset.annotate(
+            total_votes_sum=F('statistic__total_votes')
+        ).order_by(direction + field, direction + id_field).values(
+            'id', 'question_text', 'pub_date', 'total_votes_sum'
         )
+        return rows, text, sort_by, streaming
+    
+    def page_rows(self, request, rows, sort_by):
+        """Строки текущей страницы плюс одна, чтобы понять, есть ли следующая."""
+        cursor = request.query_params.get('cursor')
+        if cursor:
+            rows = self.after_cursor(rows, cursor, sort_by)
+        return rows[:self.page_size(request) + 1]
+    
+    def page_data(self, request, page, sort_by):
+        page_size = self.page_size(request)
+        next_cursor = None
+        if len(page) > page_size:
+            page = page[:page_size]
+            field = SEARCH_ORDERINGS[sort_by][0]
+            key = page[-1][field]
+            if field == 'pub_date':
+                key = key.isoformat()
+            next_cursor = encode_cursor([sort_by, key, page[-1]['id']])
         
-        if sort_by == 'popularity':
-            queryset = queryset.order_by('-total_votes_sum')
-        elif sort_by == 'recent':
-            queryset = queryset.order_by('-pub_date')
-        elif sort_by == 'oldest':
-            queryset = queryset.order_by('pub_date')
-        
-        # Используем кастомный сериализатор
-        data = []
-        for question in queryset:
-            votes = question.total_votes_sum or 0
-            data.append({
-                'id': question.id,
-                'question_text': question.question_text,
-                'pub_date': question.pub_date,
-                'total_votes': votes
-            })
+        return {
+            'results': [self.to_item(row) for row in page],
+            'next_cursor': next_cursor,
+        }
+    
+    def relevance_after(self, request):
+        """Ключ (rank, id) из курсора страницы по релевантности."""
+        cursor = request.query_params.get('cursor')
+        if not cursor:
+            return None
+        values = decode_cursor(cursor)
+        if len(values) != 3 or values[0] != 'relevance':
+            raise ValidationError({'cursor': 'Курсор не подходит к этой сортировке'})
+        try:
+            return float(values[1]), int(values[2])
+        except (TypeError, ValueError):
+            raise ValidationError({'cursor': 'Некорректный курсор'})
+    
+    def relevance_rows(self, matches):
+        return Question.objects.filter(
+            id__in=[question_id for question_id, _ in matches]
+        ).annotate(total_votes_sum=F('statistic__total_votes')).values(
+            'id', 'question_text', 'pub_date', 'total_votes_sum'
+        )
+    
+    def relevance_data(self, request, matches, rows):
+        page_size = self.page_size(request)
+        next_cursor = None
+        if len(matches) > page_size:
+            matches = matches[:page_size]
+            next_cursor = encode_cursor(['relevance', matches[-1][1], matches[-1][0]])
+        
+        rows = {row['id']: row for row in rows}
+        return {
+            'results': [self.to_item(rows[question_id]) for question_id, _ in matches],
+            'next_cursor': next_cursor,
+        }
+    
+    def page_size(self, request):
+        return get_page_size(
+            request, settings.ANALYTICS_SEARCH_PAGE_SIZE, settings.ANALYTICS_SEARCH_MAX_PAGE_SIZE
+        )
+    
+    def after_cursor(self, rows, cursor, sort_by):
+        """Оставляет только строки после ключа из курсора."""
+        values = decode_cursor(cursor)
+        if len(values) != 3 or values[0] != sort_by:
+            raise ValidationError({'cursor': 'Курсор не подходит к этой сортировке'})
+        field, descending, id_field = SEARCH_ORDERINGS[sort_by]
+        try:
+            key = datetime.fromisoformat(values[1]) if field == 'pub_date' else int(values[1])
+            last_id = int(values[2])
+        except (TypeError, ValueError):
+            raise ValidationError({'cursor': 'Некорректный курсор'})
         
-        return Response(data)
+        lookup = 'lt' if descending else 'gt'
+        return rows.filter(
+            Q(**{f'{field}__{lookup}': key}) | Q(**{field: key, f'{id_field}__{lookup}': last_id})
+        )
+    
+    def search_validators(self, request, rollup):
+        """ETag и Last-Modified выдачи по глобальной версии: поиск зависит от всех опросов."""
+        return rollup_etag(rollup, 'search', request.accepted_renderer.format), rollup.updated_at
+    
+    def stream_line(self, row):
+        return json.dumps(self.to_item(row), cls=JSONEncoder, ensure_ascii=False) + '\n'
+    
+    def to_item(self, row):
+        return {
+            'id': row['id'],
+            'question_text': row['question_text'],
+            'pub_date': row['pub_date'],
+            'total_votes': row['total_votes_sum'] or 0,
+        }
+
+
+class PollSearchAPIView(ReplicaReadMixin, PollSearchMixin, APIView):
+    """
+    API для поиска и фильтрации голосований
+    GET /analytics/api/polls/search/?date_from=...&date_to=...&sort_by=...&page_size=...&cursor=...
+    
+    Выдача постраничная, по ключу (pub_date, id) или (total_votes, id) для popularity:
+    ответ содержит results и next_cursor - токен для запроса следующей страницы.
+    С параметром stream=1 все найденные опросы отдаются потоком NDJSON
+    по мере чтения из базы.
+    
+    q=... - полнотекстовый поиск по тексту вопроса и вариантов (по префиксам слов).
+    С q сортировка по умолчанию - relevance (ключ страницы (rank, id));
+    в потоковом режиме relevance заменяется на recent.
+    
+    ETag - по глобальной версии: с совпадающим If-None-Match ответ 304 без поиска.
+    """
+    def get(self, request):
+        etag, last_modified = self.search_validators(request, StatsRollup.objects.current())
+        response = not_modified(request, etag, last_modified)
+        if response is None:
+            response = set_validators(self.search(request), etag, last_modified)
+        return response
+    
+    def search(self, request):
+        rows, text, sort_by, streaming = self.search_query(request)
+        if sort_by == 'relevance':
+            matches = ranked_matches(
+                text, within=rows, after=self.relevance_after(request),
+                limit=self.page_size(request) + 1,
+            )
+            return Response(self.relevance_data(request, matches, self.relevance_rows(matches)))
+        
+        if streaming:
+            return StreamingHttpResponse(
+                self.stream_rows(rows), content_type='application/x-ndjson'
+            )
+        
+        page = list(self.page_rows(request, rows, sort_by))
+        return Response(self.page_data(request, page, sort_by))
+    
+    def stream_rows(self, rows):
+        """Построчно отдает найденные опросы, не загружая их все в память."""
+        for row in rows.iterator(chunk_size=settings.ANALYTICS_SEARCH_STREAM_CHUNK):
+            yield self.stream_line(row)
+
+class OverallStatsMixin:
+    """Запросы и ответ общей статистики (общие для синхронного и асинхронного API)."""
+    
+    def popular_polls(self):
+        # Самые популярные опросы (по индексу на PollStatistic.total_votes)
+        return PollStatistic.objects.select_related('question').order_by(
+            '-total_votes', '-question_id'
+        )[:5]
+    
+    def week_ago(self):
+        return timezone.now() - timedelta(days=7)
+    
+    def oldest_recent_poll(self, week_ago):
+        """
+        Дата самого старого опроса в окне последних 7 дней (по индексу pub_date).
+        Число активных опросов меняется и без записи в базу - когда опросы
+        выходят из окна, - и тогда меняется эта дата.
+        """
+        return Question.objects.filter(pub_date__gte=week_ago).order_by('pub_date').values_list(
+            'pub_date', flat=True
+        )
+    
+    def overall_etag(self, request, rollup, oldest_recent):
+        # Без Last-Modified: время выхода опроса из окна не хранится,
+        # и If-Modified-Since не заметил бы это изменение
+        return rollup_etag(rollup, 'overall', request.accepted_renderer.format, oldest_recent)
+    
+    def recent_polls(self, week_ago):
+        """
+        Активные опросы (за последние 7 дней): полные дни из дневных счетчиков,
+        а первый, неполный день окна - точным запросом.
+        Возвращает (queryset дневных счетчиков, queryset опросов первого дня).
+        """
+        first_day = timezone.localdate(week_ago)
+        next_day_start = timezone.make_aware(
+            datetime.combine(first_day + timedelta(days=1), datetime.min.time())
+        )
+        return (
+            DailyPollCount.objects.filter(day__gt=first_day),
+            Question.objects.filter(pub_date__gte=week_ago, pub_date__lt=next_day_start),
+        )
+    
+    def overall_data(self, rollup, popular_polls, recent_polls):
+        return {
+            'total_polls': rollup.total_polls,
+            'total_votes': rollup.total_votes,
+            'recent_polls': recent_polls,
+            'popular_polls': [
+                {
+                    'id': stat.question_id,
+                    'question_text': stat.question.question_text,
+                    'total_votes': stat.total_votes
+                } for stat in popular_polls
+            ],
+            'as_of': rollup.updated_at,
+        }
+
 
-class OverallStatsAPIView(APIView):
+class OverallStatsAPIView(ReplicaReadMixin, OverallStatsMixin, APIView):
     """
     Общая статистика по всем голосованиям
     GET /analytics/api/stats/overall/
+    
+    Отвечает из сводных счетчиков (StatsRollup, DailyPollCount) и индекса
+    PollStatistic, поэтому время ответа не зависит от размера таблиц.
+    as_of - момент последнего обновления счетчиков.
+    
+    ETag - по глобальной версии и окну активных опросов: с совпадающим
+    If-None-Match ответ 304 без подсчетов.
     """
     def get(self, request):
-        total_polls = Question.objects.count()
-        total_votes = Choice.objects.aggregate(total=Sum('votes'))['total'] or 0
+        rollup = StatsRollup.objects.current()
+        week_ago = self.week_ago()
+        etag = self.overall_etag(request, rollup, self.oldest_recent_poll(week_ago).first())
+        response = not_modified(request, etag)
+        if response is not None:
+            return response
+        days, first_day = self.recent_polls(week_ago)
+        recent_polls = (
+            (days.aggregate(total=Sum('count'))['total'] or 0) + first_day.count()
+        )
+        return set_validators(
+            Response(self.overall_data(rollup, self.popular_polls(), recent_polls)), etag
+        )
+
+# Шаги временного ряда в секундах
+TIMESERIES_STEPS = {'minute': 60, 'hour': 3600, 'day': 86400}
+# Допустимые годы границ: счетчики ведутся с эпохи Unix, а сверху нужен запас
+# на округление до шага, иначе datetime выходит за 9999 год
+TIMESERIES_YEARS = (1970, 9998)
+
+class PollTimeseriesAPIView(ReplicaReadMixin, APIView):
+    """
+    Динамика голосов по опросу
+    GET /analytics/api/polls/<question_id>/timeseries/?from=...&to=...&resolution=minute|hour|day
+    
+    Читает только счетчики VoteBucket, поэтому стоимость зависит от числа интервалов,
+    а не от числа голосов. Если точек получается больше ANALYTICS_TIMESERIES_MAX_POINTS,
+    шаг укрупняется. По умолчанию - последние сутки, шаг подбирается автоматически.
+    Диапазон длиннее ANALYTICS_TIMESERIES_MAX_DAYS дней отклоняется с 400.
+    """
+    def get(self, request, question_id):
+        question = get_object_or_404(Question, id=question_id)
+        end = self.parse_moment(request, 'to') or timezone.now()
+        start = self.parse_moment(request, 'from') or end - timedelta(days=1)
+        if start >= end:
+            raise ValidationError({'from': 'Начало диапазона должно быть раньше конца'})
+        max_days = settings.ANALYTICS_TIMESERIES_MAX_DAYS
+        if end - start > timedelta(days=max_days):
+            raise ValidationError({'from': f'Диапазон не может быть длиннее {max_days} дней'})
+        
+        resolution = request.query_params.get('resolution', 'auto')
+        if resolution != 'auto' and resolution not in TIMESERIES_STEPS:
+            raise ValidationError({'resolution': 'Ожидается minute, hour, day или auto'})
+        step = TIMESERIES_STEPS.get(resolution, TIMESERIES_STEPS['minute'])
         
-        # Самые популярные опросы
-        popular_polls = Question.objects.annotate(
-            total_votes=Sum('choice__votes')
-        ).order_by('-total_votes')[:5]
+        # Прореживаем большие диапазоны до ANALYTICS_TIMESERIES_MAX_POINTS точек
+        span = (end - start).total_seconds()
+        max_points = settings.ANALYTICS_TIMESERIES_MAX_POINTS
+        if span / step > max_points:
+            step = math.ceil(span / max_points / step) * step
+        hour = VoteBucket.SECONDS[VoteBucket.HOUR]
+        if step > hour:
+            step = math.ceil(step / hour) * hour
+        source = VoteBucket.HOUR if step % hour == 0 else VoteBucket.MINUTE
         
-        # Активные опросы (за последние 7 дней)
-        week_ago = timezone.now() - timedelta(days=7)
-        recent_polls = Question.objects.filter(pub_date__gte=week_ago).count()
+        first = int(start.timestamp()) // step * step
+        points = [
+            {'start': datetime.fromtimestamp(moment, tz=dt_timezone.utc), 'votes': 0, 'choices': {}}
+            for moment in range(first, math.ceil(end.timestamp()), step)
+        ]
+        buckets = VoteBucket.objects.filter(
+            question=question, resolution=source,
+            start__gte=points[0]['start'], start__lt=end,
+        ).values_list('choice_id', 'start', 'count')
+        for choice_id, bucket_start, count in buckets:
+            point = points[(int(bucket_start.timestamp()) - first) // step]
+            point['votes'] += count
+            point['choices'][str(choice_id)] = point['choices'].get(str(choice_id), 0) + count
         
         return Response({
-            'total_polls': total_polls,
-            'total_votes': total_votes,
-            'recent_polls': recent_polls,
-            'popular_polls': [
+            'question_id': question.id,
+            'from': start,
+            'to': end,
+            'step_seconds': step,
+            'choices': list(question.choice_set.order_by('id').values('id', 'choice_text')),
+            'points': points,
+        })
+    
+    def parse_moment(self, request, name):
+        """Читает дату или дату-время из параметра запроса (ISO 8601)."""
+        value = request.query_params.get(name)
+        if not value:
+            return None
+        try:
+            moment = parse_datetime(value)
+            if moment is None and parse_date(value) is not None:
+                moment = datetime.combine(parse_date(value), datetime.min.time())
+        except ValueError:
+            moment = None
+        if moment is None:
+            raise ValidationError({name: 'Ожидается дата или дата-время в формате ISO 8601'})
+        first_year, last_year = TIMESERIES_YEARS
+        if not first_year <= moment.year <= last_year:
+            raise ValidationError({name: f'Год должен быть от {first_year} до {last_year}'})
+        if timezone.is_naive(moment):
+            moment = timezone.make_aware(moment)
+        return moment
+
+
+class TrendingPollsAPIView(ReplicaReadMixin, APIView):
+    """
+    Опросы, набирающие голоса прямо сейчас
+    GET /analytics/api/polls/trending/?limit=10
+    
+    Счета затухают с периодом полураспада ANALYTICS_TRENDING_HALF_LIFE секунд
+    и хранятся в памяти (см. analytics.trending), таблица Choice не сканируется.
+    """
+    def get(self, request):
+        limit = get_page_size(request, 10, settings.ANALYTICS_TRENDING_TOP, name='limit')
+        scores = trending.top(limit)
+        questions = Question.objects.filter(id__in=[question_id for question_id, _ in scores]).annotate(
+            total_votes_sum=F('statistic__total_votes')
+        ).in_bulk()
+        
+        return Response({
+            'half_life_seconds': settings.ANALYTICS_TRENDING_HALF_LIFE,
+            'as_of': timezone.now(),
+            'polls': [
                 {
-                    'id': poll.id,
-                    'question_text': poll.question_text,
-                    'total_votes': poll.total_votes
-                } for poll in popular_polls
-            ]
-        })
\ No newline at end of file
+                    'id': question_id,
+                    'question_text': questions[question_id].question_text,
+                    'total_votes': questions[question_id].total_votes_sum or 0,
+                    'score': round(score, 4),
+                } for question_id, score in scores if question_id in questions
+            ],
+        })
@@ -9,8 +9,16 @@ https://docs.djangoproject.com/en/6.0/howto/deployment/asgi/
 
 import os
 
+from django.conf import settings
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'mysite.settings')
 
 application = get_asgi_application()
+
+# Предзагрузка графиков - только в серверном процессе, а не в manage.py
+# (migrate, shell, test), поэтому она здесь, а не в AppConfig.ready
+if settings.ANALYTICS_PRELOAD_CHARTS:
+    from analytics.charts import warm_up
+
+    warm_up()
@@ -0,0 +1,257 @@
+"""
+Замеры запросов: число и время SQL-запросов, время шаблонов, сериализации
+и отдельных этапов (отрисовка диаграммы, base64) по каждому представлению.
+
+MetricsMiddleware (первой в MIDDLEWARE) заводит на запрос объект RequestMetrics
+в contextvar; обертка execute_wrapper на каждом соединении и блоки timed()
+дописывают в него время. В ответ добавляется заголовок Server-Timing,
+а итоги попадают в гистограммы процесса, которые отдаются в текстовом
+формате Prometheus по адресу /metrics/.
+
+Гистограммы хранятся в памяти своего процесса: при нескольких воркерах
+Prometheus должен опрашивать каждый из них.
+"""
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+import threading
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.http import HttpResponse, HttpResponseForbidden
+from rest_framework.response import Response
+
+# Границы корзин гистограмм: секунды и число SQL-запросов
+DURATION_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+METRICS = {
+    'mysite_request_duration_seconds': ('histogram', 'Время обработки запроса, с', DURATION_BUCKETS),
+    'mysite_request_phase_seconds': (
+        'histogram', 'Время этапа запроса (db, template, serialize, ...), с', DURATION_BUCKETS,
+    ),
+    'mysite_request_queries': ('histogram', 'Число SQL-запросов на запрос', QUERY_BUCKETS),
+    'mysite_requests_total': ('counter', 'Число запросов по статусу ответа', None),
+}
+
+_current = ContextVar('request_metrics', default=None)
+
+
+class RequestMetrics:
+    __slots__ = ('started', 'queries', 'phases')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.phases = {}
+
+    def add(self, phase, seconds):
+        self.phases[phase] = self.phases.get(phase, 0.0) + seconds
+
+
+@contextmanager
+def timed(phase):
+    """Добавляет время блока к этапу phase текущего запроса (вне запроса ничего не делает)."""
+    metrics = _current.get()
+    if metrics is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.add(phase, time.perf_counter() - started)
+
+
+def record_query(execute, sql, params, many, context):
+    """execute_wrapper: считает SQL-запросы и их время для текущего запроса."""
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.queries += 1
+        metrics.add('db', time.perf_counter() - started)
+
+
+def instrument(connection):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+@receiver(connection_created)
+def instrument_new_connection(sender, connection, **kwargs):
+    instrument(connection)
+
+
+class Histogram:
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class MetricsRegistry:
+    """Гистограммы и счетчики процесса с метками."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._series = {}  # (имя, метки) -> Histogram или число
+
+    def record(self, view, method, status, metrics, total):
+        with self._lock:
+            self._observe('mysite_request_duration_seconds', (('view', view),), total)
+            self._observe('mysite_request_queries', (('view', view),), metrics.queries)
+            for phase, seconds in metrics.phases.items():
+                self._observe('mysite_request_phase_seconds', (('view', view), ('phase', phase)), seconds)
+            key = ('mysite_requests_total', (('view', view), ('method', method), ('status', str(status))))
+            self._series[key] = self._series.get(key, 0) + 1
+
+    def render(self):
+        """Все серии в текстовом формате Prometheus."""
+        with self._lock:
+            series = sorted(
+                (name, labels, value if isinstance(value, int) else (value.counts[:], value.sum, value.count))
+                for (name, labels), value in self._series.items()
+            )
+        lines = []
+        for name, (kind, help_text, buckets) in METRICS.items():
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+            for series_name, labels, value in series:
+                if series_name != name:
+                    continue
+                if kind == 'counter':
+                    lines.append(f'{name}{format_labels(labels)} {value}')
+                    continue
+                counts, total, count = value
+                cumulative = 0
+                for bound, bucket_count in zip(buckets + ('+Inf',), counts):
+                    cumulative += bucket_count
+                    lines.append(f'{name}_bucket{format_labels(labels + (("le", bound),))} {cumulative}')
+                lines.append(f'{name}_sum{format_labels(labels)} {total!r}')
+                lines.append(f'{name}_count{format_labels(labels)} {count}')
+        return '\n'.join(lines) + '\n'
+
+    def reset(self):
+        with self._lock:
+            self._series.clear()
+
+    def _observe(self, name, labels, value):
+        histogram = self._series.get((name, labels))
+        if histogram is None:
+            histogram = self._series[(name, labels)] = Histogram(METRICS[name][2])
+        histogram.observe(value)
+
+
+def format_labels(labels):
+    escaped = (
+        (key, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for key, value in labels
+    )
+    return '{' + ','.join(f'{key}="{value}"' for key, value in escaped) + '}'
+
+
+registry = MetricsRegistry()
+
+
+def server_timing(metrics, total):
+    """Значение заголовка Server-Timing (длительности в миллисекундах)."""
+    parts = [
+        f'total;dur={total * 1000:.1f}',
+        f'db;dur={metrics.phases.get("db", 0.0) * 1000:.1f};desc="{metrics.queries} queries"',
+    ]
+    parts += [
+        f'{phase};dur={seconds * 1000:.1f}'
+        for phase, seconds in metrics.phases.items() if phase != 'db'
+    ]
+    return ', '.join(parts)
+
+
+class MetricsMiddleware:
+    """
+    Замеряет каждый запрос и добавляет заголовок Server-Timing
+    (если MONITORING_SERVER_TIMING). Работает и под WSGI, и под ASGI
+    без переключения потоков.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+        # Соединения, открытые до загрузки middleware, сигнал уже пропустили
+        for connection in connections.all(initialized_only=True):
+            instrument(connection)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, metrics)
+
+    async def __acall__(self, request):
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, metrics)
+
+    def process_template_response(self, request, response):
+        # Ответ отрисуется сразу после middleware: для DRF это сериализация в JSON
+        metrics = _current.get()
+        if metrics is not None and not response.is_rendered:
+            phase = 'serialize' if isinstance(response, Response) else 'template'
+            started = time.perf_counter()
+            response.add_post_render_callback(
+                lambda rendered: metrics.add(phase, time.perf_counter() - started)
+            )
+        return response
+
+    def finish(self, request, response, metrics):
+        # Для потоковых ответов это время до начала передачи
+        total = time.perf_counter() - metrics.started
+        match = request.resolver_match
+        view = match.view_name if match is not None else 'unmatched'
+        registry.record(view, request.method, response.status_code, metrics, total)
+        if settings.MONITORING_SERVER_TIMING:
+            response['Server-Timing'] = server_timing(metrics, total)
+        return response
+
+
+def metrics_view(request):
+    """
+    Гистограммы процесса в текстовом формате Prometheus
+    GET /metrics/
+    Нужен заголовок Authorization: Bearer <MONITORING_METRICS_TOKEN>; без токена
+    в настройках эндпоинт открыт только при DEBUG.
+    """
+    token = settings.MONITORING_METRICS_TOKEN
+    if token:
+        if request.headers.get('Authorization') != f'Bearer {token}':
+            return HttpResponseForbidden()
+    elif not settings.DEBUG:
+        return HttpResponseForbidden()
+    return HttpResponse(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
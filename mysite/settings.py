@@ -51,6 +51,8 @@ INSTALLED_APPS = [
 SITE_ID = 1
 
 MIDDLEWARE = [
+    # Первой, чтобы замерять весь запрос (см. mysite.metrics)
+    'mysite.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -58,6 +60,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'analytics.routing.ReplicaPinMiddleware',
 ]
 
 ROOT_URLCONF = 'mysite.urls'
@@ -87,6 +90,34 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            # В WAL читатели не ждут пишущую транзакцию голосов
+            'init_command': 'PRAGMA journal_mode=WAL;',
+        },
+    },
+}
+
+# Реплика для чтения аналитики (см. analytics.routing): путь к файлу SQLite,
+# открываемому только на чтение. Это может быть сам db.sqlite3 (WAL позволяет
+# читать параллельно с записью) или снимок, который обновляет
+# manage.py refresh_replica_snapshot. Без переменной все читается из default.
+ANALYTICS_REPLICA_PATH = os.getenv('ANALYTICS_REPLICA_PATH')
+if ANALYTICS_REPLICA_PATH:
+    DATABASES['replica'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': f'file:{ANALYTICS_REPLICA_PATH}?mode=ro',
+        'OPTIONS': {'uri': True},
+        'TEST': {'MIRROR': 'default'},
+    }
+
+DATABASE_ROUTERS = ['analytics.routing.AnalyticsReplicaRouter']
+
+# Кэш (в памяти процесса; в продакшене - общий, например Redis)
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'mysite',
+        'OPTIONS': {'MAX_ENTRIES': 10000},
     }
 }
 
@@ -152,5 +183,88 @@ SOCIAL_AUTH_GOOGLE_OAUTH2_SCOPE = [
 REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.AllowAny',  # разрешаем доступ без авторизации
-    ]
-}
\ No newline at end of file
+    ],
+    # JSON через orjson (если установлен) с тем же выводом, что у JSONRenderer;
+    # HTML-страницы DRF для просмотра API - только при отладке
+    'DEFAULT_RENDERER_CLASSES': ['analytics.renderers.FastJSONRenderer'] + (
+        ['rest_framework.renderers.BrowsableAPIRenderer'] if DEBUG else []
+    ),
+}
+
+# Кэш отрисованных диаграмм аналитики (на процесс)
+ANALYTICS_CHART_CACHE_ENTRIES = 256
+ANALYTICS_CHART_CACHE_BYTES = 32 * 1024 * 1024
+
+# Пул процессов отрисовки диаграмм (0 - рисовать в потоке запроса) и таймаут ожидания, сек
+ANALYTICS_CHART_WORKERS = 2
+ANALYTICS_CHART_TIMEOUT = 10
+# Cache-Control: max-age для изображений диаграмм, сек
+ANALYTICS_CHART_MAX_AGE = 60
+# Загружать matplotlib и пул отрисовки при старте сервера (mysite.wsgi, mysite.asgi),
+# а не при первом запросе диаграммы; команды manage.py их не загружают
+ANALYTICS_PRELOAD_CHARTS = os.getenv('ANALYTICS_PRELOAD_CHARTS') == '1'
+
+# Бюджет времени старта для manage.py bench_startup, мс
+STARTUP_BUDGET_BOOT_MS = 1500
+STARTUP_BUDGET_FIRST_REQUEST_MS = 500
+
+# Поиск опросов: размер страницы по умолчанию, максимум и размер пачки при потоковой выдаче
+ANALYTICS_SEARCH_PAGE_SIZE = 50
+ANALYTICS_SEARCH_MAX_PAGE_SIZE = 200
+ANALYTICS_SEARCH_STREAM_CHUNK = 500
+
+# Максимум id в одном запросе /analytics/api/polls/stats/?ids=...
+ANALYTICS_STATS_BATCH_MAX_IDS = 200
+
+# Журнал голосов: размер пачки и максимальная задержка записи, сек
+ANALYTICS_LEDGER_BATCH_SIZE = 100
+ANALYTICS_LEDGER_FLUSH_INTERVAL = 1.0
+
+# Временные ряды: максимум точек в ответе (большие диапазоны прореживаются)
+# и максимальная длина диапазона, дней
+ANALYTICS_TIMESERIES_MAX_POINTS = 500
+ANALYTICS_TIMESERIES_MAX_DAYS = 366
+
+# "Горячие" опросы: период полураспада счета, окно восстановления и период
+# пересборки из счетчиков, сек; число хранимых опросов и максимум в ответе
+ANALYTICS_TRENDING_HALF_LIFE = 3600
+ANALYTICS_TRENDING_WINDOW = 6 * 3600
+ANALYTICS_TRENDING_RESYNC = 60
+ANALYTICS_TRENDING_CAPACITY = 1000
+ANALYTICS_TRENDING_TOP = 50
+
+# Отложенная запись голосов (polls.vote_buffer): включение, размер пачки
+# и максимальная задержка записи, сек
+POLLS_VOTE_BUFFER = os.getenv('POLLS_VOTE_BUFFER') == '1'
+POLLS_VOTE_BUFFER_SIZE = 200
+POLLS_VOTE_BUFFER_INTERVAL = 0.5
+# Максимум голосов в одном запросе /polls/api/votes/
+POLLS_VOTE_API_MAX_ITEMS = 10000
+# Размер пачки (опросов на транзакцию) при импорте через /polls/api/import/
+POLLS_IMPORT_BATCH_SIZE = 1000
+
+# Время жизни кэша публичных страниц опросов, сек (см. polls.cache)
+POLLS_PAGE_CACHE_TIMEOUT = 300
+
+# Чтение аналитики с реплики: псевдоним базы (None - читать из default),
+# максимальное отставание, период его проверки и закрепление за основной базой
+# после изменяющего запроса, сек
+ANALYTICS_REPLICA_DATABASE = 'replica'
+ANALYTICS_REPLICA_MAX_LAG = 30
+ANALYTICS_REPLICA_LAG_CHECK = 1.0
+ANALYTICS_REPLICA_PIN_SECONDS = 10
+
+# Живые результаты по SSE (analytics.live): период рассылки изменений, сек,
+# предел подписчиков на процесс, период keepalive и время, после которого
+# клиент, не успевающий читать поток, отключается, сек; интервал переподключения
+# клиента под WSGI, где поток не держится и каждый ответ - это чтение базы, сек
+ANALYTICS_LIVE_TICK = 1.0
+ANALYTICS_LIVE_MAX_SUBSCRIBERS = 1000
+ANALYTICS_LIVE_HEARTBEAT = 15
+ANALYTICS_LIVE_STALL_TIMEOUT = 30
+ANALYTICS_LIVE_WSGI_RETRY = 60
+
+# Замеры запросов (mysite.metrics): заголовок Server-Timing в ответах
+# и токен для /metrics/ (если не задан - эндпоинт открыт только при DEBUG)
+MONITORING_SERVER_TIMING = True
+MONITORING_METRICS_TOKEN = os.getenv('MONITORING_METRICS_TOKEN')
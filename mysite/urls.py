@@ -19,6 +19,7 @@ from django.urls import include, path  # include - для подключения
 from django.contrib.auth import views as auth_views
 from polls import views as polls_views
 from django.views.generic import RedirectView
+from mysite.metrics import metrics_view
 
 urlpatterns = [
     # Главная страница - переадресация на опросы
@@ -47,4 +48,7 @@ urlpatterns = [
     path('auth/', include('social_django.urls', namespace='social')),
 
     path('analytics/', include('analytics.urls')),
+
+    # Гистограммы запросов в формате Prometheus
+    path('metrics/', metrics_view, name='metrics'),
 ]
\ No newline at end of file
@@ -3,6 +3,7 @@ from django.utils import timezone
 import datetime
 from .models import Choice, Question
 from .admin_filters import TodayFilter, HasChoicesFilter
+from .search import filter_questions
 
 # Встроенное отображение Choice внутри Question
 class ChoiceInline(admin.TabularInline):
@@ -49,6 +50,9 @@ class QuestionAdmin(admin.ModelAdmin):
     # Количество объектов на странице
     list_per_page = 20
     
+    # Без второго COUNT(*) по всей таблице ради надписи "всего N" при фильтрации
+    show_full_result_count = False
+    
     # Порядок сортировки по умолчанию
     ordering = ['-pub_date']
     
@@ -57,6 +61,15 @@ class QuestionAdmin(admin.ModelAdmin):
     
     # Дата-иерархия (навигация по датам)
     date_hierarchy = 'pub_date'
+    
+    def get_search_results(self, request, queryset, search_term):
+        """
+        Поиск через полнотекстовый индекс (вопросы и варианты ответов)
+        вместо LIKE '%...%' по всей таблице.
+        """
+        if not search_term.strip():
+            return queryset, False
+        return filter_questions(queryset, search_term), False
 
 
 # Регистрируем модели с кастомными настройками
@@ -1,7 +1,10 @@
 from django.contrib import admin
+from django.db.models import Exists, OuterRef
 from django.utils import timezone
 import datetime
 
+from .models import Choice
+
 # Кастомный фильтр для вопросов, опубликованных сегодня
 class TodayFilter(admin.SimpleListFilter):
     title = 'публикация'
@@ -16,8 +19,11 @@ class TodayFilter(admin.SimpleListFilter):
     
     def queryset(self, request, queryset):
         if self.value() == 'today':
-            today = timezone.now().date()
-            return queryset.filter(pub_date__date=today)
+            # Диапазон вместо pub_date__date: сравнение с функцией от поля не использует индекс
+            start = timezone.make_aware(
+                datetime.datetime.combine(timezone.localdate(), datetime.time.min)
+            )
+            return queryset.filter(pub_date__gte=start, pub_date__lt=start + datetime.timedelta(days=1))
         elif self.value() == 'week':
             week_ago = timezone.now() - datetime.timedelta(days=7)
             return queryset.filter(pub_date__gte=week_ago)
@@ -39,8 +45,10 @@ class HasChoicesFilter(admin.SimpleListFilter):
         )
     
     def queryset(self, request, queryset):
+        # EXISTS по индексу вариантов вместо JOIN с DISTINCT
+        has_choices = Exists(Choice.objects.filter(question=OuterRef('pk')))
         if self.value() == 'yes':
-            return queryset.filter(choice__isnull=False).distinct()
+            return queryset.filter(has_choices)
         elif self.value() == 'no':
-            return queryset.filter(choice__isnull=True)
+            return queryset.filter(~has_choices)
         return queryset
\ No newline at end of file
@@ -0,0 +1,123 @@
+"""
+JSON API голосования для клиентов, которые копят голоса офлайн (киоски, мобильные).
+"""
+import io
+import os
+from collections import Counter
+
+from django.conf import settings
+from rest_framework.exceptions import ValidationError
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from .importing import READERS, PollImportError, import_polls, poll_from_dict
+from .models import Choice
+from .vote_buffer import vote_buffer
+from .votes import apply_votes
+
+
+class VoteBatchAPIView(APIView):
+    """
+    Пакетная отправка голосов
+    POST /polls/api/votes/  {"votes": [{"question_id": 1, "choice_id": 2}, ...]}
+    
+    Все id проверяются одним запросом, голоса группируются по вариантам
+    и записываются одной транзакцией. В ответе results[i] - итог для votes[i]:
+    {"status": "ok"} или {"status": "error", "error": "..."}.
+    """
+    def post(self, request):
+        items = self.parse_votes(request.data)
+        choice_ids = {choice_id for _, choice_id in items if choice_id is not None}
+        questions = dict(
+            Choice.objects.filter(pk__in=choice_ids).values_list('pk', 'question_id')
+        ) if choice_ids else {}
+        
+        deltas = Counter()
+        results = []
+        for question_id, choice_id in items:
+            if choice_id is None:
+                results.append({'status': 'error', 'error': 'Ожидаются целые question_id и choice_id'})
+            elif choice_id not in questions:
+                results.append({'status': 'error', 'error': 'Вариант не найден'})
+            elif questions[choice_id] != question_id:
+                results.append({'status': 'error', 'error': 'Вариант не относится к этому вопросу'})
+            else:
+                deltas[(question_id, choice_id)] += 1
+                results.append({'status': 'ok'})
+        
+        if settings.POLLS_VOTE_BUFFER:
+            for (question_id, choice_id), count in deltas.items():
+                vote_buffer.record(question_id, choice_id, count)
+        else:
+            apply_votes(deltas)
+        
+        accepted = sum(deltas.values())
+        return Response({
+            'accepted': accepted,
+            'rejected': len(items) - accepted,
+            'results': results,
+        })
+    
+    def parse_votes(self, data):
+        """
+        Возвращает список (question_id, choice_id); для некорректного элемента - (None, None).
+        Ошибки в самом конверте запроса дают 400.
+        """
+        votes = data.get('votes') if isinstance(data, dict) else data
+        if not isinstance(votes, list):
+            raise ValidationError({'votes': 'Ожидается список голосов'})
+        if len(votes) > settings.POLLS_VOTE_API_MAX_ITEMS:
+            raise ValidationError(
+                {'votes': f'Не больше {settings.POLLS_VOTE_API_MAX_ITEMS} голосов за запрос'}
+            )
+        items = []
+        for vote in votes:
+            try:
+                question_id, choice_id = vote['question_id'], vote['choice_id']
+            except (TypeError, KeyError):
+                items.append((None, None))
+                continue
+            # bool - подкласс int, но id им быть не может
+            if type(question_id) is not int or type(choice_id) is not int:
+                items.append((None, None))
+            else:
+                items.append((question_id, choice_id))
+        return items
+
+
+class PollImportAPIView(APIView):
+    """
+    Импорт опросов (только для вошедших пользователей)
+    POST /polls/api/import/
+    
+    Принимает файл выгрузки CSV/JSONL в поле file (multipart; формат - по расширению
+    или параметру ?format=) либо JSON {"polls": [{"question_text", "pub_date", "choices"}]}.
+    Файл читается потоково и сохраняется пачками, как в manage.py import_polls.
+    Возвращает отчет: число опросов и вариантов, пропущенные записи, скорость.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        upload = request.FILES.get('file')
+        if upload is not None:
+            records = self.read_upload(upload, request.query_params.get('format'))
+        else:
+            polls = request.data.get('polls') if isinstance(request.data, dict) else None
+            if not isinstance(polls, list):
+                raise ValidationError({'polls': 'Передайте файл в поле file или список polls'})
+            records = (self.read_record(record) for record in polls)
+        report = import_polls(records, batch_size=settings.POLLS_IMPORT_BATCH_SIZE)
+        return Response(report.as_dict(), status=201 if report.polls else 200)
+
+    def read_upload(self, upload, input_format):
+        input_format = input_format or os.path.splitext(upload.name)[1].lstrip('.').lower()
+        if input_format not in READERS:
+            raise ValidationError({'format': 'Ожидается csv или jsonl'})
+        return READERS[input_format](io.TextIOWrapper(upload, encoding='utf-8', newline=''))
+
+    def read_record(self, record):
+        try:
+            return poll_from_dict(record)
+        except PollImportError as error:
+            return error
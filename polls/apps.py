@@ -3,3 +3,7 @@ from django.apps import AppConfig
 
 class PollsConfig(AppConfig):
     name = 'polls'
+
+    def ready(self):
+        # Подключаем сброс кэша страниц при голосах и правке опросов
+        from . import cache  # noqa: F401
@@ -0,0 +1,147 @@
+"""
+Кэш публичных страниц опросов с версионированными ключами.
+
+Ключ страницы включает версии ее областей: "index" для списка опросов
+и "question:<id>" для страниц вопроса. Голос, правка вопроса или вариантов
+увеличивают версию только затронутого вопроса (создание и правка вопроса -
+еще и списка), и старые записи просто перестают читаться. Начальная версия -
+текущее время в наносекундах, поэтому после вытеснения счетчика версия
+не совпадет ни с одной из уже закэшированных.
+
+Кэшируются только ответы 200 на GET анонимных пользователей: у вошедших
+другое меню и собственный CSRF-токен. Токен в формах кэшированной страницы
+заменяется заглушкой и при выдаче подставляется токен текущего запроса.
+"""
+import hashlib
+import re
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.core.handlers.asgi import ASGIRequest
+from django.dispatch import receiver
+from django.http import HttpResponse
+from django.middleware.csrf import get_token
+
+from mysite.metrics import timed
+
+from .models import Choice, Question
+from .signals import polls_created, votes_cast
+
+INDEX = 'index'
+
+# Заголовки, которые сохраняются в кэше вместе со страницей (см. polls.conditional)
+CACHED_HEADERS = ('ETag', 'Last-Modified')
+
+CSRF_PLACEHOLDER = b'__polls_csrf_token__'
+CSRF_INPUT = re.compile(rb'(name="csrfmiddlewaretoken" value=")[^"]*(")')
+
+
+def question_scope(question_id):
+    return f'question:{question_id}'
+
+
+def version_key(scope):
+    return f'polls:version:{scope}'
+
+
+def get_versions(scopes):
+    """Текущие версии областей (отсутствующие создаются)."""
+    keys = [version_key(scope) for scope in scopes]
+    versions = cache.get_many(keys)
+    missing = {key: time.time_ns() for key in keys if key not in versions}
+    if missing:
+        cache.set_many(missing, None)
+        versions.update(missing)
+    return [versions[key] for key in keys]
+
+
+def bump(*scopes):
+    """Делает недействительными закэшированные страницы областей."""
+    for scope in scopes:
+        try:
+            cache.incr(version_key(scope))
+        except ValueError:
+            cache.set(version_key(scope), time.time_ns(), None)
+
+
+def forget(*scopes):
+    """
+    bump сразу и еще раз после фиксации транзакции: иначе параллельный запрос
+    успел бы закэшировать под новой версией еще не измененные данные.
+    """
+    bump(*scopes)
+    transaction.on_commit(lambda: bump(*scopes))
+
+
+class CachedPageMixin:
+    """
+    Кэширует страницу представления на время get_cache_timeout().
+    Подклассы задают области страницы в get_cache_scopes().
+    """
+    def get_cache_scopes(self):
+        raise NotImplementedError
+
+    def get_cache_timeout(self):
+        return settings.POLLS_PAGE_CACHE_TIMEOUT
+
+    def dispatch(self, request, *args, **kwargs):
+        if request.method != 'GET' or request.user.is_authenticated:
+            return super().dispatch(request, *args, **kwargs)
+
+        self.kwargs = kwargs
+        versions = get_versions(self.get_cache_scopes())
+        # Под ASGI страницы подписываются на живые результаты, под WSGI - нет
+        asgi = isinstance(request, ASGIRequest)
+        digest = hashlib.md5(
+            f'{request.get_full_path()}|{versions}|{asgi}'.encode('utf-8'), usedforsecurity=False
+        ).hexdigest()
+        key = f'polls:page:{digest}'
+        cached = cache.get(key)
+        if cached is not None:
+            content, content_type, headers = cached
+            response = HttpResponse(
+                content.replace(CSRF_PLACEHOLDER, get_token(request).encode('ascii')),
+                content_type=content_type,
+            )
+            for name, value in headers.items():
+                response[name] = value
+            response['X-Page-Cache'] = 'hit'
+            return response
+
+        response = super().dispatch(request, *args, **kwargs)
+        if response.status_code == 200:
+            if hasattr(response, 'render'):
+                with timed('template'):
+                    response.render()
+            timeout = self.get_cache_timeout()
+            if timeout > 0:
+                content = CSRF_INPUT.sub(rb'\g<1>' + CSRF_PLACEHOLDER + rb'\g<2>', response.content)
+                headers = {name: response[name] for name in CACHED_HEADERS if response.has_header(name)}
+                cache.set(key, (content, response['Content-Type'], headers), timeout)
+        response['X-Page-Cache'] = 'miss'
+        return response
+
+
+@receiver(votes_cast)
+def forget_voted_pages(sender, deltas, **kwargs):
+    forget(*{question_scope(question_id) for question_id, _ in deltas})
+
+
+@receiver(polls_created)
+def forget_index_on_import(sender, questions, **kwargs):
+    forget(INDEX)
+
+
+@receiver(post_save, sender=Question)
+@receiver(post_delete, sender=Question)
+def forget_question_pages(sender, instance, **kwargs):
+    forget(INDEX, question_scope(instance.pk))
+
+
+@receiver(post_save, sender=Choice)
+@receiver(post_delete, sender=Choice)
+def forget_choice_pages(sender, instance, **kwargs):
+    forget(question_scope(instance.question_id))
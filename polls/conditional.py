@@ -0,0 +1,46 @@
+"""
+Условные GET-запросы: ETag, Last-Modified и ответ 304 Not Modified.
+
+Ответ строится из версии данных, которая читается одним запросом по индексу:
+у опроса это PollStatistic.version (растет в той же транзакции, что и голоса,
+и при правке вопроса или вариантов), у поиска и общей статистики - версия
+StatsRollup (см. analytics.models). Если If-None-Match клиента совпадает
+с текущим ETag, представление отвечает 304 до подсчетов и отрисовки диаграмм.
+
+В ETag входит и момент обновления версии: после пересборки таблиц статистики
+версии начинаются заново, но старые ETag все равно не совпадут.
+"""
+import hashlib
+
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+
+def make_etag(*parts):
+    """Сильный ETag из частей, однозначно определяющих содержимое ответа."""
+    digest = hashlib.md5(
+        '|'.join(str(part) for part in parts).encode('utf-8'), usedforsecurity=False
+    ).hexdigest()
+    return f'"{digest}"'
+
+
+def not_modified(request, etag, last_modified=None):
+    """
+    Ответ 304, если у клиента актуальная версия (If-None-Match или, без него,
+    If-Modified-Since), иначе None. У ответа 304 уже стоят ETag и Last-Modified.
+    """
+    if etag is None or request.method not in ('GET', 'HEAD'):
+        return None
+    response = get_conditional_response(
+        request, etag=etag, last_modified=int(last_modified.timestamp()) if last_modified else None,
+    )
+    return response and set_validators(response, etag, last_modified)
+
+
+def set_validators(response, etag, last_modified=None):
+    """Добавляет ETag и Last-Modified к успешному ответу."""
+    if etag is not None and (200 <= response.status_code < 300 or response.status_code == 304):
+        response['ETag'] = etag
+        if last_modified is not None:
+            response['Last-Modified'] = http_date(last_modified.timestamp())
+    return response
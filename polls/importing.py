@@ -0,0 +1,226 @@
+"""
+Пакетное создание опросов: импорт выгрузок CSV/JSONL и форма create_poll.
+
+Вход читается потоково и записывается пачками по batch_size опросов: на пачку -
+одна транзакция с двумя bulk_create (вопросы и варианты), так что опрос никогда
+не сохраняется наполовину. bulk_create не вызывает post_save, поэтому о новых
+опросах сообщает сигнал polls_created (статистику по нему ведет analytics).
+
+Формат JSONL: по опросу в строке
+    {"question_text": "...", "pub_date": "2024-01-01T12:00:00Z",
+     "choices": ["Да", {"choice_text": "Нет", "votes": 3}]}
+Формат CSV: строка на вариант, колонки question_text, pub_date, choice_text, votes;
+подряд идущие строки с одинаковыми question_text и pub_date образуют один опрос.
+pub_date и votes необязательны.
+Вход - в UTF-8: если дальше в файле встречаются другие байты, остаток
+файла пропускается и в отчет попадает одна ошибка.
+"""
+import csv
+import functools
+import json
+import time
+from dataclasses import dataclass, field
+from itertools import groupby, islice
+
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import Choice, Question
+from .signals import polls_created
+
+TEXT_MAX_LENGTH = 200
+
+# Сколько ошибок разбора сохранять в отчете
+MAX_REPORTED_ERRORS = 100
+
+
+class PollImportError(ValueError):
+    """Некорректная запись во входных данных."""
+
+
+@dataclass
+class PollData:
+    question_text: str
+    pub_date: object
+    choices: list  # [(choice_text, votes)]
+
+
+@dataclass
+class ImportReport:
+    polls: int = 0
+    choices: int = 0
+    skipped: int = 0
+    seconds: float = 0.0
+    errors: list = field(default_factory=list)  # [(номер записи, сообщение)]
+
+    @property
+    def rate(self):
+        """Опросов в секунду."""
+        return self.polls / self.seconds if self.seconds else 0.0
+
+    def as_dict(self):
+        return {
+            'polls': self.polls,
+            'choices': self.choices,
+            'skipped': self.skipped,
+            'seconds': round(self.seconds, 3),
+            'polls_per_second': round(self.rate, 1),
+            'errors': [{'record': number, 'error': message} for number, message in self.errors],
+        }
+
+
+def clean_text(value, name):
+    text = str(value or '').strip()
+    if not text:
+        raise PollImportError(f'Пустое поле {name}')
+    if len(text) > TEXT_MAX_LENGTH:
+        raise PollImportError(f'{name} длиннее {TEXT_MAX_LENGTH} символов')
+    return text
+
+
+def clean_pub_date(value):
+    if value in (None, ''):
+        return timezone.now()
+    pub_date = parse_datetime(str(value))
+    if pub_date is None:
+        raise PollImportError(f'Некорректная дата публикации: {value}')
+    if timezone.is_naive(pub_date):
+        pub_date = timezone.make_aware(pub_date)
+    return pub_date
+
+
+def clean_votes(value):
+    if value in (None, ''):
+        return 0
+    try:
+        votes = int(value)
+    except (TypeError, ValueError):
+        raise PollImportError(f'Некорректное число голосов: {value}')
+    if votes < 0:
+        raise PollImportError('Число голосов не может быть отрицательным')
+    return votes
+
+
+def poll_from_dict(record):
+    """Проверяет запись {"question_text", "pub_date", "choices"} и возвращает PollData."""
+    if not isinstance(record, dict):
+        raise PollImportError('Ожидается объект опроса')
+    choices = []
+    for choice in record.get('choices') or []:
+        if isinstance(choice, dict):
+            choices.append((clean_text(choice.get('choice_text'), 'choice_text'),
+                            clean_votes(choice.get('votes'))))
+        else:
+            choices.append((clean_text(choice, 'choice_text'), 0))
+    return PollData(
+        question_text=clean_text(record.get('question_text'), 'question_text'),
+        pub_date=clean_pub_date(record.get('pub_date')),
+        choices=choices,
+    )
+
+
+def stop_on_decode_error(reader):
+    """
+    Ошибку декодирования входа превращает в последнюю запись-ошибку вместо
+    исключения: после нее позиция в потоке неизвестна, поэтому чтение прекращается.
+    """
+    @functools.wraps(reader)
+    def wrapper(lines):
+        try:
+            yield from reader(lines)
+        except UnicodeDecodeError:
+            yield PollImportError('Файл не в кодировке UTF-8, остаток файла пропущен')
+    return wrapper
+
+
+@stop_on_decode_error
+def read_jsonl(lines):
+    """Разбирает строки JSONL; для каждой записи выдает PollData или PollImportError."""
+    for line in lines:
+        if not line.strip():
+            continue
+        try:
+            yield poll_from_dict(json.loads(line))
+        except ValueError as error:
+            # json.JSONDecodeError и PollImportError - подклассы ValueError
+            if not isinstance(error, PollImportError):
+                error = PollImportError(f'Некорректный JSON: {error}')
+            yield error
+
+
+@stop_on_decode_error
+def read_csv(lines):
+    """Разбирает CSV (строка на вариант); для каждого опроса выдает PollData или PollImportError."""
+    rows = csv.DictReader(lines)
+    for (question_text, pub_date), group in groupby(
+        rows, key=lambda row: (row.get('question_text'), row.get('pub_date'))
+    ):
+        try:
+            yield poll_from_dict({
+                'question_text': question_text,
+                'pub_date': pub_date,
+                'choices': [
+                    {'choice_text': row.get('choice_text'), 'votes': row.get('votes')}
+                    for row in group if (row.get('choice_text') or '').strip()
+                ],
+            })
+        except PollImportError as error:
+            yield error
+
+
+READERS = {
+    'jsonl': read_jsonl,
+    'csv': read_csv,
+}
+
+
+def save_polls(polls):
+    """
+    Создает опросы с вариантами одной транзакцией: два bulk_create
+    независимо от числа опросов. Возвращает созданные вопросы.
+    """
+    with transaction.atomic():
+        questions = Question.objects.bulk_create(
+            [Question(question_text=poll.question_text, pub_date=poll.pub_date) for poll in polls]
+        )
+        choices = Choice.objects.bulk_create([
+            Choice(question=question, choice_text=choice_text, votes=votes)
+            for question, poll in zip(questions, polls)
+            for choice_text, votes in poll.choices
+        ])
+        polls_created.send(sender=Question, questions=questions, choices=choices)
+    return questions
+
+
+def import_polls(records, batch_size=1000, progress=None):
+    """
+    Сохраняет поток PollData/PollImportError пачками по batch_size опросов.
+    progress(report) вызывается после каждой пачки. Возвращает ImportReport.
+    """
+    report = ImportReport()
+    started = time.monotonic()
+    records = iter(records)
+    number = 0
+    while True:
+        chunk = list(islice(records, batch_size))
+        if not chunk:
+            break
+        batch = []
+        for record in chunk:
+            number += 1
+            if isinstance(record, PollImportError):
+                report.skipped += 1
+                if len(report.errors) < MAX_REPORTED_ERRORS:
+                    report.errors.append((number, str(record)))
+            else:
+                batch.append(record)
+        if batch:
+            save_polls(batch)
+            report.polls += len(batch)
+            report.choices += sum(len(poll.choices) for poll in batch)
+        report.seconds = time.monotonic() - started
+        if progress is not None:
+            progress(report)
+    report.seconds = time.monotonic() - started
+    return report
@@ -0,0 +1,53 @@
+import os
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from polls.importing import READERS, import_polls
+
+
+class Command(BaseCommand):
+    help = (
+        'Импортирует опросы из выгрузки CSV или JSONL (путь или "-" для stdin) '
+        'пачками bulk_create, по транзакции на пачку'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=sorted(READERS),
+                            help='Формат входа; по умолчанию определяется по расширению')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        path = options['path']
+        input_format = options['format'] or os.path.splitext(path)[1].lstrip('.').lower()
+        if input_format not in READERS:
+            raise CommandError('Укажите --format: csv или jsonl')
+
+        def progress(report):
+            self.stdout.write(
+                f'{report.polls} опросов, {report.choices} вариантов, '
+                f'{report.rate:.0f} опросов/с'
+            )
+
+        def run(source):
+            return import_polls(
+                READERS[input_format](source), batch_size=options['batch_size'], progress=progress
+            )
+
+        if path == '-':
+            report = run(sys.stdin)
+        else:
+            try:
+                source = open(path, encoding='utf-8', newline='')
+            except OSError as error:
+                raise CommandError(f'Не удалось открыть {path}: {error}')
+            with source:
+                report = run(source)
+
+        for number, message in report.errors:
+            self.stderr.write(f'Запись {number}: {message}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Импортировано {report.polls} опросов ({report.choices} вариантов) '
+            f'за {report.seconds:.2f} с, {report.rate:.0f} опросов/с; пропущено: {report.skipped}'
+        ))
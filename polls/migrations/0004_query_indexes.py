@@ -0,0 +1,21 @@
+# Generated by Django 6.0 on 2026-10-18 01:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('polls', '0003_search_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='choice',
+            index=models.Index(fields=['question', '-votes'], name='polls_choice_votes_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='question',
+            index=models.Index(fields=['pub_date'], name='polls_question_pub_date_idx'),
+        ),
+    ]
@@ -33,14 +33,25 @@ class Question(models.Model):
     
     @property
     def total_votes(self):
-        """Возвращает общее количество голосов для этого вопроса."""
-        return sum(choice.votes for choice in self.choice_set.all())
+        """
+        Возвращает общее количество голосов для этого вопроса.
+        Если варианты предзагружены (prefetch_related), считает по ним без запроса,
+        иначе - одним агрегирующим запросом.
+        """
+        prefetched = getattr(self, '_prefetched_objects_cache', {})
+        if 'choice_set' in prefetched:
+            return sum(choice.votes for choice in prefetched['choice_set'])
+        return self.choice_set.aggregate(total=models.Sum('votes'))['total'] or 0
     
     # Метаданные модели
     class Meta:
         verbose_name = 'Вопрос'
         verbose_name_plural = 'Вопросы'
         ordering = ['-pub_date']  # Сортировка по умолчанию
+        indexes = [
+            # Публичные страницы, фильтры админки и поиск фильтруют и сортируют по pub_date
+            models.Index(fields=['pub_date'], name='polls_question_pub_date_idx'),
+        ]
 
 # Модель Вариант ответа (Choice) - связана с Question
 class Choice(models.Model):
@@ -60,4 +71,8 @@ class Choice(models.Model):
     # Метаданные модели
     class Meta:
         verbose_name = 'Вариант ответа'
-        verbose_name_plural = 'Варианты ответов'
\ No newline at end of file
+        verbose_name_plural = 'Варианты ответов'
+        indexes = [
+            # Варианты опроса по убыванию голосов (диаграмма) без сортировки в памяти
+            models.Index(fields=['question', '-votes'], name='polls_choice_votes_idx'),
+        ]
\ No newline at end of file
@@ -0,0 +1,102 @@
+"""
+Полнотекстовый поиск по текстам вопросов и вариантов ответов.
+
+На SQLite используется индекс FTS5 (таблицы polls_question_fts и polls_choice_fts,
+см. миграцию 0003_search_index); триггеры держат его в актуальном состоянии.
+На других СУБД поиск откатывается к icontains.
+"""
+import re
+
+from django.db import connections, router
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+from .models import Question
+
+# Совпадение в тексте варианта весит меньше, чем в тексте вопроса
+CHOICE_RANK_WEIGHT = 0.5
+
+MATCH_SQL = f'''
+    SELECT question_id, MIN(rank) AS rank FROM (
+        SELECT rowid AS question_id, bm25(polls_question_fts) AS rank
+        FROM polls_question_fts WHERE polls_question_fts MATCH %s
+        UNION ALL
+        SELECT polls_choice.question_id, bm25(polls_choice_fts) * {CHOICE_RANK_WEIGHT} AS rank
+        FROM polls_choice_fts JOIN polls_choice ON polls_choice.id = polls_choice_fts.rowid
+        WHERE polls_choice_fts MATCH %s
+    ) GROUP BY question_id
+'''
+
+
+def match_expression(text):
+    """
+    Превращает пользовательский запрос в выражение MATCH для FTS5:
+    каждое слово ищется по префиксу, все слова должны встретиться.
+    """
+    words = re.findall(r'\w+', text.lower())
+    return ' '.join(f'"{word}"*' for word in words)
+
+
+def search_connection():
+    """Соединение, из которого читаются вопросы (с учетом маршрутизации на реплику)."""
+    return connections[router.db_for_read(Question)]
+
+
+def uses_fts():
+    return search_connection().vendor == 'sqlite'
+
+
+def filter_questions(queryset, text):
+    """Оставляет в queryset только вопросы, подходящие под запрос."""
+    expression = match_expression(text)
+    if not expression:
+        return queryset
+    if not uses_fts():
+        return queryset.filter(
+            Q(question_text__icontains=text) | Q(choice__choice_text__icontains=text)
+        ).distinct()
+    return queryset.filter(
+        id__in=RawSQL(f'SELECT question_id FROM ({MATCH_SQL})', (expression, expression))
+    )
+
+
+def ranked_matches(text, within=None, after=None, limit=None):
+    """
+    Возвращает список (question_id, rank), упорядоченный по релевантности
+    (меньший rank - лучше), затем по id.
+    within - queryset вопросов, которым ограничивается поиск;
+    after - ключ (rank, question_id), после которого начинать (для курсоров).
+    """
+    expression = match_expression(text)
+    if not expression:
+        return []
+    if not uses_fts():
+        queryset = filter_questions(within if within is not None else Question.objects.all(), text)
+        ids = queryset.order_by('id').values_list('id', flat=True)
+        if after is not None:
+            ids = ids.filter(id__gt=after[1])
+        if limit is not None:
+            ids = ids[:limit]
+        return [(question_id, 0.0) for question_id in ids]
+
+    sql = f'SELECT question_id, rank FROM ({MATCH_SQL}) AS matches'
+    params = [expression, expression]
+    conditions = []
+    if within is not None:
+        within_sql, within_params = within.order_by().values('id').query.sql_with_params()
+        conditions.append(f'question_id IN ({within_sql})')
+        params += within_params
+    if after is not None:
+        conditions.append('(rank > %s OR (rank = %s AND question_id > %s))')
+        params += [after[0], after[0], after[1]]
+    if conditions:
+        sql += ' WHERE ' + ' AND '.join(conditions)
+    sql += ' ORDER BY rank, question_id'
+    if limit is not None:
+        sql += ' LIMIT %s'
+        params.append(limit)
+
+    with search_connection().cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.fetchall()
+
@@ -0,0 +1,9 @@
+from django.dispatch import Signal
+
+# Отправляется после записи голосов в базу (в той же транзакции).
+# deltas - словарь {(question_id, choice_id): количество новых голосов}.
+votes_cast = Signal()
+
+# Отправляется после пакетного создания опросов через bulk_create (в той же транзакции),
+# для которого post_save не вызывается. questions и choices - созданные объекты.
+polls_created = Signal()
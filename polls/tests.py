@@ -1,8 +1,26 @@
 import datetime
-from django.test import TestCase
+import io
+import os
+import re
+import tempfile
+from unittest import mock
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import OperationalError, connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.utils import timezone
 from django.urls import reverse
-from .models import Question
+from analytics.charts import chart_cache
+from analytics.models import PollStatistic, StatsRollup
+from .importing import PollData, import_polls
+from .models import Choice, Question
+from .views import IndexView
+from .vote_buffer import vote_buffer
 
 def create_question(question_text, days, **kwargs):
     """
@@ -40,6 +58,10 @@ class QuestionModelTests(TestCase):
 
 # Тесты для представления IndexView
 class QuestionIndexViewTests(TestCase):
+    def setUp(self):
+        # Откат транзакции теста не сбрасывает версии кэша страниц
+        cache.clear()
+
     def test_no_questions(self):
         """
         Если нет вопросов, отображается соответствующее сообщение.
@@ -96,6 +118,10 @@ class QuestionIndexViewTests(TestCase):
 
 # Тесты для представления DetailView
 class QuestionDetailViewTests(TestCase):
+    def setUp(self):
+        # Откат транзакции теста не сбрасывает версии кэша страниц
+        cache.clear()
+
     def test_future_question(self):
         """
         Детальное представление вопроса с будущей датой публикации возвращает 404.
@@ -112,4 +138,646 @@ class QuestionDetailViewTests(TestCase):
         past_question = create_question("Прошлый вопрос", days=-5)
         url = reverse('polls:detail', args=(past_question.id,))
         response = self.client.get(url)
-        self.assertContains(response, past_question.question_text)
\ No newline at end of file
+        self.assertContains(response, past_question.question_text)
+
+
+# Тесты для голосования и буфера голосов
+class VoteTests(TestCase):
+    def setUp(self):
+        self.question = create_question("Вопрос", days=-1)
+        self.first = self.question.choice_set.create(choice_text="А")
+        self.second = self.question.choice_set.create(choice_text="Б")
+
+    def vote(self, choice_id, question_id=None):
+        return self.client.post(
+            reverse('polls:vote', args=(self.question.id if question_id is None else question_id,)), {'choice': choice_id}
+        )
+
+    def test_vote_is_written_immediately(self):
+        """
+        Без буфера голос сразу попадает в базу.
+        """
+        response = self.vote(self.first.id)
+        self.assertRedirects(response, reverse('polls:results', args=(self.question.id,)))
+        self.first.refresh_from_db()
+        self.assertEqual(self.first.votes, 1)
+
+    def test_invalid_choice(self):
+        """
+        Чужой, несуществующий или некорректный вариант возвращает форму с ошибкой.
+        """
+        other = create_question("Другой", days=-1).choice_set.create(choice_text="В")
+        for choice_id in (other.id, 0, 'abc'):
+            self.assertContains(self.vote(choice_id), "Вы не выбрали вариант ответа.")
+        self.assertEqual(self.vote(self.first.id, question_id=0).status_code, 404)
+        self.assertFalse(Choice.objects.filter(votes__gt=0).exists())
+
+    @override_settings(POLLS_VOTE_BUFFER=True, POLLS_VOTE_BUFFER_SIZE=1000,
+                       POLLS_VOTE_BUFFER_INTERVAL=0)
+    def test_buffered_votes_are_flushed_in_batch(self):
+        """
+        С буфером голоса копятся в памяти, видны на странице результатов
+        и записываются одним UPDATE при сбросе.
+        """
+        self.vote(self.first.id)
+        self.vote(self.first.id)
+        self.vote(self.second.id)
+        self.assertEqual(vote_buffer.pending_count(), 3)
+        self.first.refresh_from_db()
+        self.assertEqual(self.first.votes, 0)
+        
+        response = self.client.get(reverse('polls:results', args=(self.question.id,)))
+        self.assertContains(response, "Всего голосов: 3")
+        
+        with self.assertNumQueries(5):
+            # Один UPDATE вариантов, итог опроса и общий счетчик - в одной транзакции
+            self.assertEqual(vote_buffer.flush(), 3)
+        self.assertEqual(vote_buffer.pending_count(), 0)
+        self.assertEqual(
+            dict(self.question.choice_set.values_list('choice_text', 'votes')), {"А": 2, "Б": 1}
+        )
+        self.question.statistic.refresh_from_db()
+        self.assertEqual(self.question.statistic.total_votes, 3)
+
+    @override_settings(POLLS_VOTE_BUFFER=True, POLLS_VOTE_BUFFER_SIZE=2,
+                       POLLS_VOTE_BUFFER_INTERVAL=0)
+    def test_full_buffer_flushes(self):
+        """
+        При достижении POLLS_VOTE_BUFFER_SIZE буфер записывается сразу.
+        """
+        self.vote(self.first.id)
+        self.vote(self.first.id)
+        self.assertEqual(vote_buffer.pending_count(), 0)
+        self.first.refresh_from_db()
+        self.assertEqual(self.first.votes, 2)
+
+    @override_settings(POLLS_VOTE_BUFFER=True, POLLS_VOTE_BUFFER_SIZE=1,
+                       POLLS_VOTE_BUFFER_INTERVAL=0)
+    def test_failed_flush_keeps_votes(self):
+        """
+        Если база занята, голос остается в буфере, а пользователь не получает 500:
+        иначе повторный запрос посчитал бы голос дважды.
+        """
+        url = reverse('polls:api_votes')
+        body = {'votes': [{'question_id': self.question.id, 'choice_id': self.second.id}]}
+        with mock.patch('polls.vote_buffer.apply_votes', side_effect=OperationalError('database is locked')):
+            with self.assertLogs('polls.vote_buffer', level='ERROR'):
+                response = self.vote(self.first.id)
+            self.assertRedirects(response, reverse('polls:results', args=(self.question.id,)))
+            with self.assertLogs('polls.vote_buffer', level='ERROR'):
+                response = self.client.post(url, body, content_type='application/json')
+            self.assertEqual(response.status_code, 200)
+        self.assertEqual(vote_buffer.pending_count(), 2)
+        self.assertFalse(Choice.objects.filter(votes__gt=0).exists())
+        self.assertEqual(vote_buffer.flush(), 2)
+        self.assertEqual(
+            dict(self.question.choice_set.values_list('choice_text', 'votes')), {"А": 1, "Б": 1}
+        )
+
+    @override_settings(POLLS_VOTE_BUFFER=True, POLLS_VOTE_BUFFER_SIZE=1000,
+                       POLLS_VOTE_BUFFER_INTERVAL=60)
+    def test_failed_background_flush_is_retried(self):
+        """
+        Неудачная запись по таймеру логируется и заводит таймер заново.
+        """
+        self.vote(self.first.id)
+        # Срабатывание таймера вызываем сами
+        vote_buffer._timer.cancel()
+        with mock.patch('polls.vote_buffer.apply_votes', side_effect=OperationalError('database is locked')), \
+                mock.patch('polls.vote_buffer.connections'), \
+                self.assertLogs('polls.vote_buffer', level='ERROR'):
+            vote_buffer._flush_in_background()
+        self.assertEqual(vote_buffer.pending_count(), 1)
+        self.assertIsNotNone(vote_buffer._timer)
+        self.assertEqual(vote_buffer.flush(), 1)
+        self.assertIsNone(vote_buffer._timer)
+
+    @override_settings(POLLS_VOTE_BUFFER=True, POLLS_VOTE_BUFFER_SIZE=1000,
+                       POLLS_VOTE_BUFFER_INTERVAL=0)
+    def test_votes_for_deleted_choice_are_dropped(self):
+        """
+        Голоса за вариант, удаленный до сброса буфера, не учитываются.
+        """
+        self.vote(self.first.id)
+        self.vote(self.second.id)
+        self.second.delete()
+        self.assertEqual(vote_buffer.flush(), 1)
+        self.question.statistic.refresh_from_db()
+        self.assertEqual(self.question.statistic.total_votes, 1)
+
+
+# Тесты для JSON API голосования
+class VoteBatchAPITests(TestCase):
+    def setUp(self):
+        self.question = create_question("Вопрос", days=-1)
+        self.first = self.question.choice_set.create(choice_text="А")
+        self.second = self.question.choice_set.create(choice_text="Б")
+
+    def post_votes(self, votes):
+        return self.client.post(reverse('polls:api_votes'), {'votes': votes}, content_type='application/json')
+
+    def test_batch_is_applied_per_choice(self):
+        """
+        Голоса группируются по вариантам; ответ содержит итог для каждого элемента.
+        """
+        other = create_question("Другой", days=-1).choice_set.create(choice_text="В")
+        votes = [{'question_id': self.question.id, 'choice_id': self.first.id}] * 3 + [
+            {'question_id': self.question.id, 'choice_id': self.second.id},
+            {'question_id': self.question.id, 'choice_id': other.id},
+            {'question_id': self.question.id, 'choice_id': 0},
+            {'question_id': self.question.id},
+        ]
+        response = self.post_votes(votes)
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual((data['accepted'], data['rejected']), (4, 3))
+        self.assertEqual([item['status'] for item in data['results']], ['ok'] * 4 + ['error'] * 3)
+        self.assertEqual(
+            dict(self.question.choice_set.values_list('choice_text', 'votes')), {"А": 3, "Б": 1}
+        )
+        other.refresh_from_db()
+        self.assertEqual(other.votes, 0)
+
+    def test_query_count_does_not_grow_with_batch(self):
+        """
+        Тысяча голосов проверяется и записывается тем же числом запросов, что и два.
+        """
+        small = [{'question_id': self.question.id, 'choice_id': self.first.id},
+                 {'question_id': self.question.id, 'choice_id': self.second.id}]
+        large = small * 500
+        # Проверка id, точка сохранения, UPDATE вариантов, итог опроса, общий счетчик
+        with self.assertNumQueries(6):
+            self.post_votes(small)
+        with self.assertNumQueries(6):
+            self.assertEqual(self.post_votes(large).json()['accepted'], 1000)
+        self.question.statistic.refresh_from_db()
+        self.assertEqual(self.question.statistic.total_votes, 1002)
+
+    def test_query_count_does_not_grow_with_questions(self):
+        """
+        Итоги опросов обновляются одним UPDATE, сколько бы опросов ни было в пакете;
+        недостающая статистика создается одной вставкой.
+        """
+        choices = [create_question(f"Вопрос {number}", days=-1).choice_set.create(choice_text="Да")
+                   for number in range(50)]
+        votes = [{'question_id': choice.question_id, 'choice_id': choice.id} for choice in choices]
+        with self.assertNumQueries(6):
+            self.post_votes(votes[:2])
+        with self.assertNumQueries(6):
+            self.post_votes(votes)
+        question_ids = [choice.question_id for choice in choices]
+        PollStatistic.objects.filter(question__in=question_ids).delete()
+        # Плюс поиск недостающих строк, итоги по вариантам и вставка
+        with self.assertNumQueries(9):
+            self.post_votes(votes[:2])
+        PollStatistic.objects.filter(question__in=question_ids).delete()
+        with self.assertNumQueries(9):
+            self.post_votes(votes)
+        self.assertEqual(
+            dict(PollStatistic.objects.filter(question__in=question_ids)
+                 .values_list('question_id', 'total_votes')),
+            dict(Choice.objects.filter(question__in=question_ids).values_list('question_id', 'votes')),
+        )
+
+    def test_large_batch_is_split_by_query_params(self):
+        """
+        UPDATE с CASE делится на пачки по лимиту параметров запроса базы.
+        """
+        choices = [create_question(f"Вопрос {number}", days=-1).choice_set.create(choice_text="Да")
+                   for number in range(25)]
+        votes = [{'question_id': choice.question_id, 'choice_id': choice.id} for choice in choices]
+        # 40 параметров - пачки по 10 строк: три UPDATE вариантов и три UPDATE итогов
+        with mock.patch.object(connection.features, 'max_query_params', 40):
+            with self.assertNumQueries(10):
+                self.assertEqual(self.post_votes(votes * 2).json()['accepted'], 50)
+        question_ids = [choice.question_id for choice in choices]
+        self.assertEqual(set(Choice.objects.filter(question__in=question_ids).values_list('votes', flat=True)), {2})
+        self.assertEqual(
+            set(PollStatistic.objects.filter(question__in=question_ids).values_list('total_votes', flat=True)),
+            {2},
+        )
+
+    @override_settings(POLLS_VOTE_API_MAX_ITEMS=2)
+    def test_invalid_envelope(self):
+        """
+        Некорректный конверт запроса или слишком большой пакет дают 400.
+        """
+        self.assertEqual(self.post_votes('все').status_code, 400)
+        vote = {'question_id': self.question.id, 'choice_id': self.first.id}
+        self.assertEqual(self.post_votes([vote] * 3).status_code, 400)
+        self.assertFalse(Choice.objects.filter(votes__gt=0).exists())
+
+
+# Тесты для пакетного создания и импорта опросов
+class PollImportTests(TestCase):
+    JSONL = (
+        '{"question_text": "Чай или кофе?", "pub_date": "2024-01-01T12:00:00Z", '
+        '"choices": ["Чай", {"choice_text": "Кофе", "votes": 3}]}\n'
+        '{"question_text": "", "choices": []}\n'
+        'не json\n'
+        '{"question_text": "Без вариантов"}\n'
+    )
+    CSV = (
+        'question_text,pub_date,choice_text,votes\n'
+        'Чай или кофе?,2024-01-01T12:00:00Z,Чай,0\n'
+        'Чай или кофе?,2024-01-01T12:00:00Z,Кофе,3\n'
+        'Погода,,Солнце,\n'
+    )
+
+    def test_import_command(self):
+        """
+        Команда import_polls читает JSONL и CSV, пропуская некорректные записи.
+        """
+        for suffix, content, polls, skipped in (('.jsonl', self.JSONL, 2, 2), ('.csv', self.CSV, 2, 0)):
+            with tempfile.NamedTemporaryFile('w', suffix=suffix, encoding='utf-8', delete=False) as source:
+                source.write(content)
+            self.addCleanup(os.remove, source.name)
+            out, err = io.StringIO(), io.StringIO()
+            call_command('import_polls', source.name, batch_size=1, stdout=out, stderr=err)
+            self.assertIn(f'Импортировано {polls} опросов', out.getvalue())
+            self.assertIn(f'пропущено: {skipped}', out.getvalue())
+        
+        question = Question.objects.filter(question_text="Чай или кофе?").first()
+        self.assertEqual(
+            dict(question.choice_set.values_list('choice_text', 'votes')), {"Чай": 0, "Кофе": 3}
+        )
+        self.assertEqual(question.statistic.total_votes, 3)
+        rollup = StatsRollup.objects.current()
+        self.assertEqual((rollup.total_polls, rollup.total_votes), (4, 6))
+
+    def test_batches_use_constant_number_of_queries(self):
+        """
+        Пачка опросов записывается фиксированным числом запросов.
+        """
+        polls = [
+            PollData(f"Вопрос {number}", timezone.now(), [("А", 1), ("Б", 0)])
+            for number in range(50)
+        ]
+        # Точка сохранения, два bulk_create, статистика, общий счетчик,
+        # дневной счетчик (UPDATE и INSERT: этого дня еще нет)
+        with self.assertNumQueries(8):
+            report = import_polls(polls, batch_size=50)
+        self.assertEqual((report.polls, report.choices), (50, 100))
+        self.assertEqual(PollStatistic.objects.filter(total_votes=1).count(), 50)
+
+    def test_import_api_requires_login(self):
+        """
+        Импорт через API доступен только вошедшим пользователям.
+        """
+        url = reverse('polls:api_import')
+        body = {'polls': [{'question_text': "Вопрос", 'choices': ["А"]}, {'choices': ["Б"]}]}
+        self.assertEqual(self.client.post(url, body, content_type='application/json').status_code, 403)
+        
+        self.client.force_login(User.objects.create_user('editor'))
+        response = self.client.post(url, body, content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['polls'], 1)
+        self.assertEqual(response.json()['errors'][0]['record'], 2)
+        
+        upload = SimpleUploadedFile('polls.csv', self.CSV.encode('utf-8'))
+        response = self.client.post(url, {'file': upload})
+        self.assertEqual(response.json()['choices'], 3)
+
+    def test_import_rejects_non_utf8_file(self):
+        """
+        Файл не в UTF-8 дает ошибку в отчете, а не 500.
+        """
+        self.client.force_login(User.objects.create_user('editor'))
+        url = reverse('polls:api_import')
+        for name, content in (('polls.csv', self.CSV), ('polls.jsonl', self.JSONL)):
+            with self.subTest(name=name):
+                upload = SimpleUploadedFile(name, content.encode('cp1251'))
+                response = self.client.post(url, {'file': upload})
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual((response.json()['polls'], response.json()['skipped']), (0, 1))
+                self.assertIn('UTF-8', response.json()['errors'][0]['error'])
+        self.assertFalse(Question.objects.exists())
+
+    def test_create_poll_is_atomic(self):
+        """
+        Форма создания опроса сохраняет вопрос и варианты вместе.
+        """
+        self.client.force_login(User.objects.create_user('author'))
+        with self.assertNumQueries(10):
+            # Сессия и пользователь, затем запросы пакетного создания
+            response = self.client.post(reverse('polls:create_poll'), {
+                'question_text': "Новый опрос", 'choices_text': "Да\nНет\n\n",
+            })
+        question = Question.objects.get(question_text="Новый опрос")
+        self.assertRedirects(response, reverse('polls:detail', args=(question.id,)))
+        self.assertEqual(list(question.choice_set.values_list('choice_text', flat=True)), ["Да", "Нет"])
+        self.assertEqual(question.statistic.total_votes, 0)
+
+
+# Тесты числа запросов на страницах вопроса
+class QuestionPageQueryTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.question = create_question("Вопрос", days=-1)
+        for number in range(20):
+            self.question.choice_set.create(choice_text=f"Вариант {number}", votes=number)
+
+    def test_results_page_query_count(self):
+        """
+        Страница результатов: вопрос и варианты - два запроса при любом числе вариантов.
+        """
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('polls:results', args=(self.question.id,)))
+        self.assertContains(response, "Всего голосов: 190")
+        self.assertContains(response, "(10%)")
+
+    def test_detail_page_query_count(self):
+        """
+        Страница голосования загружает вопрос и варианты двумя запросами.
+        """
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('polls:detail', args=(self.question.id,)))
+        self.assertContains(response, "Вариант 19")
+
+    def test_total_votes_uses_prefetched_choices(self):
+        """
+        total_votes не делает запросов, если варианты предзагружены.
+        """
+        question = Question.objects.prefetch_related('choice_set').get(pk=self.question.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(question.total_votes, 190)
+        with self.assertNumQueries(1):
+            self.assertEqual(self.question.total_votes, 190)
+
+
+# Тесты кэша страниц опросов
+class PageCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.question = create_question("Вопрос", days=-1)
+        self.choice = self.question.choice_set.create(choice_text="А")
+        self.other = create_question("Другой", days=-1)
+
+    def get(self, name, question=None, client=None):
+        args = (question.id,) if question else ()
+        return (client or self.client).get(reverse(name, args=args))
+
+    def test_vote_invalidates_only_its_question(self):
+        """
+        Повторный запрос отдается из кэша без запросов к базе;
+        голос сбрасывает кэш только своего вопроса.
+        """
+        self.assertEqual(self.get('polls:results', self.question)['X-Page-Cache'], 'miss')
+        self.get('polls:results', self.other)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.get('polls:results', self.question)['X-Page-Cache'], 'hit')
+        
+        self.client.post(reverse('polls:vote', args=(self.question.id,)), {'choice': self.choice.id})
+        response = self.get('polls:results', self.question)
+        self.assertEqual(response['X-Page-Cache'], 'miss')
+        self.assertContains(response, "Всего голосов: 1")
+        self.assertEqual(self.get('polls:results', self.other)['X-Page-Cache'], 'hit')
+
+    def test_new_poll_invalidates_index(self):
+        """
+        Создание опроса сбрасывает кэш списка.
+        """
+        self.get('polls:index')
+        self.assertEqual(self.get('polls:index')['X-Page-Cache'], 'hit')
+        create_question("Новый", days=0)
+        response = self.get('polls:index')
+        self.assertEqual(response['X-Page-Cache'], 'miss')
+        self.assertContains(response, "Новый")
+
+    def test_index_expires_at_next_publication(self):
+        """
+        Кэш списка живет не дольше, чем до pub_date ближайшего отложенного вопроса.
+        """
+        Question.objects.all().delete()
+        question = Question.objects.create(
+            question_text="Отложенный", pub_date=timezone.now() + datetime.timedelta(seconds=30)
+        )
+        view = IndexView()
+        self.assertLessEqual(view.get_cache_timeout(), 30)
+        question.pub_date = timezone.now() - datetime.timedelta(days=2)
+        question.save()
+        self.assertEqual(view.get_cache_timeout(), settings.POLLS_PAGE_CACHE_TIMEOUT)
+
+    def test_cached_form_gets_fresh_csrf_token(self):
+        """
+        Каждый посетитель кэшированной страницы получает свой рабочий CSRF-токен.
+        """
+        clients = [Client(enforce_csrf_checks=True) for _ in range(2)]
+        responses = [self.get('polls:detail', self.question, client=client) for client in clients]
+        self.assertEqual([response['X-Page-Cache'] for response in responses], ['miss', 'hit'])
+        tokens = [
+            re.search(r'name="csrfmiddlewaretoken" value="([^"]+)"', response.content.decode()).group(1)
+            for response in responses
+        ]
+        self.assertNotEqual(tokens[0], tokens[1])
+        for client, token in zip(clients, tokens):
+            vote = client.post(reverse('polls:vote', args=(self.question.id,)),
+                               {'choice': self.choice.id, 'csrfmiddlewaretoken': token})
+            self.assertEqual(vote.status_code, 302)
+
+    def test_logged_in_users_bypass_cache(self):
+        """
+        Вошедшим пользователям страницы не кэшируются.
+        """
+        self.client.force_login(User.objects.create_user('voter'))
+        self.get('polls:index')
+        response = self.get('polls:index')
+        self.assertFalse(response.has_header('X-Page-Cache'))
+        self.assertContains(response, "Привет, voter!")
+
+    @override_settings(POLLS_VOTE_BUFFER=True, POLLS_VOTE_BUFFER_SIZE=1000,
+                       POLLS_VOTE_BUFFER_INTERVAL=0)
+    def test_buffered_vote_is_visible(self):
+        """
+        Голос из буфера сразу виден на кэшированной странице результатов.
+        """
+        self.get('polls:results', self.question)
+        self.client.post(reverse('polls:vote', args=(self.question.id,)), {'choice': self.choice.id})
+        self.assertContains(self.get('polls:results', self.question), "Всего голосов: 1")
+        vote_buffer.flush()
+
+
+# Тесты условных GET-запросов страницы результатов
+class ResultsConditionalGetTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.question = create_question("Вопрос", days=-1)
+        self.choice = self.question.choice_set.create(choice_text="А")
+        self.url = reverse('polls:results', args=(self.question.id,))
+
+    def test_not_modified(self):
+        """
+        Совпадающий If-None-Match - ответ 304 одним запросом; голос меняет ETag.
+        """
+        response = self.client.get(self.url)
+        etag = response['ETag']
+        self.assertTrue(response.has_header('Last-Modified'))
+        self.assertEqual(self.client.get(self.url)['ETag'], etag)  # из кэша страниц
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        
+        self.client.post(reverse('polls:vote', args=(self.question.id,)), {'choice': self.choice.id})
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_live_updates_only_under_asgi(self):
+        """
+        На живые результаты подписывается только страница, отданная ASGI-сервером:
+        под WSGI каждое переподключение читало бы базу. Кэш страниц и ETag
+        различают эти варианты.
+        """
+        wsgi = self.client.get(self.url)
+        self.assertNotContains(wsgi, 'EventSource')
+        asgi = async_to_sync(self.async_client.get)(self.url)
+        self.assertEqual(asgi['X-Page-Cache'], 'miss')
+        self.assertContains(asgi, 'EventSource')
+        self.assertNotEqual(asgi['ETag'], wsgi['ETag'])
+        self.assertEqual(self.client.get(self.url)['X-Page-Cache'], 'hit')
+        self.assertContains(self.client.get(reverse('polls:analytics')), 'const liveUpdates = false')
+        self.assertContains(
+            async_to_sync(self.async_client.get)(reverse('polls:analytics')), 'const liveUpdates = true'
+        )
+
+    def test_question_edit_changes_etag(self):
+        etag = self.client.get(self.url)['ETag']
+        self.question.question_text = "Новый текст"
+        self.question.save()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertContains(response, "Новый текст")
+
+    @override_settings(POLLS_VOTE_BUFFER=True, POLLS_VOTE_BUFFER_SIZE=1000,
+                       POLLS_VOTE_BUFFER_INTERVAL=0)
+    def test_buffered_votes_change_etag(self):
+        """
+        Голоса из буфера видны на странице, поэтому меняют ETag еще до записи в базу.
+        """
+        etag = self.client.get(self.url)['ETag']
+        self.client.post(reverse('polls:vote', args=(self.question.id,)), {'choice': self.choice.id})
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertContains(response, "Всего голосов: 1")
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertFalse(response.has_header('Last-Modified'))
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+        vote_buffer.flush()
+
+
+# Бюджеты запросов: число запросов страниц и API не растет с объемом данных
+class QueryBudgetTests(TestCase):
+    """
+    Каждый запрос выполняется дважды: на опросе с 2 вариантами среди нескольких
+    опросов и на опросе с 20 вариантами после добавления еще сотни опросов
+    (с разным числом вариантов). Оба раза число запросов должно ровно совпасть
+    с бюджетом; при нарушении в сообщение попадает весь выполненный SQL.
+    """
+    def setUp(self):
+        self.polls = 0
+        self.small = self.add_polls(5, choices=2)
+
+    def add_polls(self, count, choices=None):
+        """
+        Добавляет count опросов (число вариантов от 2 до 20, если не задано)
+        и возвращает самый свежий из них.
+        """
+        now = timezone.now()
+        polls = []
+        for number in range(self.polls, self.polls + count):
+            size = choices or 2 + number % 19
+            polls.append(PollData(
+                f"Опрос {number}", now - datetime.timedelta(minutes=count - len(polls)),
+                [(f"Вариант {index}", index * number % 7) for index in range(size)],
+            ))
+        self.polls += count
+        import_polls(polls)
+        return Question.objects.order_by('-pub_date').first()
+
+    def assertQueryBudget(self, budget, request):
+        """
+        request(question, choices) -> ответ; выполняется на маленьком и на большом
+        наборе данных. Варианты опроса загружаются заранее и в бюджет не входят.
+        """
+        for large in (False, True):
+            question = self.small
+            if large:
+                self.add_polls(100)
+                question = self.add_polls(1, choices=20)
+            choices = list(question.choice_set.all())
+            cache.clear()
+            chart_cache.clear()
+            with CaptureQueriesContext(connection) as queries:
+                response = request(question, choices)
+            self.assertLess(response.status_code, 400, response.content[:500])
+            if len(queries) != budget:
+                sql = '\n'.join(
+                    f'{number}. {query["sql"]}' for number, query in enumerate(queries.captured_queries, 1)
+                )
+                self.fail(
+                    f'{len(queries)} запросов вместо {budget} '
+                    f'(опросов: {self.polls}, вариантов у опроса: {len(choices)}):\n{sql}'
+                )
+
+    def login(self, superuser=False):
+        if superuser:
+            self.client.force_login(User.objects.create_superuser('admin', password='admin'))
+        else:
+            self.client.force_login(User.objects.create_user('author'))
+
+    def test_index(self):
+        # Срок жизни кэша страницы и сам список
+        self.assertQueryBudget(2, lambda question, choices: self.client.get(reverse('polls:index')))
+
+    def test_detail(self):
+        # Вопрос и все его варианты одним запросом
+        self.assertQueryBudget(2, lambda question, choices: self.client.get(
+            reverse('polls:detail', args=(question.id,))
+        ))
+
+    def test_results(self):
+        self.assertQueryBudget(2, lambda question, choices: self.client.get(
+            reverse('polls:results', args=(question.id,))
+        ))
+
+    def test_vote(self):
+        # Проверка варианта, затем в транзакции: UPDATE вариантов, итог опроса, общий счетчик
+        self.assertQueryBudget(6, lambda question, choices: self.client.post(
+            reverse('polls:vote', args=(question.id,)), {'choice': choices[-1].id}
+        ))
+
+    def test_create_poll(self):
+        self.login()
+        # Сессия и пользователь, затем в транзакции: вопрос, варианты одним INSERT,
+        # статистика опроса, общий и дневной счетчики
+        self.assertQueryBudget(9, lambda question, choices: self.client.post(reverse('polls:create_poll'), {
+            'question_text': "Новый опрос",
+            'choices_text': '\n'.join(choice.choice_text for choice in choices),
+        }))
+
+    def test_poll_stats_api(self):
+        self.assertQueryBudget(2, lambda question, choices: self.client.get(
+            reverse('poll_stats', args=(question.id,))
+        ))
+
+    def test_poll_chart_api(self):
+        self.assertQueryBudget(2, lambda question, choices: self.client.get(
+            reverse('poll_chart_png', args=(question.id,))
+        ))
+
+    def test_poll_search_api(self):
+        # Глобальная версия для ETag и сам поиск
+        self.assertQueryBudget(2, lambda question, choices: self.client.get(
+            reverse('poll_search'), {'q': "Опрос", 'sort_by': 'popularity'}
+        ))
+
+    def test_overall_stats_api(self):
+        # Общий счетчик, самый старый опрос недели (для ETag), опросы за неделю
+        # (дни целиком и первый день), популярные опросы
+        self.assertQueryBudget(5, lambda question, choices: self.client.get(reverse('overall_stats')))
+
+    def test_admin_changelist(self):
+        self.login(superuser=True)
+        # Сессия и пользователь, COUNT, страница, границы и дни для навигации по датам
+        self.assertQueryBudget(6, lambda question, choices: self.client.get(
+            reverse('admin:polls_question_changelist')
+        ))
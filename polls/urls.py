@@ -1,5 +1,5 @@
 from django.urls import path
-from . import views
+from . import api, views
 
 app_name = 'polls'
 
@@ -20,4 +20,10 @@ urlpatterns = [
     path('create/', views.create_poll, name='create_poll'),
 
     path('analytics/', views.PollAnalyticsView.as_view(), name='analytics'),
+
+    # JSON API: пакетная отправка голосов
+    path('api/votes/', api.VoteBatchAPIView.as_view(), name='api_votes'),
+
+    # JSON API: импорт опросов из выгрузки
+    path('api/import/', api.PollImportAPIView.as_view(), name='api_import'),
 ]
\ No newline at end of file
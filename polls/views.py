@@ -1,12 +1,22 @@
+import math
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.db.models import Min, Q
 from django.utils import timezone
-from django.db.models import F
 from django.http import HttpResponse, HttpResponseRedirect
 from django.shortcuts import get_object_or_404, render, redirect
 from django.urls import reverse
 from django.views import generic
+from .cache import INDEX, CachedPageMixin, question_scope
+from .conditional import make_etag, not_modified, set_validators
 from .models import Choice, Question
+from .vote_buffer import vote_buffer
+from .votes import apply_votes
 from django.contrib.auth.decorators import login_required
 from .forms import PollCreationForm 
+from .importing import PollData, save_polls
 from django.contrib.auth import login, authenticate
 from django.contrib.auth.forms import AuthenticationForm
 from .auth_forms import CustomUserCreationForm
@@ -14,7 +24,7 @@ from django.contrib.auth.views import LoginView, LogoutView
 from django.views.generic import TemplateView
 
 # Общее представление для главной страницы (список вопросов)
-class IndexView(generic.ListView):
+class IndexView(CachedPageMixin, generic.ListView):
     template_name = 'polls/index.html'  # Используем наш шаблон
     context_object_name = 'latest_question_list'  # Имя переменной в шаблоне
     
@@ -26,8 +36,29 @@ class IndexView(generic.ListView):
             pub_date__lte=timezone.now()  # lte = less than or equal (меньше или равно)
         ).order_by('-pub_date')[:5]
 
+    def get_cache_scopes(self):
+        return [INDEX]
+
+    def get_cache_timeout(self):
+        """
+        Список меняется и без записи в базу: когда наступает pub_date отложенного
+        вопроса и когда у вопроса пропадает отметка "Новый!" (через сутки).
+        Кэш живет не дольше ближайшего из этих моментов.
+        """
+        now = timezone.now()
+        moments = Question.objects.aggregate(
+            next_published=Min('pub_date', filter=Q(pub_date__gt=now)),
+            oldest_recent=Min('pub_date', filter=Q(pub_date__gt=now - timedelta(days=1), pub_date__lte=now)),
+        )
+        deadlines = [super().get_cache_timeout()]
+        if moments['next_published'] is not None:
+            deadlines.append((moments['next_published'] - now).total_seconds())
+        if moments['oldest_recent'] is not None:
+            deadlines.append((moments['oldest_recent'] + timedelta(days=1) - now).total_seconds())
+        return max(0, math.floor(min(deadlines)))
+
 # Общее представление для деталей вопроса
-class DetailView(generic.DetailView):
+class DetailView(CachedPageMixin, generic.DetailView):
     model = Question  # Указываем модель
     template_name = 'polls/detail.html'  # Используем наш шаблон
     pk_url_kwarg = 'question_id'
@@ -35,20 +66,96 @@ class DetailView(generic.DetailView):
     def get_queryset(self):
         """
         Исключает вопросы, которые еще не опубликованы (будущие даты).
+        Варианты загружаются вторым запросом сразу для шаблона.
         """
-        return Question.objects.filter(pub_date__lte=timezone.now())
+        return Question.objects.filter(pub_date__lte=timezone.now()).prefetch_related('choice_set')
+
+    def get_cache_scopes(self):
+        return [question_scope(self.kwargs['question_id'])]
+
+def live_updates(request):
+    """
+    Подписывать ли страницу на живые результаты (SSE). Поток держит открытым
+    только ASGI-сервер; под WSGI каждое переподключение - это лишний запрос к базе.
+    """
+    return isinstance(request, ASGIRequest)
+
+def results_validators(question_id, version, last_calculated, pending, live):
+    """
+    ETag и Last-Modified страницы результатов по версии опроса (PollStatistic.version).
+    Голоса из буфера этого процесса видны на странице, поэтому входят в ETag;
+    пока они есть, Last-Modified не отдается - по нему их не заметить.
+    Страница под ASGI и под WSGI разная (live_updates), поэтому флаг тоже в ETag.
+    """
+    if version is None:
+        return None, None
+    etag = make_etag(question_id, version, last_calculated.isoformat(), sorted(pending.items()), live)
+    return etag, None if pending else last_calculated
 
 # Общее представление для результатов
-class ResultsView(generic.DetailView):
+class ResultsView(CachedPageMixin, generic.DetailView):
     model = Question  # Та же модель
     template_name = 'polls/results.html'  # Другой шаблон
     pk_url_kwarg = 'question_id'
+    validators = (None, None)
 
     def get_queryset(self):
         """
         Исключает вопросы, которые еще не опубликованы (будущие даты).
+        Варианты загружаются вторым запросом сразу для шаблона,
+        версия опроса - вместе с вопросом.
         """
-        return Question.objects.filter(pub_date__lte=timezone.now())
+        return Question.objects.filter(pub_date__lte=timezone.now()).select_related(
+            'statistic'
+        ).prefetch_related('choice_set')
+
+    def get_cache_scopes(self):
+        return [question_scope(self.kwargs['question_id'])]
+
+    def dispatch(self, request, *args, **kwargs):
+        """
+        На условный запрос (If-None-Match, If-Modified-Since) сначала сверяем
+        версию опроса одним запросом по первичному ключу и при совпадении
+        отвечаем 304, не трогая ни кэш страниц, ни варианты.
+        """
+        if request.method in ('GET', 'HEAD') and (
+            'If-None-Match' in request.headers or 'If-Modified-Since' in request.headers
+        ):
+            question_id = kwargs['question_id']
+            version = Question.objects.filter(pk=question_id, pub_date__lte=timezone.now()).values_list(
+                'statistic__version', 'statistic__last_calculated'
+            ).first()
+            if version is not None:
+                response = not_modified(request, *results_validators(
+                    question_id, *version, vote_buffer.pending_for(question_id), live_updates(request)
+                ))
+                if response is not None:
+                    return response
+        return super().dispatch(request, *args, **kwargs)
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        # Голоса из буфера, еще не записанные в базу, тоже показываем:
+        # проголосовавший должен сразу увидеть свой голос
+        pending = vote_buffer.pending_for(self.object.id)
+        choices = list(self.object.choice_set.all())
+        for choice in choices:
+            choice.votes += pending.get(choice.id, 0)
+        context['choices'] = choices
+        context['total_votes'] = sum(choice.votes for choice in choices)
+        context['live_updates'] = live_updates(self.request)
+        statistic = getattr(self.object, 'statistic', None)
+        if statistic is not None:
+            # Те же голоса из буфера, что и на странице
+            self.validators = results_validators(
+                self.object.id, statistic.version, statistic.last_calculated, pending,
+                context['live_updates'],
+            )
+        return context
+
+    def render_to_response(self, context, **response_kwargs):
+        # До кэширования страницы: заголовки сохраняются в кэше вместе с ней
+        return set_validators(super().render_to_response(context, **response_kwargs), *self.validators)
 
 # Функция для обработки голосования
 def vote(request, question_id):
@@ -56,30 +163,31 @@ def vote(request, question_id):
     Обрабатывает голосование за конкретный вариант ответа.
     Увеличивает счетчик голосов и перенаправляет на страницу результатов.
     """
-    # Получаем вопрос или 404
-    question = get_object_or_404(Question, pk=question_id)
-    
     try:
-        # Получаем выбранный вариант из POST-данных
-        selected_choice = question.choice_set.get(pk=request.POST['choice'])
-    except (KeyError, Choice.DoesNotExist):
+        # Один запрос: выбранный вариант должен принадлежать этому вопросу
+        choice_id = Choice.objects.filter(
+            pk=request.POST['choice'], question_id=question_id
+        ).values_list('pk', flat=True).get()
+    except (KeyError, ValueError, Choice.DoesNotExist):
         # Если вариант не выбран или не существует, показываем форму с ошибкой
+        question = get_object_or_404(Question, pk=question_id)
         return render(request, 'polls/detail.html', {
             'question': question,
             'error_message': "Вы не выбрали вариант ответа.",
         })
+
+    if settings.POLLS_VOTE_BUFFER:
+        # Голос попадет в базу вместе с пачкой (см. polls.vote_buffer)
+        vote_buffer.record(question_id, choice_id)
     else:
-        # Используем F() для атомарного увеличения счетчика в базе данных
-        selected_choice.votes = F('votes') + 1
-        selected_choice.save()
-        # Обновляем объект из базы, чтобы получить актуальное значение
-        selected_choice.refresh_from_db()
-        
-        # Всегда возвращаем HttpResponseRedirect после успешной обработки POST
-        # Это предотвращает повторную отправку формы при нажатии кнопки "Назад"
-        return HttpResponseRedirect(
-            reverse('polls:results', args=(question.id,))
-        )
+        # Атомарное увеличение счетчика одним UPDATE и сигнал votes_cast
+        apply_votes({(question_id, choice_id): 1})
+
+    # Всегда возвращаем HttpResponseRedirect после успешной обработки POST
+    # Это предотвращает повторную отправку формы при нажатии кнопки "Назад"
+    return HttpResponseRedirect(
+        reverse('polls:results', args=(question_id,))
+    )
     
 @login_required
 def create_poll(request):
@@ -89,25 +197,17 @@ def create_poll(request):
     if request.method == 'POST':
         form = PollCreationForm(request.POST)
         if form.is_valid():
-            # 1. Создаем вопрос
-            question_text = form.cleaned_data['question_text']
-            question = Question.objects.create(
-                question_text=question_text,
-                pub_date=timezone.now()
-            )
-            
-            # 2. Создаем варианты ответов из текстовой области
+            # Вопрос и все варианты создаются одной транзакцией пачкой
+            # (тот же путь, что и у импорта опросов)
             choices_text = form.cleaned_data['choices_text']
             choices_list = [choice.strip() for choice in choices_text.split('\n') if choice.strip()]
+            question, = save_polls([PollData(
+                question_text=form.cleaned_data['question_text'],
+                pub_date=timezone.now(),
+                choices=[(choice_text, 0) for choice_text in choices_list],
+            )])
             
-            for choice_text in choices_list:
-                Choice.objects.create(
-                    question=question,
-                    choice_text=choice_text,
-                    votes=0
-                )
-            
-            # 3. Перенаправляем на страницу с деталями созданного опроса
+            # Перенаправляем на страницу с деталями созданного опроса
             return redirect('polls:detail', question_id=question.id)
     else:
         form = PollCreationForm()
@@ -147,4 +247,5 @@ class PollAnalyticsView(TemplateView):
         context = super().get_context_data(**kwargs)
         # Получаем последние опросы для начального отображения
         context['recent_polls'] = Question.objects.order_by('-pub_date')[:10]
+        context['live_updates'] = live_updates(self.request)
         return context
\ No newline at end of file
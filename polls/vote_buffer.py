@@ -0,0 +1,124 @@
+"""
+Буфер голосов с отложенной записью (включается настройкой POLLS_VOTE_BUFFER).
+
+Голоса копятся в памяти процесса и записываются одним UPDATE (polls.votes.apply_votes),
+когда их набирается POLLS_VOTE_BUFFER_SIZE или проходит POLLS_VOTE_BUFFER_INTERVAL
+секунд, а также при остановке процесса. Так при всплеске голосов по популярному
+опросу SQLite получает одну пишущую транзакцию на пачку, а не на каждый голос.
+Если запись не удалась (например, база занята), голоса остаются в буфере
+до следующей попытки.
+"""
+import atexit
+import logging
+import threading
+from collections import Counter
+
+from django.conf import settings
+from django.db import connections
+
+from .cache import bump, question_scope
+from .votes import apply_votes
+
+logger = logging.getLogger(__name__)
+
+
+class VoteBuffer:
+    def __init__(self):
+        self._pending = Counter()  # (question_id, choice_id) -> количество
+        self._lock = threading.Lock()
+        self._timer = None
+        self.flushes = 0
+        self.flushed_votes = 0
+
+    def record(self, question_id, choice_id, count=1):
+        """Добавляет голос в буфер; при заполнении буфера сразу записывает его."""
+        with self._lock:
+            self._pending[(question_id, choice_id)] += count
+            full = sum(self._pending.values()) >= settings.POLLS_VOTE_BUFFER_SIZE
+            if not full:
+                self._schedule()
+        # Страница результатов показывает голоса из буфера, поэтому устаревает уже сейчас
+        bump(question_scope(question_id))
+        if full:
+            try:
+                self.flush()
+            except Exception:
+                # Голос уже учтен в буфере и будет записан следующей пачкой:
+                # ответ 500 заставил бы клиента повторить его и посчитать дважды
+                with self._lock:
+                    self._schedule()
+
+    def _schedule(self):
+        """Запускает таймер записи, если его еще нет (вызывается под self._lock)."""
+        if self._timer is None and self._pending and settings.POLLS_VOTE_BUFFER_INTERVAL:
+            self._timer = threading.Timer(
+                settings.POLLS_VOTE_BUFFER_INTERVAL, self._flush_in_background
+            )
+            self._timer.daemon = True
+            self._timer.start()
+
+    def pending_for(self, question_id):
+        """Еще не записанные голоса опроса: {choice_id: количество}."""
+        with self._lock:
+            return {
+                choice_id: count
+                for (pending_question_id, choice_id), count in self._pending.items()
+                if pending_question_id == question_id
+            }
+
+    def pending_count(self):
+        """Число голосов, еще не записанных в базу."""
+        with self._lock:
+            return sum(self._pending.values())
+
+    def stats(self):
+        with self._lock:
+            return {
+                'enabled': settings.POLLS_VOTE_BUFFER,
+                'pending_votes': sum(self._pending.values()),
+                'pending_choices': len(self._pending),
+                'flushes': self.flushes,
+                'flushed_votes': self.flushed_votes,
+            }
+
+    def flush(self):
+        """Записывает накопленные голоса; при ошибке возвращает их в буфер."""
+        with self._lock:
+            pending, self._pending = self._pending, Counter()
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        if not pending:
+            return 0
+        try:
+            written = apply_votes(pending)
+        except Exception:
+            logger.exception(
+                'Не удалось записать %d голосов, они остаются в буфере', sum(pending.values())
+            )
+            with self._lock:
+                self._pending.update(pending)
+            raise
+        with self._lock:
+            self.flushes += 1
+            self.flushed_votes += written
+        return written
+
+    def _flush_in_background(self):
+        with self._lock:
+            self._timer = None
+        try:
+            self.flush()
+        except Exception:
+            # Ошибка уже в логе (см. flush); голоса не должны ждать следующего голоса
+            with self._lock:
+                self._schedule()
+        finally:
+            # Соединение этого потока больше не понадобится
+            connections.close_all()
+
+
+vote_buffer = VoteBuffer()
+
+# Голоса, не успевшие попасть в базу, записываем при остановке процесса
+atexit.register(vote_buffer.flush)
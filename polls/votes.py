@@ -0,0 +1,59 @@
+"""
+Запись голосов в базу.
+
+apply_votes - единственное место, где увеличивается Choice.votes при голосовании:
+им пользуются и представление vote, и буфер голосов (polls.vote_buffer).
+increment - общий UPDATE с CASE по id; им же пользуется analytics для итогов опросов.
+"""
+from django.db import connection, transaction
+from django.db.models import Case, F, IntegerField, Value, When
+
+from .models import Choice
+from .signals import votes_cast
+
+
+# Параметров запроса на одну строку в increment: id в IN и пара When(id, прибавка)
+PARAMS_PER_ROW = 3
+# Запас параметров под остальные поля UPDATE
+RESERVED_PARAMS = 10
+
+
+def increment(queryset, field, key, increments, **updates):
+    """
+    Прибавляет к полю field значения {значение key: прибавка} одним
+    UPDATE ... CASE на пачку; пачки укладываются в лимит параметров запроса
+    базы. updates - другие поля, которые обновляются у тех же строк.
+    Возвращает число обновленных строк.
+    """
+    limit = connection.features.max_query_params
+    size = max((limit - RESERVED_PARAMS) // PARAMS_PER_ROW, 1) if limit else len(increments)
+    items = list(increments.items())
+    updated = 0
+    for start in range(0, len(items), size):
+        batch = dict(items[start:start + size])
+        updated += queryset.filter(**{f'{key}__in': batch}).update(**{field: F(field) + Case(
+            *[When(**{key: value}, then=Value(count)) for value, count in batch.items()],
+            default=Value(0),
+            output_field=IntegerField(),
+        )}, **updates)
+    return updated
+
+
+def apply_votes(deltas):
+    """
+    Прибавляет голоса {(question_id, choice_id): количество} одним UPDATE
+    и сообщает о них сигналом votes_cast. Голоса за удаленные варианты
+    отбрасываются. Возвращает число записанных голосов.
+    """
+    deltas = {key: count for key, count in deltas.items() if count}
+    if not deltas:
+        return 0
+    increments = {choice_id: count for (_, choice_id), count in deltas.items()}
+    with transaction.atomic():
+        updated = increment(Choice.objects, 'votes', 'pk', increments)
+        if updated != len(increments):
+            existing = set(Choice.objects.filter(pk__in=increments).values_list('pk', flat=True))
+            deltas = {key: count for key, count in deltas.items() if key[1] in existing}
+        if deltas:
+            votes_cast.send(sender=Choice, deltas=deltas)
+    return sum(deltas.values())